@@ -1,10 +1,33 @@
-from fastapi import APIRouter, Query, HTTPException, Depends
-from typing import List, Dict, Any
+import asyncio
 import logging
+import time
+from collections import Counter
+from concurrent.futures import Future
+from typing import Any, Dict, List, Optional
 
-from app.services.reso import RESOClient, get_address_from_listing
+from fastapi import APIRouter, Depends, HTTPException, Path, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+
+from app.api.v1.endpoints.places import get_places_db
+from app.core.config import settings
+from app.db.base import GeocodingCache, PlacesCache
+from app.db.factory import get_geocoding_cache
+from app.models.database import AMENITY_SCORE_FIELDS, AmenityScoreDatabase
+from app.models.schemas import (
+    AmenitiesRequest,
+    AmenitiesResponse,
+    ListingScoresResponse,
+)
+from app.services.amenities import AMENITY_RADII, nearest_amenities, score_listings
+from app.services.blobs import blob_response
+from app.services.coordinates import (
+    SOURCE_GEOCODER,
+    geocode_in_background,
+    resolve_locally,
+)
 from app.services.geocoding import GeocodingClient
-from app.models.database import GeocodingDatabase
+from app.services.media import LISTING_KEY_PATTERN, blob_store, get_media
+from app.services.reso import RESOClient, get_address_from_listing
 
 logger = logging.getLogger("real-estate-api")
 
@@ -18,94 +41,225 @@ def get_geocoding_client() -> GeocodingClient:
     """Dependency to get the geocoding client"""
     return GeocodingClient()
 
-def get_geocoding_db() -> GeocodingDatabase:
-    """Dependency to get the geocoding database"""
-    db = GeocodingDatabase()
+def get_geocoding_db() -> GeocodingCache:
+    """Dependency to get the geocoding cache"""
+    db = get_geocoding_cache()
     try:
         yield db
     finally:
         db.close()
 
+def validate_sort(sort: Optional[str]) -> None:
+    """Reject sort fields that are not amenity scores"""
+    if sort is not None and sort not in AMENITY_SCORE_FIELDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"sort must be one of: {', '.join(AMENITY_SCORE_FIELDS)}",
+        )
+
 @router.get("/active", response_model=List[Dict[str, Any]])
 async def get_active_listings(
+    response: Response,
     limit: int = Query(10, ge=1, le=100),
+    deadline_ms: Optional[int] = Query(None, ge=0),
+    sort: Optional[str] = Query(None),
     reso_client: RESOClient = Depends(get_reso_client),
     geocoding_client: GeocodingClient = Depends(get_geocoding_client),
-    geocoding_db: GeocodingDatabase = Depends(get_geocoding_db)
+    geocoding_db: GeocodingCache = Depends(get_geocoding_db),
+    places_db: PlacesCache = Depends(get_places_db)
 ):
     """
-    Get active real estate listings with geocoded coordinates
+    Get active real estate listings with coordinates
+    
+    Coordinates come from the cheapest available source, recorded in each
+    listing's `coordinates_source`: the RESO record ("listing"), the geocoding
+    cache ("cache"), another unit of the same street address ("same_street"),
+    or the geocoder ("geocoder"); see app/services/coordinates.py.
     
     - **limit**: Number of listings to return (default: 10, max: 100)
+    - **deadline_ms**: Respond after this many milliseconds with the listings resolved
+      so far (default: LISTINGS_DEADLINE_MS; 0 waits for every listing)
+    - **sort**: Amenity score to order by, highest first (walkability, school,
+      grocery, hospital or transit); RESO order by default
+    
+    Listings still being geocoded at the deadline are left out, and the response
+    carries `X-Partial-Result: true` and their keys in `X-Pending-Listings`. Their
+    geocoding finishes in the background, so a repeated request finds them cached.
+    
+    Each listing carries its `amenity_scores` from the score table, or scored from
+    cached places if it is not stored yet (see app/services/amenities.py); None if
+    scoring failed. Scores are None for listings without cached places around them,
+    and sort last.
     """
-    logger.info(f"Fetching {limit} active residential listings")
+    validate_sort(sort)
+    started = time.monotonic()
+    if deadline_ms is None:
+        deadline_ms = settings.LISTINGS_DEADLINE_MS
+    logger.info("Fetching %s active residential listings", limit)
     
     # Fetch active listings from RESO API
-    active_listings = reso_client.get_active_residential_listings(limit=limit)
-    logger.info(f"Retrieved {len(active_listings)} listings from RESO API")
+    active_listings = await run_in_threadpool(
+        reso_client.get_active_residential_listings, limit=limit
+    )
+    logger.info("Retrieved %s listings from RESO API", len(active_listings))
     
-    # Process listings to include coordinates
-    processed_listings = []
-    cached_count = 0
-    geocoded_count = 0
+    # Coordinates and their source by listing position; listings that can't be
+    # resolved locally are geocoded concurrently
+    coordinates: Dict[int, Dict[str, float]] = {}
+    sources: Dict[int, str] = {}
+    geocodes: Dict[int, Future] = {}
     
     for i, listing in enumerate(active_listings):
         # Extract address
         address = get_address_from_listing(listing)
+        logger.debug(
+            "Processing listing %s/%s: %s", i + 1, len(active_listings), address
+        )
         
-        # Skip listings without a valid address
-        if not address:
-            logger.warning(f"Listing {i+1}/{len(active_listings)} skipped: No valid address found")
-            continue
-            
-        logger.debug(f"Processing listing {i+1}/{len(active_listings)}: {address}")
-        
-        # Check if we already have coordinates for this address
-        coordinates = None
-        
-        # Check geocoding database first
-        if geocoding_db.address_exists_in_db(address):
-            # Fetch from database
-            cursor = geocoding_db.conn.cursor()
-            cursor.execute("SELECT lat, lon FROM geocoding_results WHERE address = ?", (address,))
-            result = cursor.fetchone()
-            if result and result['lat'] and result['lon']:
-                coordinates = {"lat": result['lat'], "lng": result['lon']}
-                cached_count += 1
-                logger.debug(f"Found cached coordinates for {address}")
-        
-        # If not in database, geocode the address
-        if not coordinates:
-            logger.debug(f"Geocoding address: {address}")
-            result = geocoding_client.geocode_address(address)
-            
-            if result['success']:
-                coordinates = {
-                    "lat": result['coordinates']['lat'],
-                    "lng": result['coordinates']['lon']
-                }
-                geocoded_count += 1
-                logger.debug(f"Successfully geocoded {address}")
-                
-                # Save to database for future use
-                geocoding_db.save_geocoding_result(result)
-            else:
-                logger.warning(f"Failed to geocode address: {address}")
-        
-        # Only include listings with coordinates
-        if coordinates:
-            # Add coordinates to the listing
+        resolved, source = resolve_locally(listing, address, geocoding_db)
+        if resolved:
+            coordinates[i] = resolved
+            sources[i] = source
+        elif address:
+            logger.debug("Geocoding address: %s", address)
+            geocodes[i] = geocode_in_background(address, geocoding_client)
+        else:
+            # Skip listings without coordinates or a valid address
+            logger.warning(
+                "Listing %s/%s skipped: No valid address found",
+                i + 1,
+                len(active_listings),
+            )
+    
+    pending: List[int] = []
+    if geocodes:
+        waiters = {asyncio.wrap_future(future): i for i, future in geocodes.items()}
+        timeout = None
+        if deadline_ms:
+            timeout = max(0.0, deadline_ms / 1000 - (time.monotonic() - started))
+        done, not_done = await asyncio.wait(waiters, timeout=timeout)
+        pending = sorted(waiters[waiter] for waiter in not_done)
+        for waiter in done:
+            if waiter.exception() is not None:
+                logger.error("Error geocoding listing address: %s", waiter.exception())
+            elif waiter.result():
+                coordinates[waiters[waiter]] = waiter.result()
+                sources[waiters[waiter]] = SOURCE_GEOCODER
+    
+    # Only include listings with coordinates, in the order RESO returned them
+    processed_listings = []
+    for i, listing in enumerate(active_listings):
+        if i in coordinates:
             listing_with_coords = listing.copy()
-            listing_with_coords["coordinates"] = coordinates
+            listing_with_coords["coordinates"] = coordinates[i]
+            listing_with_coords["coordinates_source"] = sources[i]
             processed_listings.append(listing_with_coords)
-        else:
-            logger.warning(f"No coordinates found for {address}, excluding from results")
+        elif i in geocodes and i not in pending:
+            logger.warning("No coordinates found for %s, excluding from results",
+                           get_address_from_listing(listing))
     
-    logger.info(f"Processed {len(processed_listings)} listings with coordinates " +
-               f"(cached: {cached_count}, newly geocoded: {geocoded_count})")
+    if pending:
+        response.headers["X-Partial-Result"] = "true"
+        response.headers["X-Pending-Listings"] = ",".join(
+            str(active_listings[i].get("ListingKey", "")) for i in pending
+        )
+    
+    logger.info("Processed %s listings with coordinates (sources: %s, pending: %s)",
+                len(processed_listings), dict(Counter(sources.values())), len(pending))
+    
+    scores = await run_in_threadpool(
+        score_listings,
+        places_db,
+        [
+            (
+                listing.get("ListingKey"),
+                listing["coordinates"]["lat"],
+                listing["coordinates"]["lng"],
+            )
+            for listing in processed_listings
+            if listing.get("ListingKey")
+        ],
+    )
+    for listing in processed_listings:
+        listing["amenity_scores"] = scores.get(listing.get("ListingKey"))
+    if sort:
+        # Highest first, unscored listings last; ties keep the RESO order
+        scored = [
+            (listing["amenity_scores"] or {}).get(sort)
+            for listing in processed_listings
+        ]
+        order = sorted(
+            range(len(processed_listings)),
+            key=lambda i: (scored[i] is None, -(scored[i] or 0)),
+        )
+        processed_listings = [processed_listings[i] for i in order]
     
     return processed_listings
 
+@router.post("/amenities", response_model=AmenitiesResponse)
+async def get_nearest_amenities(
+    request: AmenitiesRequest,
+    places_db: PlacesCache = Depends(get_places_db)
+):
+    """
+    Get the nearest school, grocery store,
+    hospital and transit stop around many listings
+
+    - **locations**: Coordinates of each listing, with an optional `key` echoed back
+    - **max_distance**: Meters within which a nearest place is reported
+
+    Computed from cached places only (see app/services/amenities.py), so areas
+    without cached searches report no amenities. Also counts the places of each
+    category within its panel radius.
+    """
+    if len(request.locations) > settings.AMENITIES_MAX_LOCATIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {settings.AMENITIES_MAX_LOCATIONS} locations per request",
+        )
+    
+    results = await run_in_threadpool(
+        nearest_amenities,
+        places_db,
+        [(loc.lat, loc.lng) for loc in request.locations],
+        request.max_distance,
+    )
+    return {
+        "radii": AMENITY_RADII,
+        "results": [
+            {"key": loc.key, **result}
+            for loc, result in zip(request.locations, results)
+        ],
+    }
+
+@router.get("/scores", response_model=ListingScoresResponse)
+async def get_listing_scores(
+    sort: str = Query("walkability"),
+    limit: int = Query(20, ge=1, le=500),
+    offset: int = Query(0, ge=0)
+):
+    """
+    Get scored listings ordered by an amenity score, highest first
+    
+    - **sort**: walkability, school, grocery, hospital or transit (default: walkability)
+    - **limit**: Number of listings to return (default: 20, max: 500)
+    - **offset**: Number of listings to skip
+    
+    Read from the score table through the index on the score, so only listings
+    stored after /listings/active served them (on the next maintenance tick) or by
+    the neighborhood precomputation are included, and never those without a score.
+    """
+    validate_sort(sort)
+    
+    def top_listings() -> List[Dict[str, Any]]:
+        score_db = AmenityScoreDatabase()
+        try:
+            return score_db.top_listings(sort, limit, offset)
+        finally:
+            score_db.close()
+    
+    return {"sort": sort, "results": await run_in_threadpool(top_listings)}
+
 @router.get("/{listing_key}", response_model=Dict[str, Any])
 async def get_listing_details(
     listing_key: str,
@@ -116,12 +270,68 @@ async def get_listing_details(
     
     - **listing_key**: The unique key for the listing
     """
-    logger.info(f"Fetching details for listing: {listing_key}")
+    logger.info("Fetching details for listing: %s", listing_key)
     
-    listing = reso_client.get_listing(listing_key)
+    listing = await run_in_threadpool(reso_client.get_listing, listing_key)
     
     if not listing:
-        logger.warning(f"Listing not found: {listing_key}")
+        logger.warning("Listing not found: %s", listing_key)
         raise HTTPException(status_code=404, detail="Listing not found")
     
-    return listing 
\ No newline at end of file
+    return listing 
+
+@router.get("/{listing_key}/media/{index}")
+async def get_listing_media(
+    request: Request,
+    listing_key: str,
+    index: int = Path(ge=0),
+    w: Optional[int] = Query(None, ge=1, le=4096)
+):
+    """
+    Get a listing image resized for display
+
+    - **listing_key**: The unique key for the listing
+    - **index**: Position of the image in the listing's Media
+    - **w**: Width in pixels, rounded up to the next cached width (default
+      MEDIA_DEFAULT_WIDTH)
+
+    Served as WebP to clients accepting it, JPEG otherwise. Responses carry an
+    ETag (the SHA-256 of the image) and support Range requests.
+    """
+    if not LISTING_KEY_PATTERN.match(listing_key):
+        raise HTTPException(status_code=400, detail="Invalid listing key")
+    fmt = "webp" if "image/webp" in request.headers.get("accept", "") else "jpeg"
+    
+    # A second lookup renders the image again if its file was evicted in between
+    for _ in range(2):
+        media = await get_media(
+            listing_key, index, w or settings.MEDIA_DEFAULT_WIDTH, fmt
+        )
+        if "error" in media:
+            status_code = media.get("status_code")
+            if status_code in (403, 404, 410):
+                raise HTTPException(status_code=404, detail="Image not found")
+            if status_code is None or status_code == 429 or status_code >= 500:
+                raise HTTPException(
+                    status_code=503,
+                    detail="Listing media are unavailable, try again later",
+                )
+            raise HTTPException(
+                status_code=502,
+                detail=f"Listing image could not be served ({status_code})",
+            )
+        
+        response = blob_response(
+            request,
+            blob_store,
+            media["digest"],
+            media["content_type"],
+            settings.MEDIA_MAX_AGE,
+            headers={"Vary": "Accept"},
+        )
+        if response is not None:
+            return response
+        logger.warning("Media file %s was removed before it was sent", media["digest"])
+    raise HTTPException(
+        status_code=503, detail="Listing media are unavailable, try again later"
+    )
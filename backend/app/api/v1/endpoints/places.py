@@ -1,11 +1,18 @@
-from fastapi import APIRouter, Query, HTTPException, Response, Depends
-from typing import Optional
 import logging
-from starlette.responses import Response
+from typing import Any, Dict, Optional
 
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.metrics import record_cache_lookup
+from app.db.base import PlacesCache
+from app.db.factory import get_places_cache
 from app.models.schemas import PlacesResponse
+from app.services.blobs import blob_response
+from app.services.geo import parse_location, sort_by_distance
+from app.services.photos import PHOTO_REFERENCE_PATTERN, blob_store, get_photo
 from app.services.places import PlacesClient
-from app.models.database import PlacesDatabase
 
 logger = logging.getLogger("real-estate-api")
 
@@ -15,85 +22,217 @@ def get_places_client() -> PlacesClient:
     """Dependency to get the Places API client"""
     return PlacesClient()
 
-def get_places_db() -> PlacesDatabase:
-    """Dependency to get the Places database"""
-    db = PlacesDatabase()
+def get_places_db() -> PlacesCache:
+    """Dependency to get the Places cache"""
+    db = get_places_cache()
     try:
         yield db
     finally:
         db.close()
 
-@router.get("/nearby", response_model=PlacesResponse)
-async def nearby_search(
+def sorted_by_distance(results: Dict[str, Any], location: str) -> Dict[str, Any]:
+    """
+    Places results with each place's `distance_meters`
+    from the searched location, nearest first
+    """
+    try:
+        lat, lng = parse_location(location)
+    except ValueError:
+        return results
+    return {
+        **results,
+        "results": sort_by_distance(results.get("results", []), lat, lng),
+    }
+
+def search_places_cached(
+    places_client: PlacesClient,
+    places_db: PlacesCache,
     location: str,
-    radius: int = Query(1000, ge=100, le=50000),
-    type: str = "restaurant",
-    keyword: Optional[str] = None,
-    pagetoken: Optional[str] = None,
-    places_client: PlacesClient = Depends(get_places_client),
-    places_db: PlacesDatabase = Depends(get_places_db)
-):
+    radius: int,
+    place_type: str,
+    keyword: Optional[str],
+    pagetoken: Optional[str],
+    label: str
+) -> Dict[str, Any]:
     """
-    Search for places near a location
-    
-    - **location**: Comma-separated latitude and longitude (e.g., "30.267153,-97.743057")
-    - **radius**: Search radius in meters (max: 50000)
-    - **type**: Type of place to search for (e.g., restaurant, hospital, school)
-    - **keyword**: Optional search keyword to filter results
-    - **pagetoken**: Optional page token for pagination
+    Search for places, serving from the cache when a fresh entry exists
+    
+    Blocks on the provider (retry backoff, quota waits), so routes run it in
+    the threadpool.
+    
+    If the provider fails (or its circuit is open), an expired cache entry is
+    served instead; without one the request fails with 503 or 502.
+    
+    Args:
+        places_client: Places API client
+        places_db: Places cache
+        location: Comma-separated latitude and longitude
+        radius: Search radius in meters
+        place_type: Type of place to search for
+        keyword: Optional search keyword
+        pagetoken: Optional page token for pagination (bypasses the cache)
+        label: Description of the places searched for, used in log messages
+        
+    Returns:
+        Places search results, nearest first
     """
     # If using page token, bypass cache
     if pagetoken:
-        logger.info(f"Searching for places with page token: {pagetoken[:10]}...")
-        return places_client.search_nearby(
+        logger.info("Searching for %s with page token: %.10s...", label, pagetoken)
+        results = places_client.search_nearby(
             location=location,
             radius=radius,
-            place_type=type,
+            place_type=place_type,
             keyword=keyword,
             pagetoken=pagetoken
         )
+        if "error" in results:
+            raise_provider_error(results)
+        return sorted_by_distance(results, location)
     
     # Generate cache key for this request
-    location_key = places_client.generate_location_key(location, radius, type, keyword)
+    location_key = places_client.generate_location_key(
+        location, radius, place_type, keyword
+    )
     
-    # Check cache first
-    cached_results = places_db.get_cached_places(location_key)
-    if cached_results:
-        logger.info(f"Using cached results for {type} near {location}")
-        return cached_results
+    # Check cache first; expired entries are kept to fall back on if the provider fails
+    cached_results, expired = places_db.get_places_entry(location_key)
+    if cached_results and not expired:
+        record_cache_lookup("places", place_type, "hit")
+        logger.info("Using cached results for %s near %s", label, location)
+        return sorted_by_distance(cached_results, location)
+    record_cache_lookup("places", place_type, "stale" if cached_results else "miss")
     
     # If not cached, make API request
     results = places_client.search_nearby(
         location=location,
         radius=radius,
-        place_type=type,
+        place_type=place_type,
         keyword=keyword
     )
     
-    # Cache the results if successful
-    if "error" not in results:
-        places_db.cache_places(
-            location_key=location_key,
-            location=location,
-            radius=radius,
-            place_type=type,
-            keyword=keyword,
-            results=results
-        )
+    if "error" in results:
+        if cached_results:
+            logger.warning(
+                "Places provider failed, serving expired results for %s near %s",
+                label,
+                location,
+            )
+            return sorted_by_distance(cached_results, location)
+        raise_provider_error(results)
+    
+    # Cache the successful results
+    places_db.cache_places(
+        location_key=location_key,
+        location=location,
+        radius=radius,
+        place_type=place_type,
+        keyword=keyword,
+        results=results
+    )
     
-    return results
+    return sorted_by_distance(results, location)
+
+def raise_provider_error(results: Dict[str, Any]) -> None:
+    """
+    Answer a failed places search with 503 if the provider is unavailable, 502 otherwise
+    """
+    status_code = results.get("status_code")
+    if status_code is None or status_code == 429 or status_code >= 500:
+        raise HTTPException(
+            status_code=503, detail="Places provider is unavailable, try again later"
+        )
+    raise HTTPException(
+        status_code=502, detail=f"Places provider rejected the search ({status_code})"
+    )
+
+@router.get("/nearby", response_model=PlacesResponse)
+async def nearby_search(
+    location: str,
+    radius: int = Query(1000, ge=100, le=50000),
+    type: str = "restaurant",
+    keyword: Optional[str] = None,
+    pagetoken: Optional[str] = None,
+    places_client: PlacesClient = Depends(get_places_client),
+    places_db: PlacesCache = Depends(get_places_db)
+):
+    """
+    Search for places near a location
 
+    - **location**: Comma-separated latitude and longitude (e.g.,
+      "30.267153,-97.743057")
+    - **radius**: Search radius in meters (max: 50000)
+    - **type**: Type of place to search for (e.g., restaurant, hospital, school)
+    - **keyword**: Optional search keyword to filter results
+    - **pagetoken**: Optional page token for pagination
+    """
+    return await run_in_threadpool(
+        search_places_cached,
+        places_client,
+        places_db,
+        location,
+        radius,
+        type,
+        keyword,
+        pagetoken,
+        label=type,
+    )
+
+@router.get("/photo")
+async def place_photo(
+    request: Request,
+    photo_reference: str,
+    max_width: Optional[int] = Query(None, ge=1, le=4800),
+    max_height: Optional[int] = Query(None, ge=1, le=4800)
+):
+    """
+    Get a place photo through the photo cache
+
+    - **photo_reference**: `photo_reference` of a photo in a places result
+    - **max_width**: Maximum width in pixels (default
+      PHOTO_DEFAULT_WIDTH if no height is given)
+    - **max_height**: Maximum height in pixels
+
+    Responses carry an ETag (the SHA-256 of the image) and support Range requests.
+    """
+    if not PHOTO_REFERENCE_PATTERN.match(photo_reference):
+        raise HTTPException(status_code=400, detail="Invalid photo reference")
+    if not max_width and not max_height:
+        max_width = settings.PHOTO_DEFAULT_WIDTH
+    
+    # A second lookup downloads the photo again if its file was evicted in between
+    for _ in range(2):
+        photo = await get_photo(photo_reference, max_width, max_height)
+        if "error" in photo:
+            if photo.get("status_code") in (400, 404):
+                raise HTTPException(status_code=404, detail="Photo not found")
+            raise_provider_error(photo)
+        
+        response = blob_response(
+            request,
+            blob_store,
+            photo["digest"],
+            photo["content_type"],
+            settings.PHOTO_MAX_AGE,
+        )
+        if response is not None:
+            return response
+        logger.warning("Photo file %s was removed before it was sent", photo["digest"])
+    raise HTTPException(status_code=503, detail="Photo is unavailable, try again later")
 
 @router.post("/clear-cache")
 async def clear_places_cache(
-    places_db: PlacesDatabase = Depends(get_places_db)
+    places_db: PlacesCache = Depends(get_places_db)
 ):
     """
     Clear the places cache to force fetching fresh data from API
     """
     try:
         result = places_db.clear_cache("places")
-        logger.info(f"Places cache cleared. Deleted {result['deleted'].get('places', 0)} entries.")
+        logger.info(
+            "Places cache cleared. Deleted %s entries.",
+            result['deleted'].get('places', 0),
+        )
         return {"success": True, "message": f"Places cache cleared. Deleted {result['deleted'].get('places', 0)} entries."}
     except Exception as e:
         logger.error(f"Error clearing places cache: {str(e)}")
@@ -106,7 +245,7 @@ async def nearby_schools(
     keyword: Optional[str] = None,
     pagetoken: Optional[str] = None,
     places_client: PlacesClient = Depends(get_places_client),
-    places_db: PlacesDatabase = Depends(get_places_db)
+    places_db: PlacesCache = Depends(get_places_db)
 ):
     """
     Search for schools near a location
@@ -119,46 +258,17 @@ async def nearby_schools(
     # Set the type to school
     place_type = "school"
     
-    # If using page token, bypass cache
-    if pagetoken:
-        logger.info(f"Searching for schools with page token: {pagetoken[:10]}...")
-        return places_client.search_nearby(
-            location=location,
-            radius=radius,
-            place_type=place_type,
-            keyword=keyword,
-            pagetoken=pagetoken
-        )
-    
-    # Generate cache key for this request
-    location_key = places_client.generate_location_key(location, radius, place_type, keyword)
-    
-    # Check cache first
-    cached_results = places_db.get_cached_places(location_key)
-    if cached_results:
-        logger.info(f"Using cached results for schools near {location}")
-        return cached_results
-    
-    # If not cached, make API request
-    results = places_client.search_nearby(
-        location=location,
-        radius=radius,
-        place_type=place_type,
-        keyword=keyword
+    return await run_in_threadpool(
+        search_places_cached,
+        places_client,
+        places_db,
+        location,
+        radius,
+        place_type,
+        keyword,
+        pagetoken,
+        label="schools",
     )
-    
-    # Cache the results if successful
-    if "error" not in results:
-        places_db.cache_places(
-            location_key=location_key,
-            location=location,
-            radius=radius,
-            place_type=place_type,
-            keyword=keyword,
-            results=results
-        )
-    
-    return results
 
 @router.get("/hospitals", response_model=PlacesResponse)
 async def nearby_hospitals(
@@ -167,7 +277,7 @@ async def nearby_hospitals(
     keyword: Optional[str] = None,
     pagetoken: Optional[str] = None,
     places_client: PlacesClient = Depends(get_places_client),
-    places_db: PlacesDatabase = Depends(get_places_db)
+    places_db: PlacesCache = Depends(get_places_db)
 ):
     """
     Search for hospitals near a location
@@ -180,46 +290,17 @@ async def nearby_hospitals(
     # Set the type to hospital
     place_type = "hospital"
     
-    # If using page token, bypass cache
-    if pagetoken:
-        logger.info(f"Searching for hospitals with page token: {pagetoken[:10]}...")
-        return places_client.search_nearby(
-            location=location,
-            radius=radius,
-            place_type=place_type,
-            keyword=keyword,
-            pagetoken=pagetoken
-        )
-    
-    # Generate cache key for this request
-    location_key = places_client.generate_location_key(location, radius, place_type, keyword)
-    
-    # Check cache first
-    cached_results = places_db.get_cached_places(location_key)
-    if cached_results:
-        logger.info(f"Using cached results for hospitals near {location}")
-        return cached_results
-    
-    # If not cached, make API request
-    results = places_client.search_nearby(
-        location=location,
-        radius=radius,
-        place_type=place_type,
-        keyword=keyword
+    return await run_in_threadpool(
+        search_places_cached,
+        places_client,
+        places_db,
+        location,
+        radius,
+        place_type,
+        keyword,
+        pagetoken,
+        label="hospitals",
     )
-    
-    # Cache the results if successful
-    if "error" not in results:
-        places_db.cache_places(
-            location_key=location_key,
-            location=location,
-            radius=radius,
-            place_type=place_type,
-            keyword=keyword,
-            results=results
-        )
-    
-    return results
 
 @router.get("/grocery", response_model=PlacesResponse)
 async def nearby_grocery(
@@ -228,7 +309,7 @@ async def nearby_grocery(
     keyword: Optional[str] = None,
     pagetoken: Optional[str] = None,
     places_client: PlacesClient = Depends(get_places_client),
-    places_db: PlacesDatabase = Depends(get_places_db)
+    places_db: PlacesCache = Depends(get_places_db)
 ):
     """
     Search for grocery stores near a location
@@ -241,46 +322,17 @@ async def nearby_grocery(
     # Set the type to grocery_or_supermarket
     place_type = "supermarket"
     
-    # If using page token, bypass cache
-    if pagetoken:
-        logger.info(f"Searching for grocery stores with page token: {pagetoken[:10]}...")
-        return places_client.search_nearby(
-            location=location,
-            radius=radius,
-            place_type=place_type,
-            keyword=keyword,
-            pagetoken=pagetoken
-        )
-    
-    # Generate cache key for this request
-    location_key = places_client.generate_location_key(location, radius, place_type, keyword)
-    
-    # Check cache first
-    cached_results = places_db.get_cached_places(location_key)
-    if cached_results:
-        logger.info(f"Using cached results for grocery stores near {location}")
-        return cached_results
-    
-    # If not cached, make API request
-    results = places_client.search_nearby(
-        location=location,
-        radius=radius,
-        place_type=place_type,
-        keyword=keyword
+    return await run_in_threadpool(
+        search_places_cached,
+        places_client,
+        places_db,
+        location,
+        radius,
+        place_type,
+        keyword,
+        pagetoken,
+        label="grocery stores",
     )
-    
-    # Cache the results if successful
-    if "error" not in results:
-        places_db.cache_places(
-            location_key=location_key,
-            location=location,
-            radius=radius,
-            place_type=place_type,
-            keyword=keyword,
-            results=results
-        )
-    
-    return results
 
 @router.get("/transportation", response_model=PlacesResponse)
 async def nearby_transportation(
@@ -289,7 +341,7 @@ async def nearby_transportation(
     keyword: Optional[str] = None,
     pagetoken: Optional[str] = None,
     places_client: PlacesClient = Depends(get_places_client),
-    places_db: PlacesDatabase = Depends(get_places_db)
+    places_db: PlacesCache = Depends(get_places_db)
 ):
     """
     Search for public transportation near a location
@@ -302,43 +354,14 @@ async def nearby_transportation(
     # Set the type to transit_station
     place_type = "transit_station"
     
-    # If using page token, bypass cache
-    if pagetoken:
-        logger.info(f"Searching for transportation with page token: {pagetoken[:10]}...")
-        return places_client.search_nearby(
-            location=location,
-            radius=radius,
-            place_type=place_type,
-            keyword=keyword,
-            pagetoken=pagetoken
-        )
-    
-    # Generate cache key for this request
-    location_key = places_client.generate_location_key(location, radius, place_type, keyword)
-    
-    # Check cache first
-    cached_results = places_db.get_cached_places(location_key)
-    if cached_results:
-        logger.info(f"Using cached results for transportation near {location}")
-        return cached_results
-    
-    # If not cached, make API request
-    results = places_client.search_nearby(
-        location=location,
-        radius=radius,
-        place_type=place_type,
-        keyword=keyword
-    )
-    
-    # Cache the results if successful
-    if "error" not in results:
-        places_db.cache_places(
-            location_key=location_key,
-            location=location,
-            radius=radius,
-            place_type=place_type,
-            keyword=keyword,
-            results=results
-        )
-    
-    return results 
\ No newline at end of file
+    return await run_in_threadpool(
+        search_places_cached,
+        places_client,
+        places_db,
+        location,
+        radius,
+        place_type,
+        keyword,
+        pagetoken,
+        label="transportation",
+    )
\ No newline at end of file
@@ -1,25 +1,66 @@
-from fastapi import APIRouter, Query, HTTPException, Depends
-from typing import Dict, Any, Optional
+import asyncio
 import logging
-import sqlite3
 import os
+import secrets
+import tempfile
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import FileResponse, PlainTextResponse
+from starlette.background import BackgroundTask
 
-from app.models.database import PlacesDatabase
 from app.core.config import settings
-from app.models.schemas import CacheStats, CacheClearResponse
+from app.core.maintenance import maintenance_scheduler
+from app.core.metrics import CONTENT_TYPE, REGISTRY
+from app.core.profiler import ProfilerBusyError, profile
+from app.core.snapshot import (
+    SnapshotError,
+    SnapshotTooLargeError,
+    export_snapshot,
+    import_snapshot,
+)
+from app.db.base import PlacesCache
+from app.db.factory import get_places_cache
+from app.models.database import MediaDatabase, PhotoDatabase
+from app.models.schemas import (
+    CacheClearResponse,
+    CacheStats,
+    CircuitBreakerState,
+    MaintenanceStatus,
+    PrecomputeStatus,
+    QuotaState,
+    SnapshotImportResponse,
+)
+from app.services.media import clear_media
+from app.services.neighborhoods import precompute_scheduler
+from app.services.photos import clear_photos
+from app.services.quota import quota_states
+from app.services.resilience import breaker_states
 
 logger = logging.getLogger("real-estate-api")
 
 router = APIRouter()
 
-def get_places_db() -> PlacesDatabase:
-    """Dependency to get the Places database"""
-    db = PlacesDatabase()
+def get_places_db() -> PlacesCache:
+    """Dependency to get the Places cache"""
+    db = get_places_cache()
     try:
         yield db
     finally:
         db.close()
 
+def require_admin(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Dependency restricting an endpoint to callers presenting ADMIN_TOKEN"""
+    if not settings.ADMIN_TOKEN:
+        raise HTTPException(
+            status_code=403,
+            detail="Admin endpoints are disabled (ADMIN_TOKEN is not set)",
+        )
+    if not x_admin_token or not secrets.compare_digest(
+        x_admin_token, settings.ADMIN_TOKEN
+    ):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
 def format_size(size_bytes: int) -> str:
     """Format bytes to human readable format"""
     if size_bytes < 1024:
@@ -37,11 +78,33 @@ async def health_check():
         "version": "1.0.0"
     }
 
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Application metrics in the Prometheus text exposition format"""
+    return PlainTextResponse(REGISTRY.expose(), media_type=CONTENT_TYPE)
+
+@router.get("/upstream/breakers", response_model=List[CircuitBreakerState])
+async def upstream_breakers():
+    """Get the circuit breaker state of each upstream provider"""
+    return breaker_states()
+
+@router.get("/upstream/quotas", response_model=List[QuotaState])
+async def upstream_quotas():
+    """Get the rate limit and daily usage of each rate-limited provider"""
+    return quota_states()
+
 @router.get("/cache/stats", response_model=CacheStats)
-async def cache_stats(places_db: PlacesDatabase = Depends(get_places_db)):
+async def cache_stats(places_db: PlacesCache = Depends(get_places_db)):
     """Get cache statistics"""
     # Get cache stats from database
     stats = places_db.get_cache_stats()
+    blob_stats = {}
+    for name, database in (("photos", PhotoDatabase), ("media", MediaDatabase)):
+        blob_db = database()
+        try:
+            blob_stats[name] = blob_db.get_cache_stats()
+        finally:
+            blob_db.close()
     
     # Calculate database file size if it exists
     db_size = None
@@ -54,7 +117,9 @@ async def cache_stats(places_db: PlacesDatabase = Depends(get_places_db)):
     # Format the sizes for display
     formatted_stats = {
         "places": stats["places"],
-        "photos": stats["photos"],
+        "geocoding": stats.get("geocoding"),
+        "photos": blob_stats["photos"],
+        "media": blob_stats["media"],
         "total_cache_size": stats["total_cache_size"],
         "total_cache_size_formatted": format_size(stats["total_cache_size"]),
         "db_size": db_size,
@@ -66,18 +131,26 @@ async def cache_stats(places_db: PlacesDatabase = Depends(get_places_db)):
 @router.delete("/cache/clear", response_model=CacheClearResponse)
 async def clear_cache(
     type: Optional[str] = None,
-    places_db: PlacesDatabase = Depends(get_places_db)
+    places_db: PlacesCache = Depends(get_places_db)
 ):
     """
     Clear the cache
-    
-    - **type**: Optional type of cache to clear (places or photos). If not specified, clears all cache.
+
+    - **type**: Optional type of cache to clear (places, photos or media). If not
+      specified, clears all cache.
     """
-    if type and type not in ["places", "photos"]:
-        raise HTTPException(status_code=400, detail="Invalid cache type. Must be 'places' or 'photos'")
+    if type and type not in ["places", "photos", "media"]:
+        raise HTTPException(
+            status_code=400,
+            detail="Invalid cache type. Must be 'places', 'photos' or 'media'",
+        )
     
     try:
         result = places_db.clear_cache(type)
+        if type is None or type == "photos":
+            result["deleted"]["photos"] = clear_photos()
+        if type is None or type == "media":
+            result["deleted"]["media"] = clear_media()
         
         deleted_count = sum(result["deleted"].values())
         type_str = f"{type} " if type else ""
@@ -89,4 +162,143 @@ async def clear_cache(
         }
     except Exception as e:
         logger.error(f"Error clearing cache: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error clearing cache: {str(e)}") 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error clearing cache: {str(e)}") 
+
+@router.get("/cache/maintenance", response_model=MaintenanceStatus)
+async def maintenance_status():
+    """Get progress of the in-process cache maintenance job"""
+    return maintenance_scheduler.get_status()
+
+@router.post(
+    "/cache/maintenance/run",
+    response_model=MaintenanceStatus,
+    dependencies=[Depends(require_admin)],
+)
+async def run_maintenance():
+    """Run one time-bounded cache maintenance tick now (requires `X-Admin-Token`)"""
+    await maintenance_scheduler.run_once()
+    return maintenance_scheduler.get_status()
+
+@router.get("/cache/precompute", response_model=PrecomputeStatus)
+async def precompute_status():
+    """Get progress of the background neighborhood precomputation"""
+    return precompute_scheduler.get_status()
+
+@router.post(
+    "/cache/precompute/run",
+    response_model=PrecomputeStatus,
+    dependencies=[Depends(require_admin)],
+)
+async def run_precompute():
+    """
+    Precompute the nearby places of the active listings now
+
+    Calls the places provider for every stale search,
+    so it requires the `X-Admin-Token` header.
+    """
+    return await precompute_scheduler.run_once()
+
+@router.get("/cache/snapshot", dependencies=[Depends(require_admin)])
+async def export_cache_snapshot():
+    """
+    Download a compressed, checksummed snapshot of the live geocoding and places caches
+
+    Holds every cached address and search, so it requires the `X-Admin-Token` header.
+    """
+    fd, path = tempfile.mkstemp(suffix=".snapshot")
+    os.close(fd)
+    try:
+        result = await asyncio.to_thread(export_snapshot, path)
+    except Exception as e:
+        os.remove(path)
+        logger.error(f"Error exporting cache snapshot: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Error exporting cache snapshot: {str(e)}"
+        )
+    
+    return FileResponse(
+        path,
+        media_type="application/octet-stream",
+        filename="cache.snapshot",
+        headers={"X-Snapshot-SHA256": result["checksum"]},
+        background=BackgroundTask(os.remove, path)
+    )
+
+@router.post(
+    "/cache/snapshot",
+    response_model=SnapshotImportResponse,
+    dependencies=[Depends(require_admin)],
+)
+async def import_cache_snapshot(request: Request):
+    """
+    Load a cache snapshot into the local cache
+
+    The request body is the snapshot file produced by `GET /cache/snapshot` or
+    `cache_snapshot.py export`. It replaces cached rows, so it requires the
+    `X-Admin-Token` header. Snapshots larger than SNAPSHOT_MAX_UPLOAD_BYTES, or
+    decompressing to more than SNAPSHOT_MAX_BYTES, are rejected with 413.
+    """
+    too_large = HTTPException(
+        status_code=413,
+        detail=f"Snapshot is larger than {settings.SNAPSHOT_MAX_UPLOAD_BYTES} bytes",
+    )
+    content_length = request.headers.get("content-length")
+    if content_length and content_length.isdigit() and (
+        int(content_length) > settings.SNAPSHOT_MAX_UPLOAD_BYTES
+    ):
+        raise too_large
+
+    fd, path = tempfile.mkstemp(suffix=".snapshot")
+    try:
+        received = 0
+        with os.fdopen(fd, "wb") as snapshot_file:
+            async for chunk in request.stream():
+                received += len(chunk)
+                if received > settings.SNAPSHOT_MAX_UPLOAD_BYTES:
+                    raise too_large
+                snapshot_file.write(chunk)
+        return await asyncio.to_thread(import_snapshot, path)
+    except HTTPException:
+        raise
+    except SnapshotTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except SnapshotError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid snapshot: {str(e)}")
+    except Exception as e:
+        logger.error(f"Error importing cache snapshot: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Error importing cache snapshot: {str(e)}"
+        )
+    finally:
+        os.remove(path)
+
+@router.post(
+    "/profile",
+    response_class=PlainTextResponse,
+    dependencies=[Depends(require_admin)],
+)
+async def record_profile(
+    seconds: float = Query(
+        10,
+        gt=0,
+        le=settings.PROFILER_MAX_SECONDS,
+        description="Sampling duration in seconds",
+    )
+):
+    """
+    Sample the stacks of all threads for a number of seconds
+    
+    Returns collapsed stacks (one `frame;frame;... count` line per stack) for
+    flamegraph.pl or speedscope. Requires the `X-Admin-Token` header.
+    """
+    try:
+        folded, samples = await profile(seconds)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return PlainTextResponse(
+        folded,
+        headers={
+            "Content-Disposition": 'attachment; filename="profile.folded"',
+            "X-Profile-Samples": str(samples)
+        }
+    )
@@ -1,8 +1,9 @@
 import os
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
 from pydantic import Field
 from pydantic_settings import BaseSettings
-from typing import List
-from dotenv import load_dotenv
 
 load_dotenv()
 
@@ -16,6 +17,96 @@ class Settings(BaseSettings):
     # Database settings
     DB_PATH: str = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data/database.db')
     CACHE_EXPIRATION: int = 5 * 24 * 60 * 60  # 5 days in seconds
+    # Expired places entries are kept this much
+    # longer, to be served while a provider fails
+    CACHE_STALE_TTL: int = 2 * 24 * 60 * 60
+    
+    # Cache backend settings ("sqlite" keeps a
+    # private cache per node, "redis" shares one)
+    CACHE_BACKEND: str = "sqlite"
+    REDIS_URL: str = "redis://localhost:6379/0"
+    REDIS_KEY_PREFIX: str = "real-estate:"
+    REDIS_SOCKET_TIMEOUT: float = 2.0
+    
+    # Cache size budgets in bytes per SQLite cache table (0 disables the budget)
+    PLACES_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    GEOCODING_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    CACHE_EVICTION_POLICY: str = "lru"  # "lru" or "lfu"
+    CACHE_EVICTION_TARGET: float = 0.9  # Evict down to this fraction of the budget
+    # Cache hits are noted in memory and written in batches; the read path writes them
+    # once this many are waiting (maintenance ticks write them otherwise)
+    ACCESS_LOG_MAX_PENDING: int = 1000
+    
+    # Keep the full Geoapify response for each geocoded address (only lat/lon and
+    # address components are read, and those are stored in their own columns)
+    GEOCODING_STORE_RAW_RESPONSE: bool = False
+    
+    # In-process cache maintenance (expired entry cleanup and incremental vacuum)
+    MAINTENANCE_ENABLED: bool = True
+    MAINTENANCE_INTERVAL: int = 60  # Seconds between maintenance ticks
+    MAINTENANCE_TICK_BUDGET: float = 0.5  # Seconds of work per tick
+    MAINTENANCE_DELETE_CHUNK: int = 500  # Rows deleted per transaction
+    MAINTENANCE_VACUUM_PAGES: int = 256  # Pages released per incremental_vacuum step
+    MAINTENANCE_CHECKPOINT_EVERY: int = 10  # Chunks between WAL checkpoints
+    
+    # Cache snapshots: largest snapshot accepted by POST /cache/snapshot, and largest
+    # database a snapshot may decompress to
+    SNAPSHOT_MAX_UPLOAD_BYTES: int = 512 * 1024 * 1024
+    SNAPSHOT_MAX_BYTES: int = 2 * 1024 * 1024 * 1024
+    
+    # Active listings: geocoding concurrency, and the default time after which the
+    # listings resolved so far are returned while the rest are geocoded in the
+    # background
+    GEOCODING_CONCURRENCY: int = 8
+    LISTINGS_DEADLINE_MS: int = 0  # 0 waits for every listing
+    
+    # Background precomputation of the nearby places shown in listing panels (see
+    # app/services/neighborhoods.py); every stale search is a Google Places call
+    PRECOMPUTE_ENABLED: bool = False
+    PRECOMPUTE_INTERVAL: int = 3600  # Seconds between runs
+    PRECOMPUTE_LISTINGS: int = 500  # Active listings covered per run
+    
+    # Backfills through the Geoapify batch API (see geocode_backfill.py)
+    GEOCODING_BATCH_SIZE: int = 1000  # Addresses per batch job (at most 1000)
+    GEOCODING_BATCH_POLL_INTERVAL: float = 5.0  # Seconds between job status checks
+    GEOCODING_BATCH_TIMEOUT: float = 1800.0  # Seconds to wait for a job before a resume
+    
+    # Place photo proxy (see app/services/photos.py): photos are kept as files named
+    # by the SHA-256 of their content, least recently used evicted beyond the budget
+    PHOTO_CACHE_DIR: str = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data/photos'
+    )
+    PHOTO_CACHE_MAX_BYTES: int = 512 * 1024 * 1024
+    PHOTO_DEFAULT_WIDTH: int = 400  # Pixels, without max_width or max_height
+    PHOTO_MAX_AGE: int = 24 * 60 * 60  # Cache-Control max-age, in seconds
+    PHOTO_FETCH_CONCURRENCY: int = 4
+    
+    # Listing media thumbnails (see app/services/media.py): each source image is
+    # downloaded once and resized to every width of MEDIA_WIDTHS, in every format;
+    # requested widths are rounded up to the next of these
+    MEDIA_CACHE_DIR: str = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data/media'
+    )
+    MEDIA_CACHE_MAX_BYTES: int = 1024 * 1024 * 1024
+    MEDIA_WIDTHS: List[int] = Field(default_factory=lambda: [160, 320, 640, 1280])
+    MEDIA_DEFAULT_WIDTH: int = 320
+    MEDIA_QUALITY: int = 80  # WebP and JPEG encoder quality
+    MEDIA_MAX_AGE: int = 7 * 24 * 60 * 60  # Cache-Control max-age, in seconds
+    MEDIA_WORKERS: int = 4  # Threads downloading and resizing source images
+    
+    # Locations per batch nearest-amenity request (POST /listings/amenities)
+    AMENITIES_MAX_LOCATIONS: int = 1000
+    
+    # Listing amenity scores (see app/services/amenities.py): each cached place within
+    # its category's radius counts exp(-distance / AMENITY_DECAY_METERS) towards the
+    # category's score, and walkability weighs the category scores by
+    # AMENITY_SCORE_WEIGHTS
+    AMENITY_DECAY_METERS: float = 500.0
+    AMENITY_SCORE_WEIGHTS: Dict[str, float] = Field(
+        default_factory=lambda: {
+            "grocery": 0.3, "transit": 0.3, "school": 0.2, "hospital": 0.2
+        }
+    )
     
     # API keys (from environment variables)
     RESO_SERVER_TOKEN: str = os.getenv("RESO_SERVER_TOKEN", "")
@@ -27,15 +118,79 @@ class Settings(BaseSettings):
     DATA_DIR: str = os.path.join(BASE_DIR, "data")
     LOGS_DIR: str = os.path.join(os.path.dirname(BASE_DIR), "logs/backend")
     
+    # Upstream providers: "live", "record" (live, saving every exchange as a fixture)
+    # or "replay" (recorded exchanges served by a local stand-in server)
+    UPSTREAM_MODE: str = "live"
+    UPSTREAM_FIXTURES_DIR: str = os.path.join(BASE_DIR, "fixtures/upstream")
+    UPSTREAM_POOL_SIZE: int = 32  # Pooled connections per provider host
+    UPSTREAM_CONNECT_TIMEOUT: float = 3.05  # Seconds
+    UPSTREAM_READ_TIMEOUT: float = 10.0  # Seconds to wait for response data
+    UPSTREAM_RETRIES: int = 2  # Retries of timeouts, connection errors, 429 and 5xx
+    UPSTREAM_BACKOFF_BASE: float = 0.25  # Retry n waits a random 0..base * 2^n seconds
+    UPSTREAM_BACKOFF_MAX: float = 5.0  # Longest wait before a retry (caps Retry-After)
+    CIRCUIT_FAILURE_THRESHOLD: int = 5  # Consecutive failures opening a circuit
+    CIRCUIT_RESET_TIMEOUT: float = 30.0  # Seconds failing fast before a trial call
+    # Client-side rate limits per provider (see app/services/quota.py); unlisted
+    # providers are unlimited
+    QUOTA_RATES: Dict[str, float] = Field(
+        default_factory=lambda: {"google_places": 10.0, "geoapify": 5.0}
+    )  # Calls per second
+    QUOTA_BURST: Dict[str, int] = Field(
+        default_factory=lambda: {"google_places": 20, "geoapify": 10}
+    )
+    QUOTA_MAX_WAIT: float = 2.0  # Seconds a user request's call may queue
+    QUOTA_BACKGROUND_MAX_WAIT: float = 60.0  # Same for background work
+    # Calls per UTC day after which a provider is
+    # no longer called and only the cache is used
+    QUOTA_DAILY_LIMITS: Dict[str, int] = Field(default_factory=dict)
+    REPLAY_SERVER_URL: str = ""  # Empty starts a stand-in server inside the API process
+    REPLAY_LATENCY_MS: Optional[float] = None  # None replays the recorded latency
+    REPLAY_JITTER_MS: float = 0
+    REPLAY_ERROR_RATE: float = 0.0  # Fraction of replayed calls answered with an error
+    REPLAY_ERROR_STATUS: int = 503
+    REPLAY_BATCH_JOB_MS: float = 1000  # Stand-in time to finish a batch job
+    
+    # Logging: records are written by a background thread (see
+    # app/core/logging_config.py)
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"  # "json" (one object per line) or "text"
+    LOG_QUEUE_SIZE: int = 10000  # Records beyond this are dropped, not waited on
+    # Fraction of requests whose DEBUG/INFO lines are logged, by path prefix (longest
+    # prefix wins); empty logs every request, e.g. {"/api/places/": 0.1} to opt in
+    LOG_SAMPLE_RATES: Dict[str, float] = Field(default_factory=dict)
+    
+    # Collect request, cache and upstream metrics for the /metrics endpoint
+    METRICS_ENABLED: bool = True
+    
+    # Emit a Server-Timing header and a timing log line for every request
+    SERVER_TIMING_ENABLED: bool = False
+    
+    # Token for admin endpoints such as the profiler (sent as X-Admin-Token; empty
+    # disables them)
+    ADMIN_TOKEN: str = os.getenv("ADMIN_TOKEN", "")
+    
+    # On-demand stack sampling profiler
+    PROFILER_SAMPLE_INTERVAL: float = 0.005  # Seconds between stack samples
+    PROFILER_MAX_SECONDS: int = 60
+    
+    # Save span timings and a stack profile of requests
+    # slower than this to LOGS_DIR (0 disables)
+    SLOW_REQUEST_THRESHOLD_MS: int = 0
+    SLOW_REQUEST_SAMPLE_INTERVAL: float = 0.02  # Seconds between stack samples
+    SLOW_REQUEST_WINDOW: int = 30  # Seconds of samples kept in memory
+    SLOW_REQUEST_MAX_FILES: int = 200  # Oldest captures are removed beyond this
+    
     # CORS settings
     CORS_ORIGINS: List[str] = Field(default_factory=lambda: ["*"])  # Allow all origins in development
     
     # External API configuration
     RESO_BASE_URL: str = "https://api.bridgedataoutput.com/api/v2/OData/"
     GEOAPIFY_BASE_URL: str = "https://api.geoapify.com/v1/geocode/search"
+    GEOAPIFY_BATCH_URL: str = "https://api.geoapify.com/v1/batch/geocode/search"
     PLACES_API_BASE_URL: str = "https://places.googleapis.com/v1/places:searchNearby"
     PLACE_PHOTO_API_URL: str = "https://maps.googleapis.com/maps/api/place/photo"
-    PLACE_PHOTO_API_URL_NEW: str = "https://places.googleapis.com/v1/photos:getMedia"
+    # Photo media is fetched from this URL + "/{photo name}/media"
+    PLACE_PHOTO_API_URL_NEW: str = "https://places.googleapis.com/v1"
 
     class Config:
         env_file = ".env"
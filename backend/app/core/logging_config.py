@@ -0,0 +1,166 @@
+"""
+Non-blocking logging pipeline
+
+Log calls only put the record on an in-memory queue; a QueueListener thread
+formats it and writes it to the console and LOGS_DIR/main.log, so a slow disk
+never turns into request latency. If the queue is full, records are dropped
+(and counted in the log_records_dropped_total metric) rather than blocking.
+
+High-volume routes can be sampled: LogContextMiddleware decides once per
+request, from LOG_SAMPLE_RATES, whether that request's DEBUG and INFO lines are
+kept, so sampled requests are logged completely. Warnings and errors are always
+kept.
+"""
+
+import atexit
+import copy
+import datetime
+import json
+import logging
+import os
+import queue
+import random
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+
+from app.core.config import settings
+from app.core.metrics import LOG_RECORDS_DROPPED
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+# Path of the request being handled, and whether its low-level lines are kept
+_request_path: ContextVar[Optional[str]] = ContextVar("log_request_path", default=None)
+_request_sampled: ContextVar[bool] = ContextVar("log_request_sampled", default=True)
+
+# Attributes every LogRecord has; anything else was passed with `extra=`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {
+    "message",
+    "asctime",
+}
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, including `extra` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.datetime.fromtimestamp(
+                record.created, datetime.timezone.utc
+            ).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full"""
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge the arguments now, while they still reflect the caller's state, but
+        # leave formatting to the listener's handlers so each can use its own format
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+
+class RequestSamplingFilter(logging.Filter):
+    """
+    Drop DEBUG and INFO lines of requests not sampled
+    for logging, and tag records with their path
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING and not _request_sampled.get():
+            return False
+        path = _request_path.get()
+        if path is not None:
+            record.path = path
+        return True
+
+
+def sample_rate(path: str) -> float:
+    """Fraction of requests to `path` whose DEBUG and INFO lines are logged"""
+    rate = 1.0
+    longest = -1
+    for prefix, prefix_rate in settings.LOG_SAMPLE_RATES.items():
+        if path.startswith(prefix) and len(prefix) > longest:
+            rate, longest = prefix_rate, len(prefix)
+    return rate
+
+
+class LogContextMiddleware(BaseHTTPMiddleware):
+    """Make the request path and its sampling decision available to log records"""
+
+    async def dispatch(self, request: Request, call_next):
+        path = request.url.path
+        rate = sample_rate(path)
+        path_token = _request_path.set(path)
+        sampled_token = _request_sampled.set(rate >= 1.0 or random.random() < rate)
+        try:
+            return await call_next(request)
+        finally:
+            _request_sampled.reset(sampled_token)
+            _request_path.reset(path_token)
+
+
+def configure_logging() -> None:
+    """Route all logging through a queue to the console and LOGS_DIR/main.log"""
+    global _listener
+    if _listener is not None:
+        return
+
+    os.makedirs(settings.LOGS_DIR, exist_ok=True)
+    formatter = (
+        JsonFormatter()
+        if settings.LOG_FORMAT == "json"
+        else logging.Formatter(TEXT_FORMAT)
+    )
+    handlers = [
+        logging.FileHandler(f"{settings.LOGS_DIR}/main.log"),
+        logging.StreamHandler()
+    ]
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler = DroppingQueueHandler(queue.Queue(settings.LOG_QUEUE_SIZE))
+    queue_handler.addFilter(RequestSamplingFilter())
+    logging.basicConfig(level=settings.LOG_LEVEL, handlers=[queue_handler])
+
+    _listener = QueueListener(
+        queue_handler.queue, *handlers, respect_handler_level=True
+    )
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Write out queued records and stop the listener thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
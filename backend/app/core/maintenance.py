@@ -1,34 +1,43 @@
-#!/usr/bin/env python3
 """
-Script to clear expired cache entries from the database
-This can be run as a scheduled task (e.g., with cron) to keep the cache size under control
+Cache maintenance: removal of expired cache entries and reclaiming of free pages
+
+Work is done in small steps so it never holds the database for long: expired
+rows are deleted in chunks of MAINTENANCE_DELETE_CHUNK rows per transaction,
+free pages are released with incremental_vacuum, and the WAL is checkpointed
+along the way. CacheMaintenance.run_tick performs as many steps as fit in a
+time budget and is scheduled in-process by MaintenanceScheduler;
+clear_expired_cache runs the same steps to completion for the command-line
+script. Each tick also writes the cache hits and amenity scores noted by
+requests since the last one.
 """
 
-import os
-import logging
+import asyncio
 import datetime
-import argparse
+import logging
+import os
+import sqlite3
+import threading
 import time
 import uuid
-import sqlite3
-from typing import Dict, Any
+from typing import Any, Dict, Optional, Tuple
 
 from app.core.config import settings
+from app.models.database import GeocodingDatabase, PlacesDatabase, access_log
+from app.services.amenities import refresh_seen_scores
 
-# Create log directory
-os.makedirs(settings.LOGS_DIR, exist_ok=True)
-
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(os.path.join(settings.LOGS_DIR, "cache_maintenance.log")),
-        logging.StreamHandler()
-    ]
-)
 logger = logging.getLogger("cache-maintenance")
 
+# Expiring cache tables by cache type, with the SQL size of an entry's payload (the
+# places stored for searches are accounted for by stored_places_size)
+EXPIRING_TABLES = {
+    "places": ("nearby_places", "size"),
+    "photos": ("place_photos", "size"),
+    "media": ("listing_media", "size"),
+}
+
+# PRAGMA auto_vacuum value for INCREMENTAL mode
+AUTO_VACUUM_INCREMENTAL = 2
+
 def format_size(size_bytes: int) -> str:
     """Format bytes to human readable format"""
     if size_bytes < 1024:
@@ -38,179 +47,500 @@ def format_size(size_bytes: int) -> str:
     else:
         return f"{size_bytes / (1024 * 1024):.2f} MB"
 
+def connect(db_path: str) -> sqlite3.Connection:
+    """
+    Open a maintenance connection that waits for, rather than fails on, busy writers
+    """
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode = WAL")
+    return conn
+
+def expiry_cutoff(extra_seconds: int = 0) -> str:
+    """
+    Timestamp before which cache entries are
+    expired, in the format rows are written with
+    """
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(
+        seconds=settings.CACHE_EXPIRATION + extra_seconds
+    )
+    return cutoff.strftime("%Y-%m-%d %H:%M:%S")
+
+def stale_cutoff() -> str:
+    """
+    Timestamp before which cache entries are removed
+
+    Entries are kept CACHE_STALE_TTL past their
+    expiration to be served while a provider fails.
+    """
+    return expiry_cutoff(settings.CACHE_STALE_TTL)
+
+def table_exists(conn: sqlite3.Connection, table: str) -> bool:
+    """Check whether a table exists in the database"""
+    cursor = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+    )
+    return cursor.fetchone() is not None
+
+def pragma_value(conn: sqlite3.Connection, pragma: str) -> int:
+    """Read a single-valued integer PRAGMA"""
+    return conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+
+def get_db_size(conn: sqlite3.Connection) -> int:
+    """Size of the database in bytes, excluding the WAL"""
+    return pragma_value(conn, "page_count") * pragma_value(conn, "page_size")
+
+def cache_totals(
+    conn: sqlite3.Connection, table: str, payload_size: str
+) -> Tuple[int, int]:
+    """
+    Entry count and byte size of a cache table
+
+    Read from the cache_statistics table the API keeps up to date; tables the
+    API has not opened yet fall back to a full scan.
+    """
+    if table_exists(conn, "cache_statistics"):
+        row = conn.execute(
+            "SELECT COUNT(*), SUM(entries), SUM(bytes) FROM cache_statistics "
+            "WHERE cache = ?",
+            (table,),
+        ).fetchone()
+        if row[0]:
+            return row[1], row[2]
+    row = conn.execute(f"SELECT COUNT(*), SUM({payload_size}) FROM {table}").fetchone()
+    return row[0], row[1] or 0
+
+def stored_places_size(conn: sqlite3.Connection, cutoff: str) -> Tuple[int, int]:
+    """
+    Bytes of the places stored for cached searches,
+    and of those freed with the expired searches
+
+    A place is freed once every search referencing it is deleted, so it counts as
+    expired when all of its references (places.refs) are expired searches.
+    """
+    if not table_exists(conn, "places"):
+        return 0, 0
+    total = conn.execute("SELECT IFNULL(SUM(size), 0) FROM places").fetchone()[0]
+    expired = conn.execute(
+        """
+        SELECT IFNULL(SUM(p.size), 0) FROM places AS p JOIN (
+            SELECT j.value AS id, COUNT(*) AS expired_refs
+            FROM nearby_places AS n, json_each(n.place_ids) AS j
+            WHERE n.timestamp < ? GROUP BY j.value
+        ) AS e ON e.id = p.id
+        WHERE p.refs <= e.expired_refs
+        """,
+        (cutoff,)
+    ).fetchone()[0]
+    return total, expired
+
+def delete_expired_chunk(
+    conn: sqlite3.Connection, table: str, cutoff: str, chunk_size: int
+) -> int:
+    """
+    Delete one chunk of expired entries in its own transaction
+
+    Args:
+        conn: Database connection
+        table: Cache table to clean
+        cutoff: Entries with an older timestamp are deleted
+        chunk_size: Maximum number of rows to delete
+
+    Returns:
+        Number of deleted rows
+    """
+    cursor = conn.execute(
+        f"DELETE FROM {table} WHERE rowid IN "
+        f"(SELECT rowid FROM {table} WHERE timestamp < ? LIMIT ?)",
+        (cutoff, chunk_size)
+    )
+    conn.commit()
+    return cursor.rowcount
+
+def incremental_vacuum_step(conn: sqlite3.Connection, pages: int) -> int:
+    """
+    Release up to `pages` free pages back to the filesystem
+
+    Returns:
+        Number of pages released
+    """
+    before = pragma_value(conn, "freelist_count")
+    # The pragma does its work as its result rows are stepped through
+    conn.execute(f"PRAGMA incremental_vacuum({int(pages)})").fetchall()
+    return before - pragma_value(conn, "freelist_count")
+
+def checkpoint_wal(conn: sqlite3.Connection) -> None:
+    """Copy WAL content back into the database without waiting for readers"""
+    conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchall()
+
+def flush_accesses(conn: sqlite3.Connection) -> int:
+    """Write the cache hits this process noted since the last flush (see AccessLog)"""
+    if not table_exists(conn, "cache_statistics"):
+        return 0
+    return access_log.flush(conn)
+
+def reconcile_cache_statistics() -> Dict[str, Any]:
+    """
+    Recompute the entry and byte totals in cache_statistics with full table scans
+
+    Returns:
+        Reconciled statistics per cache and category
+    """
+    result = {}
+    for name, db_class in (
+        ("places", PlacesDatabase),
+        ("geocoding", GeocodingDatabase),
+    ):
+        db = db_class()
+        try:
+            before = db.get_statistics()
+            result[name] = db.reconcile_statistics()
+        finally:
+            db.close()
+        drift = {category: stats["entries"] - before.get(category, {}).get("entries", 0)
+                 for category, stats in result[name].items()}
+        logger.info(
+            f"Reconciled {name} cache statistics, entry drift by category: {drift}"
+        )
+    return result
+
+def enable_incremental_vacuum(db_path: str = settings.DB_PATH) -> bool:
+    """
+    Switch an existing database to auto_vacuum=INCREMENTAL
+
+    This requires one full VACUUM, which locks the database while it rewrites
+    the file, so it is a one-off operation run from the command line.
+
+    Returns:
+        True if the database was converted, False if it already was incremental
+    """
+    conn = connect(db_path)
+    try:
+        if pragma_value(conn, "auto_vacuum") == AUTO_VACUUM_INCREMENTAL:
+            return False
+        logger.info("Converting database to auto_vacuum=INCREMENTAL (full VACUUM)...")
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        return True
+    finally:
+        conn.close()
+
+
+class CacheMaintenance:
+    """Incremental cache maintenance performed in time-bounded ticks"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self.status: Dict[str, Any] = {
+            "phase": "idle",
+            "ticks": 0,
+            "last_tick_at": None,
+            "last_tick_seconds": None,
+            "deleted": {cache_type: 0 for cache_type in EXPIRING_TABLES},
+            "pending_expired": {cache_type: 0 for cache_type in EXPIRING_TABLES},
+            "pages_freed": 0,
+            "freelist_pages": None,
+            "incremental_vacuum": None,
+            "db_size": None,
+            "last_error": None,
+        }
+
+    def flush_accesses(self) -> None:
+        """Write the pending cache hits on a maintenance connection"""
+        conn = None
+        try:
+            conn = connect(self.db_path or settings.DB_PATH)
+            flush_accesses(conn)
+        except sqlite3.Error as e:
+            logger.error(f"Error writing cache hits: {str(e)}")
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def store_scores(self) -> None:
+        """Store the amenity scores of the listings served since the last tick"""
+        try:
+            refreshed = refresh_seen_scores()
+            if refreshed["scored"] or refreshed["rescored"]:
+                logger.debug(f"Stored amenity scores: {refreshed}")
+        except Exception as e:
+            logger.error(f"Error storing amenity scores: {str(e)}")
+
+    def run_tick(self, budget: float = None) -> Dict[str, Any]:
+        """
+        Run maintenance steps until the work is done or the time budget is spent
+
+        The budget is checked between steps, so a tick overruns it by at most
+        one chunk delete or vacuum step.
+
+        Args:
+            budget: Seconds of work allowed for this tick
+
+        Returns:
+            Maintenance status after the tick
+        """
+        budget = settings.MAINTENANCE_TICK_BUDGET if budget is None else budget
+        if not self._lock.acquire(blocking=False):
+            logger.debug("Maintenance tick skipped, previous tick still running")
+            return self.status
+
+        start_time = time.monotonic()
+        deadline = start_time + budget
+        conn = None
+        try:
+            self.store_scores()
+            conn = connect(self.db_path or settings.DB_PATH)
+            flush_accesses(conn)
+            cutoff = stale_cutoff()
+            chunks = 0
+
+            self.status["phase"] = "deleting"
+            for cache_type, (table, _) in EXPIRING_TABLES.items():
+                if not table_exists(conn, table):
+                    continue
+                while time.monotonic() < deadline:
+                    deleted = delete_expired_chunk(
+                        conn, table, cutoff, settings.MAINTENANCE_DELETE_CHUNK
+                    )
+                    self.status["deleted"][cache_type] += deleted
+                    chunks += 1
+                    if chunks % settings.MAINTENANCE_CHECKPOINT_EVERY == 0:
+                        checkpoint_wal(conn)
+                    if deleted < settings.MAINTENANCE_DELETE_CHUNK:
+                        break
+                self.status["pending_expired"][cache_type] = conn.execute(
+                    f"SELECT COUNT(*) FROM {table} WHERE timestamp < ?", (cutoff,)
+                ).fetchone()[0]
+
+            incremental = pragma_value(conn, "auto_vacuum") == AUTO_VACUUM_INCREMENTAL
+            self.status["incremental_vacuum"] = incremental
+            if incremental:
+                self.status["phase"] = "vacuuming"
+                while (
+                    time.monotonic() < deadline
+                    and pragma_value(conn, "freelist_count") > 0
+                ):
+                    freed = incremental_vacuum_step(
+                        conn, settings.MAINTENANCE_VACUUM_PAGES
+                    )
+                    self.status["pages_freed"] += freed
+                    if freed == 0:
+                        break
+
+            checkpoint_wal(conn)
+            self.status["freelist_pages"] = pragma_value(conn, "freelist_count")
+            self.status["db_size"] = get_db_size(conn)
+            self.status["last_error"] = None
+        except Exception as e:
+            logger.error(f"Error during cache maintenance tick: {str(e)}")
+            self.status["last_error"] = str(e)
+        finally:
+            if conn is not None:
+                conn.close()
+            elapsed = time.monotonic() - start_time
+            self.status["phase"] = "idle"
+            self.status["ticks"] += 1
+            self.status["last_tick_at"] = datetime.datetime.now().isoformat()
+            self.status["last_tick_seconds"] = round(elapsed, 3)
+            self._lock.release()
+
+        logger.debug(
+            f"Maintenance tick finished in {elapsed:.3f}s: "
+            f"pending {self.status['pending_expired']}, "
+            f"freelist {self.status['freelist_pages']}"
+        )
+        return self.status
+
+
+class MaintenanceScheduler:
+    """Runs CacheMaintenance ticks periodically on the application's event loop"""
+
+    def __init__(self, maintenance: CacheMaintenance):
+        self.maintenance = maintenance
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        """Start the periodic maintenance task"""
+        if self._task is None:
+            logger.info(
+                f"Starting cache maintenance every {settings.MAINTENANCE_INTERVAL}s "
+                f"with a {settings.MAINTENANCE_TICK_BUDGET}s budget per tick"
+            )
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Stop the periodic maintenance task, writing
+        the cache hits and scores still pending
+        """
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await asyncio.to_thread(self.maintenance.flush_accesses)
+        await asyncio.to_thread(self.maintenance.store_scores)
+
+    async def run_once(self) -> Dict[str, Any]:
+        """Run a single tick off the event loop"""
+        return await asyncio.to_thread(self.maintenance.run_tick)
+
+    async def _run(self) -> None:
+        while True:
+            await self.run_once()
+            await asyncio.sleep(settings.MAINTENANCE_INTERVAL)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get scheduler configuration and maintenance progress"""
+        return {
+            "enabled": self._task is not None,
+            "interval": settings.MAINTENANCE_INTERVAL,
+            "tick_budget": settings.MAINTENANCE_TICK_BUDGET,
+            **self.maintenance.status
+        }
+
+
+maintenance_scheduler = MaintenanceScheduler(CacheMaintenance())
+
+
 def clear_expired_cache(db_path: str = settings.DB_PATH, dry_run: bool = False) -> Dict[str, Any]:
     """
     Clear expired cache entries from the database
-    
+
+    Runs the same chunked deletes and incremental vacuum steps as the in-process
+    scheduler, without a time budget.
+
     Args:
         db_path: Path to the SQLite database
         dry_run: If True, don't actually delete entries, just report
-        
+
     Returns:
         Dictionary with statistics about the cleanup operation
     """
-    # Create data directory if it doesn't exist
-    os.makedirs(os.path.dirname(db_path), exist_ok=True)
-    
     # Generate a unique ID for this maintenance run
     run_id = f"maint_{int(time.time())}_{uuid.uuid4().hex[:6]}"
     logger.info(f"[{run_id}] Starting cache maintenance job, dry_run={dry_run}")
-    
+
     start_time = time.time()
-    
+
     try:
-        # Connect to database
         logger.debug(f"[{run_id}] Connecting to database at {db_path}")
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Calculate cutoff timestamp
-        cutoff_date = datetime.datetime.now() - datetime.timedelta(seconds=settings.CACHE_EXPIRATION)
-        cutoff_timestamp = cutoff_date.isoformat()
+        conn = connect(db_path)
+
+        cutoff_timestamp = stale_cutoff()
         logger.debug(f"[{run_id}] Cache expiration cutoff: {cutoff_timestamp}")
-        
-        # Get database size before cleanup
-        try:
-            cursor.execute("PRAGMA page_count")
-            page_count = cursor.fetchone()[0]
-            cursor.execute("PRAGMA page_size")
-            page_size = cursor.fetchone()[0]
-            db_size_before = page_count * page_size
-            logger.info(f"[{run_id}] Database size before cleanup: {format_size(db_size_before)}")
-        except Exception as e:
-            logger.warning(f"[{run_id}] Could not determine database size: {str(e)}")
-            db_size_before = None
-        
-        # Count total entries
-        cursor.execute("SELECT COUNT(*) FROM nearby_places")
-        total_places = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM place_photos")
-        total_photos = cursor.fetchone()[0]
-        
-        logger.info(f"[{run_id}] Total entries: {total_places} places, {total_photos} photos")
-        
-        # Get total size of cached data
-        cursor.execute("SELECT SUM(LENGTH(results)) FROM nearby_places")
-        places_size = cursor.fetchone()[0] or 0
-        
-        cursor.execute("SELECT SUM(LENGTH(photo_data)) FROM place_photos")
-        photos_size = cursor.fetchone()[0] or 0
-        
-        total_data_size = places_size + photos_size
-        logger.info(f"[{run_id}] Total cached data size: {format_size(total_data_size)} " +
-                   f"(Places: {format_size(places_size)}, Photos: {format_size(photos_size)})")
-        
-        # Find expired entries
-        logger.debug(f"[{run_id}] Identifying expired entries older than {cutoff_timestamp}")
-        cursor.execute("SELECT COUNT(*) FROM nearby_places WHERE timestamp < ?", (cutoff_timestamp,))
-        expired_places = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM place_photos WHERE timestamp < ?", (cutoff_timestamp,))
-        expired_photos = cursor.fetchone()[0]
-        
-        # Get size of expired data
-        cursor.execute("SELECT SUM(LENGTH(results)) FROM nearby_places WHERE timestamp < ?", (cutoff_timestamp,))
-        expired_places_size = cursor.fetchone()[0] or 0
-        
-        cursor.execute("SELECT SUM(LENGTH(photo_data)) FROM place_photos WHERE timestamp < ?", (cutoff_timestamp,))
-        expired_photos_size = cursor.fetchone()[0] or 0
-        
-        expired_data_size = expired_places_size + expired_photos_size
-        
-        logger.info(f"[{run_id}] Found {expired_places}/{total_places} expired places entries " + 
-                   f"({format_size(expired_places_size)})")
-        logger.info(f"[{run_id}] Found {expired_photos}/{total_photos} expired photo entries " +
-                   f"({format_size(expired_photos_size)})")
-        logger.info(f"[{run_id}] Total expired data: {format_size(expired_data_size)}")
-        
-        deleted_places = 0
-        deleted_photos = 0
-        
+
+        db_size_before = get_db_size(conn)
+        logger.info(
+            f"[{run_id}] Database size before cleanup: {format_size(db_size_before)}"
+        )
+
+        totals = {}
+        expired = {}
+        total_size = 0
+        expired_size = 0
+        for cache_type, (table, payload_size) in EXPIRING_TABLES.items():
+            if not table_exists(conn, table):
+                totals[cache_type] = expired[cache_type] = 0
+                continue
+            totals[cache_type], table_size = cache_totals(conn, table, payload_size)
+            total_size += table_size
+            row = conn.execute(
+                f"SELECT COUNT(*), SUM({payload_size}) FROM {table} "
+                f"WHERE timestamp < ?",
+                (cutoff_timestamp,),
+            ).fetchone()
+            expired[cache_type] = row[0]
+            expired_size += row[1] or 0
+            if cache_type == "places":
+                places_size, expired_places_size = stored_places_size(
+                    conn, cutoff_timestamp
+                )
+                total_size += places_size
+                expired_size += expired_places_size
+            logger.info(
+                f"[{run_id}] Found {expired[cache_type]}/{totals[cache_type]} expired "
+                f"{cache_type} entries"
+            )
+        logger.info(f"[{run_id}] Total cached data size: {format_size(total_size)}, "
+                    f"expired: {format_size(expired_size)}")
+
+        deleted = {cache_type: 0 for cache_type in EXPIRING_TABLES}
+        size_diff = None
         if not dry_run:
-            # Delete expired entries
-            if expired_places > 0:
-                logger.debug(f"[{run_id}] Deleting {expired_places} expired places entries")
-                cursor.execute("DELETE FROM nearby_places WHERE timestamp < ?", (cutoff_timestamp,))
-                deleted_places = cursor.rowcount
-                logger.info(f"[{run_id}] Deleted {deleted_places} nearby places entries")
-            else:
-                logger.info(f"[{run_id}] No expired places entries to delete")
-            
-            if expired_photos > 0:
-                logger.debug(f"[{run_id}] Deleting {expired_photos} expired photo entries")
-                cursor.execute("DELETE FROM place_photos WHERE timestamp < ?", (cutoff_timestamp,))
-                deleted_photos = cursor.rowcount
-                logger.info(f"[{run_id}] Deleted {deleted_photos} photo entries")
+            chunks = 0
+            for cache_type, (table, _) in EXPIRING_TABLES.items():
+                if not expired[cache_type]:
+                    continue
+                while True:
+                    count = delete_expired_chunk(conn, table, cutoff_timestamp,
+                                                 settings.MAINTENANCE_DELETE_CHUNK)
+                    deleted[cache_type] += count
+                    chunks += 1
+                    if chunks % settings.MAINTENANCE_CHECKPOINT_EVERY == 0:
+                        checkpoint_wal(conn)
+                    if count < settings.MAINTENANCE_DELETE_CHUNK:
+                        break
+                logger.info(
+                    f"[{run_id}] Deleted {deleted[cache_type]} {cache_type} entries"
+                )
+
+            if pragma_value(conn, "auto_vacuum") == AUTO_VACUUM_INCREMENTAL:
+                pages_freed = 0
+                while True:
+                    freed = incremental_vacuum_step(
+                        conn, settings.MAINTENANCE_VACUUM_PAGES
+                    )
+                    pages_freed += freed
+                    if freed == 0:
+                        break
+                logger.info(f"[{run_id}] Released {pages_freed} free pages")
             else:
-                logger.info(f"[{run_id}] No expired photo entries to delete")
-            
-            conn.commit()
-            logger.debug(f"[{run_id}] Committed transaction")
+                logger.info(
+                    f"[{run_id}] auto_vacuum is not INCREMENTAL, "
+                    "free pages are kept for reuse "
+                    "(run with --enable-incremental-vacuum once to convert)"
+                )
+            checkpoint_wal(conn)
+
+            db_size_after = get_db_size(conn)
+            size_diff = db_size_before - db_size_after
+            logger.info(
+                f"[{run_id}] Database size after cleanup: {format_size(db_size_after)}"
+            )
         else:
             logger.info(f"[{run_id}] Dry run - no entries were deleted")
-        
-        # Run VACUUM to reclaim space
-        if not dry_run and (expired_places > 0 or expired_photos > 0):
-            logger.info(f"[{run_id}] Running VACUUM to reclaim space...")
-            vacuum_start = time.time()
-            cursor.execute("VACUUM")
-            vacuum_time = time.time() - vacuum_start
-            logger.info(f"[{run_id}] VACUUM completed in {vacuum_time:.2f}s")
-            
-            # Check database size after vacuum
-            try:
-                cursor.execute("PRAGMA page_count")
-                page_count = cursor.fetchone()[0]
-                cursor.execute("PRAGMA page_size")
-                page_size = cursor.fetchone()[0]
-                db_size_after = page_count * page_size
-                size_diff = db_size_before - db_size_after if db_size_before is not None else 0
-                
-                logger.info(f"[{run_id}] Database size after cleanup: {format_size(db_size_after)}")
-                if size_diff > 0:
-                    logger.info(f"[{run_id}] Space reclaimed: {format_size(size_diff)}")
-            except Exception as e:
-                logger.warning(f"[{run_id}] Could not determine database size after cleanup: {str(e)}")
-        
-        # Count remaining entries
-        cursor.execute("SELECT COUNT(*) FROM nearby_places")
-        remaining_places = cursor.fetchone()[0]
-        
-        cursor.execute("SELECT COUNT(*) FROM place_photos")
-        remaining_photos = cursor.fetchone()[0]
-        
-        logger.info(f"[{run_id}] Remaining entries: {remaining_places} places, {remaining_photos} photos")
-        
+
+        remaining = {
+            cache_type: totals[cache_type] - deleted[cache_type]
+            for cache_type in EXPIRING_TABLES
+        }
+        logger.info(f"[{run_id}] Remaining entries: {remaining['places']} places, "
+                    f"{remaining['photos']} photos, {remaining['media']} media")
+
         conn.close()
         logger.debug(f"[{run_id}] Database connection closed")
-        
+
         process_time = time.time() - start_time
         logger.info(f"[{run_id}] Cache maintenance completed in {process_time:.2f}s")
-        
+
         return {
             "run_id": run_id,
-            "total": {
-                "places": total_places,
-                "photos": total_photos,
-                "size": format_size(total_data_size)
-            },
-            "expired": {
-                "places": expired_places,
-                "photos": expired_photos,
-                "size": format_size(expired_data_size)
-            },
-            "deleted": {
-                "places": deleted_places if not dry_run else 0,
-                "photos": deleted_photos if not dry_run else 0,
-                "size": format_size(expired_data_size) if not dry_run else "0 bytes"
-            } if not dry_run else None,
+            "total": {**totals, "size": format_size(total_size)},
+            "expired": {**expired, "size": format_size(expired_size)},
+            "deleted": {**deleted, "size": format_size(expired_size)}
+            if not dry_run
+            else None,
             "remaining": {
-                "places": remaining_places,
-                "photos": remaining_photos,
-                "size_diff": format_size(size_diff) if not dry_run and 'size_diff' in locals() else "N/A"
+                **remaining,
+                "size_diff": format_size(size_diff)
+                if size_diff is not None and size_diff > 0
+                else "N/A",
             },
-            "processing_time": f"{process_time:.2f}s"
+            "processing_time": f"{process_time:.2f}s",
         }
     except Exception as e:
         logger.error(f"[{run_id}] Error during cache maintenance: {str(e)}")
@@ -218,4 +548,4 @@ def clear_expired_cache(db_path: str = settings.DB_PATH, dry_run: bool = False)
             "run_id": run_id,
             "success": False,
             "error": str(e)
-        } 
\ No newline at end of file
+        }
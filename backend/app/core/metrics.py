@@ -0,0 +1,305 @@
+"""
+Application metrics in the Prometheus text exposition format
+
+A small in-process registry of counters, gauges and histograms, so the API
+can be scraped without an extra client library. Values are per process: with
+several uvicorn workers, scrape each worker or aggregate at query time.
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import requests
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    """Base class for a metric family with a fixed set of label names"""
+
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values: Dict[Tuple[str, ...], object] = {}
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def expose(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+        ]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(Metric):
+    """Monotonically increasing value"""
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Gauge(Counter):
+    """Value that can go up and down"""
+
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    @contextmanager
+    def track_inprogress(self, **labels: str) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    """Distribution of observed values over cumulative buckets"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[0][i] += 1
+                    break
+            state[1] += value
+            state[2] += 1
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(state[0]), state[1], state[2]))
+                           for key, state in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                bucket_labels = _format_labels(self.labelnames, key, le)
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Registry:
+    """Collection of metrics exposed together"""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def expose(self) -> str:
+        """Render all metrics in the Prometheus text format"""
+        return "\n".join(metric.expose() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "http_request_duration_seconds", "Request latency by route",
+    ("method", "route")
+))
+HTTP_REQUESTS = REGISTRY.register(Counter(
+    "http_requests_total", "Requests by route and status code",
+    ("method", "route", "status")
+))
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "http_requests_in_flight", "Requests currently being handled"
+))
+CACHE_REQUESTS = REGISTRY.register(
+    Counter(
+        "cache_requests_total",
+        "Cache lookups by cache, category and result (hit, miss or stale)",
+        ("cache", "category", "result"),
+    )
+)
+UPSTREAM_REQUESTS = REGISTRY.register(
+    Counter(
+        "upstream_requests_total",
+        "Calls to external providers by outcome "
+        "(success, rate_limited, error, circuit_open or quota_exceeded)",
+        ("provider", "outcome"),
+    )
+)
+UPSTREAM_RETRIES = REGISTRY.register(Counter(
+    "upstream_retries_total", "Retried calls to external providers", ("provider",)
+))
+CIRCUIT_BREAKER_STATE = REGISTRY.register(
+    Gauge(
+        "circuit_breaker_state",
+        "Provider circuit state (0 closed, 1 half-open, 2 open)",
+        ("provider",),
+    )
+)
+UPSTREAM_REQUEST_DURATION = REGISTRY.register(Histogram(
+    "upstream_request_duration_seconds", "Latency of calls to external providers",
+    ("provider",)
+))
+UPSTREAM_REQUESTS_IN_FLIGHT = REGISTRY.register(
+    Gauge(
+        "upstream_requests_in_flight",
+        "Calls to external providers currently waiting for a response",
+        ("provider",),
+    )
+)
+
+COORDINATE_SOURCES = REGISTRY.register(Counter(
+    "listing_coordinates_total",
+    "Listing coordinates resolved by source (listing, cache, same_street or geocoder)",
+    ("source",)
+))
+QUOTA_WAIT = REGISTRY.register(Histogram(
+    "upstream_quota_wait_seconds", "Time provider calls queued for a rate limit token",
+    ("provider", "priority")
+))
+QUOTA_REJECTED = REGISTRY.register(
+    Counter(
+        "upstream_quota_rejected_total",
+        "Provider calls refused by the client-side quota (wait_limit or daily_limit)",
+        ("provider", "reason"),
+    )
+)
+QUOTA_DAILY_CALLS = REGISTRY.register(
+    Gauge(
+        "upstream_quota_daily_calls",
+        "Provider calls made in the current UTC day",
+        ("provider",),
+    )
+)
+
+LOG_RECORDS_DROPPED = REGISTRY.register(
+    Counter(
+        "log_records_dropped_total",
+        "Log records dropped because the logging queue was full",
+    )
+)
+
+
+def record_cache_lookup(cache: str, category: str, result: str) -> None:
+    """Count a cache lookup; result is 'hit', 'miss' or 'stale'"""
+    CACHE_REQUESTS.inc(cache=cache, category=category, result=result)
+
+
+@contextmanager
+def upstream_call(provider: str) -> Iterator[None]:
+    """
+    Measure a call to an external provider
+
+    The call counts as an error if an exception escapes the block, and as
+    rate limited if that exception carries an HTTP 429 response.
+    """
+    outcome = "success"
+    start = time.perf_counter()
+    UPSTREAM_REQUESTS_IN_FLIGHT.inc(provider=provider)
+    try:
+        yield
+    except Exception as e:
+        response: Optional[requests.Response] = getattr(e, "response", None)
+        outcome = (
+            "rate_limited"
+            if response is not None and response.status_code == 429
+            else "error"
+        )
+        raise
+    finally:
+        UPSTREAM_REQUESTS_IN_FLIGHT.dec(provider=provider)
+        UPSTREAM_REQUEST_DURATION.observe(
+            time.perf_counter() - start, provider=provider
+        )
+        UPSTREAM_REQUESTS.inc(provider=provider, outcome=outcome)
+
+
+class MetricsMiddleware(BaseHTTPMiddleware):
+    """Record latency, status and in-flight count of every request by route"""
+
+    async def dispatch(self, request: Request, call_next):
+        start = time.perf_counter()
+        status = 500
+        with HTTP_REQUESTS_IN_FLIGHT.track_inprogress():
+            try:
+                response = await call_next(request)
+                status = response.status_code
+                return response
+            finally:
+                # Label by route template rather than
+                # raw path to keep cardinality bounded
+                route = getattr(request.scope.get("route"), "path", "unmatched")
+                HTTP_REQUEST_DURATION.observe(time.perf_counter() - start,
+                                              method=request.method, route=route)
+                HTTP_REQUESTS.inc(
+                    method=request.method, route=route, status=str(status)
+                )
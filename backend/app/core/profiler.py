@@ -0,0 +1,254 @@
+"""
+Stack sampling profiler and slow-request capture
+
+StackSampler walks the stacks of all threads with sys._current_frames() from a
+daemon thread at a fixed interval. It needs no tracing hooks, so the sampled
+code runs at full speed. Samples are reported in the collapsed ("folded")
+format read by flamegraph.pl, speedscope and similar tools, one line per
+distinct stack:
+
+    thread;outer (file.py:12);inner (file.py:40) count
+
+`profile` runs a sampler for a fixed number of seconds on demand. When
+SLOW_REQUEST_THRESHOLD_MS is set, a background sampler keeps the last
+SLOW_REQUEST_WINDOW seconds of samples, and SlowRequestMiddleware saves the
+samples taken during any slower request, with its span timings, to LOGS_DIR.
+"""
+
+import asyncio
+import datetime
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, deque
+from typing import Deque, Dict, List, Optional, Set, Tuple
+
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+
+from app.core.config import settings
+from app.core.timing import request_timings
+
+logger = logging.getLogger("real-estate-api")
+
+# Frame labels by code object, so repeated samples don't rebuild the same strings
+_labels: Dict[object, str] = {}
+
+
+class ProfilerBusyError(Exception):
+    """Raised when an on-demand profile is requested while another one is running"""
+
+
+def _frame_label(code) -> str:
+    label = _labels.get(code)
+    if label is None:
+        filename = os.path.basename(code.co_filename)
+        label = _labels[code] = f"{code.co_name} ({filename}:{code.co_firstlineno})"
+    return label
+
+
+def sample_stacks(exclude: Set[int]) -> List[str]:
+    """
+    Capture the current stack of every thread not in `exclude`, outermost frame first
+    """
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    stacks = []
+    for ident, frame in sys._current_frames().items():
+        if ident in exclude:
+            continue
+        labels = []
+        while frame is not None:
+            labels.append(_frame_label(frame.f_code))
+            frame = frame.f_back
+        labels.append(names.get(ident, f"thread-{ident}"))
+        labels.reverse()
+        stacks.append(";".join(labels))
+    return stacks
+
+
+def collapse(counts: Counter) -> str:
+    """Format stack counts as collapsed stacks, most frequent first"""
+    return "".join(f"{stack} {count}\n" for stack, count in counts.most_common())
+
+
+class StackSampler:
+    """
+    Periodically sample the stacks of all threads
+
+    Without a window, samples are aggregated into counts for the lifetime of the
+    sampler. With a window, timestamped samples of the last `window` seconds are
+    kept so that any recent time range can be profiled after the fact.
+    """
+
+    def __init__(self, interval: float, window: Optional[float] = None):
+        self.interval = interval
+        self.counts: Counter = Counter()
+        self.samples: Optional[Deque[Tuple[float, List[str]]]] = (
+            deque(maxlen=max(1, int(window / interval))) if window else None
+        )
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="stack-sampler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        exclude = {threading.get_ident()}
+        while not self._stop.wait(self.interval):
+            stacks = sample_stacks(exclude)
+            self.sample_count += 1
+            if self.samples is None:
+                self.counts.update(stacks)
+            else:
+                self.samples.append((time.time(), stacks))
+
+    def collapsed(
+        self, since: Optional[float] = None, until: Optional[float] = None
+    ) -> Tuple[str, int]:
+        """
+        Collapsed stacks of the collected samples
+
+        Args:
+            since: Only include samples taken at or after
+                this time.time() value (window mode)
+            until: Only include samples taken at or before
+                this time.time() value (window mode)
+
+        Returns:
+            Tuple of (collapsed stacks, number of samples included)
+        """
+        if self.samples is None:
+            return collapse(self.counts), self.sample_count
+        counts: Counter = Counter()
+        included = 0
+        for timestamp, stacks in list(self.samples):
+            if (since is None or timestamp >= since) and (
+                until is None or timestamp <= until
+            ):
+                counts.update(stacks)
+                included += 1
+        return collapse(counts), included
+
+
+_profile_lock = threading.Lock()
+
+
+async def profile(seconds: float, interval: float = None) -> Tuple[str, int]:
+    """
+    Sample all threads for `seconds` and return (collapsed stacks, sample count)
+
+    Only one on-demand profile runs at a time; ProfilerBusyError is raised otherwise.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise ProfilerBusyError("A profile is already being recorded")
+    try:
+        sampler = StackSampler(interval or settings.PROFILER_SAMPLE_INTERVAL)
+        sampler.start()
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            sampler.stop()
+        logger.info(f"Recorded {sampler.sample_count} stack samples over {seconds}s")
+        return sampler.collapsed()
+    finally:
+        _profile_lock.release()
+
+
+slow_request_sampler = StackSampler(
+    settings.SLOW_REQUEST_SAMPLE_INTERVAL, window=settings.SLOW_REQUEST_WINDOW
+)
+
+
+def _prune_captures(directory: str, keep: int) -> None:
+    captures = sorted(name for name in os.listdir(directory) if name.endswith(".json"))
+    for name in captures[:max(0, len(captures) - keep)]:
+        stem = name[:-len(".json")]
+        for suffix in (".json", ".folded"):
+            try:
+                os.remove(os.path.join(directory, stem + suffix))
+            except FileNotFoundError:
+                pass
+
+
+def save_slow_request(record: Dict[str, object], folded: str) -> Optional[str]:
+    """
+    Write a slow request's timings (JSON) and profile (collapsed stacks) to LOGS_DIR
+
+    Returns:
+        Path of the JSON file, the profile sits next to it with a .folded suffix;
+        None if the capture could not be written
+    """
+    directory = os.path.join(settings.LOGS_DIR, "slow_requests")
+    path_slug = re.sub(r"[^A-Za-z0-9]+", "_", str(record["path"])).strip("_")[:60]
+    stem = f"{datetime.datetime.now():%Y%m%dT%H%M%S%f}_{record['method']}_{path_slug}"
+    json_path = os.path.join(directory, stem + ".json")
+    try:
+        os.makedirs(directory, exist_ok=True)
+        with open(json_path, "w") as f:
+            json.dump(record, f, indent=2)
+        with open(os.path.join(directory, stem + ".folded"), "w") as f:
+            f.write(folded)
+        _prune_captures(directory, settings.SLOW_REQUEST_MAX_FILES)
+    except OSError as e:
+        logger.error(f"Error saving slow request capture: {str(e)}")
+        return None
+    return json_path
+
+
+class SlowRequestMiddleware(BaseHTTPMiddleware):
+    """
+    Save span timings and a stack profile of every request slower than
+    SLOW_REQUEST_THRESHOLD_MS
+    """
+
+    async def dispatch(self, request: Request, call_next):
+        started_at = time.time()
+        start = time.perf_counter()
+        with request_timings() as timings:
+            response = await call_next(request)
+        total_ms = (time.perf_counter() - start) * 1000
+
+        if total_ms >= settings.SLOW_REQUEST_THRESHOLD_MS:
+            folded, samples = slow_request_sampler.collapsed(
+                since=started_at, until=time.time()
+            )
+            record = {
+                "method": request.method,
+                "path": request.url.path,
+                "query": request.url.query,
+                "status": response.status_code,
+                "started_at": datetime.datetime.fromtimestamp(started_at).isoformat(),
+                "total_ms": round(total_ms, 2),
+                "spans": timings.as_dict(),
+                "samples": samples
+            }
+            logger.warning(
+                f"Slow request: {request.method} {request.url.path} "
+                f"took {total_ms:.0f}ms"
+            )
+            # Write the capture off the event loop without delaying the response
+            asyncio.get_running_loop().run_in_executor(
+                None, save_slow_request, record, folded
+            )
+        return response
@@ -0,0 +1,309 @@
+"""
+Cache snapshots for warm-starting new API nodes
+
+A snapshot holds the live (non-expired) places searches with the places they
+reference, and the successful geocoding results. On disk it is a SQLite
+database with just those rows, zlib-compressed, framed by a magic header and a
+SHA-256 trailer:
+
+    MAGIC | zlib(SQLite database) | sha256(MAGIC + compressed data)
+
+Import verifies the checksum, then loads all rows in a single transaction with
+the secondary indexes dropped, rebuilding them once after the rows are in.
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import tempfile
+import time
+import zlib
+from typing import Any, Dict, List, Optional
+
+from app.core.config import settings
+from app.core.maintenance import expiry_cutoff
+from app.models.database import (
+    GeocodingDatabase,
+    PlacesDatabase,
+    canonicalize_geocoding_keys,
+    normalize_place_searches,
+)
+
+logger = logging.getLogger("cache-maintenance")
+
+# Last byte is the snapshot format version; version 1 snapshots hold each
+# places search as one payload, without the places table
+MAGIC = b"RECACHE\x02"
+SUPPORTED_MAGICS = (MAGIC, b"RECACHE\x01")
+CHECKSUM_SIZE = hashlib.sha256().digest_size
+CHUNK_SIZE = 1024 * 1024
+
+# Snapshot tables and the rows exported from each; places are imported first
+SNAPSHOT_TABLES = {
+    "stored_places": (
+        "places",
+        "id IN (SELECT ref.value FROM main.nearby_places AS n, "
+        "json_each(n.place_ids) AS ref WHERE n.timestamp >= ?)",
+    ),
+    "places": ("nearby_places", "timestamp >= ?"),
+    "geocoding": ("geocoding_results", "success = 1"),
+}
+
+
+class SnapshotError(Exception):
+    """Raised when a snapshot file is malformed or fails its checksum"""
+
+
+class SnapshotTooLargeError(SnapshotError):
+    """Raised when a snapshot decompresses to more than SNAPSHOT_MAX_BYTES"""
+
+
+def _table_columns(conn: sqlite3.Connection, schema: str, table: str) -> List[str]:
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def _import_places(conn: sqlite3.Connection, columns: List[str]) -> int:
+    """
+    Merge the snapshot's places into the places table
+
+    Place row ids differ between databases, so places are matched on place_id
+    and keep their local id. Local searches the snapshot replaces are deleted
+    first, releasing their places.
+    """
+    conn.execute("DELETE FROM main.nearby_places WHERE location_key IN "
+                 "(SELECT location_key FROM snap.nearby_places)")
+    columns = [c for c in columns if c not in ("id", "refs")]
+    column_list = ", ".join(columns)
+    cursor = conn.execute(
+        f"INSERT INTO main.places ({column_list}) "
+        f"SELECT {column_list} FROM snap.places WHERE true "
+        f"ON CONFLICT (place_id) DO UPDATE SET "
+        + ", ".join(f"{c} = excluded.{c}" for c in columns if c != "place_id")
+    )
+    return cursor.rowcount
+
+
+def _import_place_searches(conn: sqlite3.Connection, columns: List[str]) -> int:
+    """
+    Copy the snapshot's searches, translating their place references to local row ids
+    """
+    columns = [c for c in columns if c != "place_ids"]
+    column_list = ", ".join(columns)
+    cursor = conn.execute(
+        f"""
+        INSERT OR REPLACE INTO main.nearby_places ({column_list}, place_ids)
+        SELECT {", ".join(f"s.{c}" for c in columns)}, (
+            SELECT json_group_array(id) FROM (
+                SELECT local.id FROM json_each(s.place_ids) AS ref
+                JOIN snap.places AS remote ON remote.id = ref.value
+                JOIN main.places AS local ON local.place_id = remote.place_id
+                ORDER BY ref.key
+            )
+        )
+        FROM snap.nearby_places AS s
+        """
+    )
+    return cursor.rowcount
+
+
+def export_snapshot(output_path: str) -> Dict[str, Any]:
+    """
+    Export the live caches to a compressed, checksummed snapshot file
+
+    Args:
+        output_path: Path of the snapshot file to write
+
+    Returns:
+        Dict with row counts, snapshot size and checksum
+    """
+    start_time = time.time()
+    # Opening the cache classes creates or migrates their schema
+    places_db = PlacesDatabase()
+    GeocodingDatabase().close()
+    conn = places_db.conn
+    counts = {}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        snapshot_db = os.path.join(tmp_dir, "snapshot.db")
+        conn.execute("ATTACH DATABASE ? AS snap", (snapshot_db,))
+        try:
+            for name, (table, condition) in SNAPSHOT_TABLES.items():
+                params = (expiry_cutoff(),) if "?" in condition else ()
+                conn.execute(
+                    f"CREATE TABLE snap.{table} AS "
+                    f"SELECT * FROM main.{table} WHERE {condition}",
+                    params,
+                )
+                counts[name] = conn.execute(
+                    f"SELECT COUNT(*) FROM snap.{table}"
+                ).fetchone()[0]
+            conn.commit()
+        finally:
+            conn.execute("DETACH DATABASE snap")
+            places_db.close()
+
+        digest = hashlib.sha256(MAGIC)
+        compressor = zlib.compressobj(9)
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        with open(snapshot_db, "rb") as source, open(output_path, "wb") as target:
+            target.write(MAGIC)
+            while True:
+                chunk = source.read(CHUNK_SIZE)
+                data = compressor.compress(chunk) if chunk else compressor.flush()
+                digest.update(data)
+                target.write(data)
+                if not chunk:
+                    break
+            target.write(digest.digest())
+
+    result = {
+        "entries": counts,
+        "size": os.path.getsize(output_path),
+        "checksum": digest.hexdigest(),
+        "processing_time": f"{time.time() - start_time:.2f}s"
+    }
+    logger.info(
+        f"Exported cache snapshot to {output_path}: {counts}, {result['size']} bytes"
+    )
+    return result
+
+
+def _extract_snapshot(snapshot_path: str, target_path: str, max_size: int) -> None:
+    size = os.path.getsize(snapshot_path)
+    if size < len(MAGIC) + CHECKSUM_SIZE:
+        raise SnapshotError("Snapshot file is truncated")
+
+    with open(snapshot_path, "rb") as source:
+        magic = source.read(len(MAGIC))
+        if magic not in SUPPORTED_MAGICS:
+            raise SnapshotError("Not a cache snapshot, or unsupported snapshot version")
+
+        # Verify the checksum before decompressing anything into the target
+        digest = hashlib.sha256(magic)
+        remaining = size - len(MAGIC) - CHECKSUM_SIZE
+        while remaining:
+            chunk = source.read(min(CHUNK_SIZE, remaining))
+            digest.update(chunk)
+            remaining -= len(chunk)
+        if source.read(CHECKSUM_SIZE) != digest.digest():
+            raise SnapshotError("Snapshot checksum mismatch")
+
+        # A few kilobytes of zlib data can expand to gigabytes: output is produced
+        # a chunk at a time and checked against the limit before it is written
+        source.seek(len(MAGIC))
+        decompressor = zlib.decompressobj()
+        remaining = size - len(MAGIC) - CHECKSUM_SIZE
+        written = 0
+        with open(target_path, "wb") as target:
+            while remaining or decompressor.unconsumed_tail:
+                if decompressor.unconsumed_tail:
+                    chunk = decompressor.unconsumed_tail
+                else:
+                    chunk = source.read(min(CHUNK_SIZE, remaining))
+                    remaining -= len(chunk)
+                data = decompressor.decompress(chunk, CHUNK_SIZE)
+                written += len(data)
+                if written > max_size:
+                    raise SnapshotTooLargeError(
+                        f"Snapshot database is larger than {max_size} bytes"
+                    )
+                target.write(data)
+            data = decompressor.flush()
+            if written + len(data) > max_size:
+                raise SnapshotTooLargeError(
+                    f"Snapshot database is larger than {max_size} bytes"
+                )
+            target.write(data)
+
+
+def import_snapshot(
+    snapshot_path: str, max_size: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Bulk-load a snapshot into the local cache database
+
+    Rows from the snapshot replace local rows with the same key. The load runs
+    in one transaction with secondary indexes dropped, and they are rebuilt
+    once after all rows are in.
+
+    Args:
+        snapshot_path: Path of the snapshot file
+        max_size: Largest database the snapshot may decompress to (default
+            SNAPSHOT_MAX_BYTES)
+
+    Returns:
+        Dict with imported row counts
+
+    Raises:
+        SnapshotTooLargeError: If the snapshot decompresses to more than max_size
+    """
+    start_time = time.time()
+    if max_size is None:
+        max_size = settings.SNAPSHOT_MAX_BYTES
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        snapshot_db = os.path.join(tmp_dir, "snapshot.db")
+        _extract_snapshot(snapshot_path, snapshot_db, max_size)
+
+        places_db = PlacesDatabase()
+        geocoding_db = GeocodingDatabase()
+        conn = places_db.conn
+        conn.execute("ATTACH DATABASE ? AS snap", (snapshot_db,))
+        counts = {}
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for name, (table, _) in SNAPSHOT_TABLES.items():
+                snapshot_columns = set(_table_columns(conn, "snap", table))
+                if not snapshot_columns:
+                    counts[name] = 0
+                    continue
+                columns = [
+                    c
+                    for c in _table_columns(conn, "main", table)
+                    if c in snapshot_columns
+                ]
+                column_list = ", ".join(columns)
+
+                # Build secondary indexes once after the load instead of row by row
+                indexes = conn.execute(
+                    "SELECT name, sql FROM main.sqlite_master "
+                    "WHERE type = 'index' AND tbl_name = ? AND sql IS NOT NULL",
+                    (table,),
+                ).fetchall()
+                for index_name, _ in indexes:
+                    conn.execute(f"DROP INDEX main.{index_name}")
+
+                if table == "places":
+                    counts[name] = _import_places(conn, columns)
+                elif table == "nearby_places" and "place_ids" in snapshot_columns:
+                    counts[name] = _import_place_searches(conn, columns)
+                else:
+                    cursor = conn.execute(
+                        f"INSERT OR REPLACE INTO main.{table} ({column_list}) "
+                        f"SELECT {column_list} FROM snap.{table}"
+                    )
+                    counts[name] = cursor.rowcount
+
+                for _, index_sql in indexes:
+                    conn.execute(index_sql)
+            # Snapshots from before canonical address keys and the places table
+            canonicalize_geocoding_keys(conn)
+            normalize_place_searches(conn)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute("DETACH DATABASE snap")
+
+        for db in (places_db, geocoding_db):
+            db.evict_to_budget()
+            db.close()
+
+    result = {
+        "entries": counts,
+        "processing_time": f"{time.time() - start_time:.2f}s"
+    }
+    logger.info(f"Imported cache snapshot from {snapshot_path}: {counts}")
+    return result
@@ -0,0 +1,151 @@
+"""
+Per-request timing spans
+
+Functions decorated with `timed` add their duration to the timings of the
+current request. ServerTimingMiddleware collects them into a `Server-Timing`
+header and one structured log line per request. When SERVER_TIMING_ENABLED is
+off the middleware is not installed, no timings object exists and `timed`
+reduces to a context variable lookup.
+"""
+
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.requests import Request
+
+logger = logging.getLogger("real-estate-api.timing")
+
+
+class RequestTimings:
+    """Accumulated span durations for one request"""
+
+    def __init__(self):
+        self.spans: Dict[str, Tuple[float, int]] = {}
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        """Add a span duration, aggregating spans with the same name"""
+        with self._lock:
+            total, count = self.spans.get(name, (0.0, 0))
+            self.spans[name] = (total + seconds, count + 1)
+
+    def as_dict(self) -> Dict[str, Dict[str, float]]:
+        """Spans as {name: {"ms": total milliseconds, "count": calls}}"""
+        with self._lock:
+            return {name: {"ms": round(total * 1000, 2), "count": count}
+                    for name, (total, count) in self.spans.items()}
+
+
+_current_timings: ContextVar[Optional[RequestTimings]] = ContextVar(
+    "request_timings", default=None
+)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    """Timings of the request being handled, or None when timing is disabled"""
+    return _current_timings.get()
+
+
+@contextmanager
+def request_timings() -> Iterator[RequestTimings]:
+    """
+    Collect timings for the enclosed request, sharing them with any outer middleware
+    """
+    timings = _current_timings.get()
+    if timings is not None:
+        yield timings
+        return
+    timings = RequestTimings()
+    token = _current_timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _current_timings.reset(token)
+
+
+class span:
+    """Context manager recording the duration of a block under `name`"""
+
+    __slots__ = ("name", "timings", "start")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self):
+        self.timings = _current_timings.get()
+        if self.timings is not None:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.timings is not None:
+            self.timings.add(self.name, time.perf_counter() - self.start)
+
+
+def timed(name: str) -> Callable:
+    """Decorator recording each call of a function as a span named `name`"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            timings = _current_timings.get()
+            if timings is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings.add(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSON response that records its encoding time as the 'encode' span"""
+
+    def render(self, content) -> bytes:
+        with span("encode"):
+            return super().render(content)
+
+
+def format_server_timing(spans: Dict[str, Dict[str, float]], total_ms: float) -> str:
+    """Format spans as a Server-Timing header value"""
+    metrics = [f'{name};dur={values["ms"]};desc="{values["count"]} call(s)"'
+               for name, values in spans.items()]
+    metrics.append(f"total;dur={round(total_ms, 2)}")
+    return ", ".join(metrics)
+
+
+class ServerTimingMiddleware(BaseHTTPMiddleware):
+    """Emit the timing breakdown of each request as a header and a log line"""
+
+    async def dispatch(self, request: Request, call_next):
+        start = time.perf_counter()
+        with request_timings() as timings:
+            response = await call_next(request)
+        total_ms = (time.perf_counter() - start) * 1000
+
+        spans = timings.as_dict()
+        response.headers["Server-Timing"] = format_server_timing(spans, total_ms)
+        # Let the cross-origin frontend read the header through the Resource Timing API
+        response.headers["Timing-Allow-Origin"] = "*"
+        # The JSON formatter writes the extra fields as keys of the log line
+        logger.info(
+            "%s %s %s in %.2f ms",
+            request.method, request.url.path, response.status_code, total_ms,
+            extra={
+                "event": "request_timing",
+                "method": request.method,
+                "path": request.url.path,
+                "status": response.status_code,
+                "total_ms": round(total_ms, 2),
+                "spans": spans
+            }
+        )
+        return response
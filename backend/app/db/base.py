@@ -0,0 +1,148 @@
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class PlacesCache(ABC):
+    """Interface for caching nearby places search results"""
+
+    @abstractmethod
+    def get_places_entry(
+        self, location_key: str
+    ) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        Look up cached places data, including expired entries
+
+        Args:
+            location_key: Cache key of the search
+
+        Returns:
+            Tuple of (results, expired); results is None if nothing is cached
+        """
+
+    def get_cached_places(self, location_key: str) -> Optional[Dict[str, Any]]:
+        """Get cached places data if it exists and is not expired"""
+        results, expired = self.get_places_entry(location_key)
+        return None if expired else results
+
+    @abstractmethod
+    def cache_places(
+        self,
+        location_key: str,
+        location: str,
+        radius: int,
+        place_type: str,
+        keyword: Optional[str],
+        results: Dict[str, Any],
+    ) -> None:
+        """Cache places search results"""
+
+    @abstractmethod
+    def find_places_within(self, location: str, radius: float,
+                           place_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Places found by cached searches within a radius, without calling the provider
+
+        Args:
+            location: Comma-separated latitude and longitude
+            radius: Radius in meters
+            place_type: Only places of this type
+
+        Returns:
+            The places, in no particular order
+        """
+
+    @abstractmethod
+    def find_place_points(
+        self,
+        min_lat: float,
+        max_lat: float,
+        min_lng: float,
+        max_lng: float,
+        place_type: str,
+    ) -> List[Tuple[str, float, float]]:
+        """
+        Locations of the places found by cached
+        searches within a box, without decoding them
+
+        Args: min_lat, max_lat, min_lng, max_lng: The box (see
+            app.services.geo.bounding_box)
+            place_type: Only places of this type
+
+        Returns:
+            (place_id, lat, lng) of each place, in no particular order
+        """
+
+    @abstractmethod
+    def get_places(self, place_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Places found by cached searches, by place_id; unknown ids are left out"""
+
+    @abstractmethod
+    def get_places_ages(self, location_keys: List[str]) -> Dict[str, float]:
+        """
+        Age of cached places entries, without counting the lookup as a cache hit
+
+        Args:
+            location_keys: Cache keys of the searches
+
+        Returns: Seconds since each entry was cached,
+            by key; keys without an entry are left out
+        """
+
+    @abstractmethod
+    def get_location_views(self) -> Dict[str, int]:
+        """
+        Cache hits per searched location, as a measure
+        of how often its listing panel is opened
+        """
+
+    @abstractmethod
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get statistics about cached data"""
+
+    @abstractmethod
+    def clear_cache(self, cache_type: Optional[str] = None) -> Dict[str, Any]:
+        """Clear the cache"""
+
+    @abstractmethod
+    def close(self) -> None:
+        """Release any resources held by the cache"""
+
+
+class GeocodingCache(ABC):
+    """Interface for caching geocoding results"""
+
+    @abstractmethod
+    def address_exists_in_db(self, address: str) -> bool:
+        """Check if an address already exists in the cache"""
+
+    @abstractmethod
+    def get_coordinates(self, address: str) -> Optional[Dict[str, Any]]:
+        """
+        Get cached coordinates for an address
+
+        Entries are keyed on the canonical address (see
+        app.services.address.canonical_address), so any spelling of the
+        address, or another unit of it, finds the same entry.
+
+        Args:
+            address: Address to look up
+
+        Returns:
+            Dict with 'lat' and 'lon' keys and the 'address' the entry was
+            geocoded for, or None if not cached or geocoding failed
+        """
+
+    @abstractmethod
+    def save_geocoding_result(self, result: Dict[str, Any]) -> None:
+        """Save a geocoding result to the cache"""
+
+    @abstractmethod
+    def save_geocoding_results(self, results: List[Dict[str, Any]]) -> None:
+        """
+        Save a batch of geocoding results to the
+        cache (in one transaction where supported)
+        """
+
+    @abstractmethod
+    def close(self) -> None:
+        """Release any resources held by the cache"""
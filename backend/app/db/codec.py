@@ -0,0 +1,100 @@
+"""
+Compressed storage format for cached payloads
+
+Encoded payloads are bytes prefixed with a one-byte format tag, so rows written
+by older versions (plain JSON text) and by older formats keep decoding after
+the format changes. New formats must take a new tag rather than redefine one.
+"""
+
+import json
+import zlib
+from typing import Any, Optional
+
+# Format tags
+FORMAT_ZLIB = 1
+FORMAT_ZLIB_PLACES_V1 = 2
+
+COMPRESSION_LEVEL = 6
+
+# Shared preset dictionary for places search results. It holds the keys and
+# recurring values produced by PlacesClient._transform_places_response, so even
+# small result sets compress well. zlib favours matches near the end of the
+# dictionary, so the most frequent strings come last. Changing this dictionary
+# requires a new format tag, otherwise existing rows no longer decode.
+PLACES_DICTIONARY_V1 = (
+    '"Open 24 hours","Closed",'
+    '"lodging","gym","health","park","pharmacy","bus_station",'
+    '"train_station","subway_station","transit_station","hospital",'
+    '"doctor","primary_school","secondary_school","school","university",'
+    '"grocery_store","supermarket","store","shopping_mall","meal_takeaway",'
+    '"restaurant","cafe","bar","coffee_shop","food",'
+    '"Sunday: ","Saturday: ","Friday: ","Thursday: ","Wednesday: ",'
+    '"Tuesday: ","Monday: ",":00\u202fAM \u2013 ",":00\u202fPM",":30\u202fPM",'
+    ', Austin, TX 787, USA","next_page_token":"","status":"OK"}'
+    '"price_level":1},"price_level":2},'
+    '"opening_hours":{"open_now":false,"weekday_text":["Monday: '
+    '"opening_hours":{"open_now":true,"weekday_text":["Monday: '
+    '"rating":4.5,"user_ratings_total":'
+    '"point_of_interest","establishment"],'
+    '"geometry":{"location":{"lat":30.2,"lng":-97.7}},"types":["'
+    '{"place_id":"ChIJ","name":"","vicinity":"","formatted_address":"'
+    '{"results":[{"place_id":"ChIJ'
+).encode()
+
+_DICTIONARIES = {
+    FORMAT_ZLIB: None,
+    FORMAT_ZLIB_PLACES_V1: PLACES_DICTIONARY_V1,
+}
+
+
+def _compress(data: bytes, dictionary: Optional[bytes]) -> bytes:
+    if dictionary is None:
+        return zlib.compress(data, COMPRESSION_LEVEL)
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=dictionary)
+    return compressor.compress(data) + compressor.flush()
+
+
+def _decompress(data: bytes, dictionary: Optional[bytes]) -> bytes:
+    if dictionary is None:
+        return zlib.decompress(data)
+    decompressor = zlib.decompressobj(zdict=dictionary)
+    return decompressor.decompress(data) + decompressor.flush()
+
+
+def encode_payload(value: Any, format_tag: int = FORMAT_ZLIB) -> bytes:
+    """
+    Serialize a JSON-compatible value to a compressed, tagged blob
+
+    Args:
+        value: JSON-compatible value
+        format_tag: Storage format to use (FORMAT_ZLIB or FORMAT_ZLIB_PLACES_V1)
+
+    Returns:
+        Encoded blob
+    """
+    data = json.dumps(value, separators=(",", ":")).encode()
+    return bytes([format_tag]) + _compress(data, _DICTIONARIES[format_tag])
+
+
+def decode_payload(stored: Any) -> Any:
+    """
+    Decode a stored payload, whatever format it was written in
+
+    Args:
+        stored: Value read from the cache (tagged blob, or legacy JSON text/bytes)
+
+    Returns:
+        The decoded JSON value, or None for an empty value
+    """
+    if stored is None:
+        return None
+    if isinstance(stored, str):
+        return json.loads(stored)
+    stored = bytes(stored)
+    if not stored:
+        return None
+    format_tag = stored[0]
+    if format_tag not in _DICTIONARIES:
+        # Legacy rows hold uncompressed JSON, which never starts with a tag byte
+        return json.loads(stored)
+    return json.loads(_decompress(stored[1:], _DICTIONARIES[format_tag]))
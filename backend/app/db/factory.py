@@ -0,0 +1,18 @@
+from app.core.config import settings
+from app.db.base import GeocodingCache, PlacesCache
+from app.db.redis_cache import RedisGeocodingCache, RedisPlacesCache
+from app.models.database import GeocodingDatabase, PlacesDatabase
+
+
+def get_places_cache() -> PlacesCache:
+    """Create the places cache for the configured backend"""
+    if settings.CACHE_BACKEND == "redis":
+        return RedisPlacesCache()
+    return PlacesDatabase()
+
+
+def get_geocoding_cache() -> GeocodingCache:
+    """Create the geocoding cache for the configured backend"""
+    if settings.CACHE_BACKEND == "redis":
+        return RedisGeocodingCache()
+    return GeocodingDatabase()
@@ -0,0 +1,498 @@
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.core.timing import timed
+from app.db.base import GeocodingCache, PlacesCache
+from app.db.codec import (
+    FORMAT_ZLIB,
+    FORMAT_ZLIB_PLACES_V1,
+    decode_payload,
+    encode_payload,
+)
+from app.db.resp import RespClient, RespError
+from app.services.address import canonical_address
+from app.services.geo import distances_from, haversine_meters, parse_location
+
+logger = logging.getLogger("real-estate-api")
+
+# Keys per MGET when reading many entries
+MGET_BATCH = 500
+
+# One connection per server URL, shared by all requests in this process
+_clients: Dict[str, RespClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(url: str = None) -> RespClient:
+    """Get the shared RESP client for a server URL"""
+    url = url or settings.REDIS_URL
+    with _clients_lock:
+        if url not in _clients:
+            _clients[url] = RespClient(url, timeout=settings.REDIS_SOCKET_TIMEOUT)
+        return _clients[url]
+
+
+def empty_statistics() -> Dict[str, int]:
+    """
+    Counters of one cache category, as kept by
+    the SQLite backend's cache_statistics table
+    """
+    return {"entries": 0, "bytes": 0, "hits": 0, "misses": 0, "evictions": 0}
+
+
+class RedisCache:
+    """Common helpers for caches stored on a Redis-protocol server"""
+
+    namespace = ""
+    payload_format = FORMAT_ZLIB
+
+    def __init__(self, client: Optional[RespClient] = None):
+        self.client = client or get_client()
+        self.prefix = f"{settings.REDIS_KEY_PREFIX}{self.namespace}:"
+        # Hash of hit and miss counts ("hits:<category>", "misses:<category>")
+        self.stats_key = f"{settings.REDIS_KEY_PREFIX}stats:{self.namespace}"
+
+    @timed("cache_read")
+    def _get_entry(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            value = self.client.execute("GET", self.prefix + key)
+        except (RespError, ConnectionError, OSError) as e:
+            logger.error(f"Error reading {self.namespace} cache: {str(e)}")
+            return None
+        return decode_payload(value)
+
+    @timed("cache_write")
+    def _set_entry(
+        self, key: str, value: Dict[str, Any], ttl: Optional[int] = None
+    ) -> None:
+        try:
+            self.client.execute("SET", self.prefix + key,
+                                encode_payload(value, self.payload_format),
+                                "EX", ttl or settings.CACHE_EXPIRATION)
+        except (RespError, ConnectionError, OSError) as e:
+            logger.error(f"Error writing {self.namespace} cache: {str(e)}")
+
+    def _scan_keys(self, match: Optional[str] = None) -> List[bytes]:
+        keys = []
+        cursor = b"0"
+        while True:
+            cursor, batch = self.client.execute(
+                "SCAN", cursor, "MATCH", match or self.prefix + "*", "COUNT", 1000
+            )
+            keys.extend(batch)
+            if cursor in (b"0", 0):
+                return keys
+
+    def _get_values(self, keys: List[Any]) -> List[Optional[bytes]]:
+        values = []
+        for start in range(0, len(keys), MGET_BATCH):
+            values.extend(self.client.execute("MGET", *keys[start:start + MGET_BATCH]))
+        return values
+
+    def _count(self, result: str, category: str) -> None:
+        """Count a hit or miss; counts are shared by all nodes, like the entries"""
+        try:
+            self.client.execute("HINCRBY", self.stats_key, f"{result}:{category}", 1)
+        except (RespError, ConnectionError, OSError) as e:
+            logger.error(f"Error counting {self.namespace} cache {result}: {str(e)}")
+
+    def _get_counts(self) -> Dict[str, Dict[str, int]]:
+        """Hit and miss counts by category: {category: {'hits', 'misses'}}"""
+        reply = self.client.execute("HGETALL", self.stats_key) or []
+        counts: Dict[str, Dict[str, int]] = {}
+        for field, value in zip(reply[::2], reply[1::2]):
+            result, _, category = field.decode().partition(":")
+            counts.setdefault(category, {"hits": 0, "misses": 0})[result] = int(value)
+        return counts
+
+    def close(self) -> None:
+        # The connection is shared across requests and stays open
+        pass
+
+
+class RedisPlacesCache(RedisCache, PlacesCache):
+    """
+    Places cache shared between API nodes through a Redis-protocol server
+
+    Searches are kept as whole responses. Their places are also stored on their
+    own under "place:<place_id>" and indexed in geo sets, one for all places
+    ("place-geo") and one per type ("place-geo:<type>"), so cached places can
+    be found by location. Geo set members don't expire, so each geo set has a
+    sorted set of member expiry times ("place-expiry[:<type>]"): expired members
+    are skipped by searches and removed when places of their type are cached.
+    """
+
+    namespace = "places"
+    payload_format = FORMAT_ZLIB_PLACES_V1
+
+    def __init__(self, client: Optional[RespClient] = None):
+        super().__init__(client)
+        self.place_prefix = f"{settings.REDIS_KEY_PREFIX}place:"
+        self.geo_key = f"{settings.REDIS_KEY_PREFIX}place-geo"
+        self.expiry_key = f"{settings.REDIS_KEY_PREFIX}place-expiry"
+
+    def _index_keys(self, place_type: Optional[str]) -> Tuple[str, str]:
+        """Geo set and expiry set of the places of a type, or of all places"""
+        if not place_type:
+            return self.geo_key, self.expiry_key
+        return f"{self.geo_key}:{place_type}", f"{self.expiry_key}:{place_type}"
+
+    def get_places_entry(
+        self, location_key: str
+    ) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        Get cached places data; the server drops
+        entries once CACHE_STALE_TTL has passed too
+        """
+        entry = self._get_entry(location_key)
+        if entry is None:
+            logger.debug("No places cache found for key: %.15s...", location_key)
+            return None, False
+        # Entries written before cached_at was stored
+        # expire on the server at CACHE_EXPIRATION
+        expired = (
+            time.time() - entry.get("cached_at", time.time())
+            > settings.CACHE_EXPIRATION
+        )
+        if expired:
+            logger.debug("Found expired places cache for key: %.15s...", location_key)
+        else:
+            logger.debug("Found valid places cache for key: %.15s...", location_key)
+            self._count("hits", entry.get("type") or "")
+        return entry["results"], expired
+
+    def cache_places(
+        self,
+        location_key: str,
+        location: str,
+        radius: int,
+        place_type: str,
+        keyword: Optional[str],
+        results: Dict[str, Any],
+    ) -> None:
+        """Cache places search results and index their places by location"""
+        logger.debug("Caching places results for location key: %.15s...", location_key)
+        ttl = settings.CACHE_EXPIRATION + settings.CACHE_STALE_TTL
+        self._set_entry(location_key, {
+            "results": results,
+            "location": location,
+            "radius": radius,
+            "type": place_type,
+            "keyword": keyword,
+            "cached_at": time.time()
+        }, ttl=ttl)
+        # Every write fills a missing or expired entry
+        self._count("misses", place_type or "")
+        try:
+            self._index_places(results.get("results", []), ttl)
+        except (RespError, ConnectionError, OSError) as e:
+            logger.error(f"Error indexing cached places: {str(e)}")
+
+    @timed("cache_write")
+    def _index_places(self, places: List[Dict[str, Any]], ttl: int) -> None:
+        expires_at = time.time() + ttl
+        members: Dict[Optional[str], List[Tuple[float, float, str]]] = {None: []}
+        for place in places:
+            location = place.get("geometry", {}).get("location", {})
+            lat, lng = location.get("lat", 0), location.get("lng", 0)
+            # Results without an id are told apart by
+            # name and position, as in the SQLite cache
+            place_id = place.get("place_id") or f"{place.get('name', '')}@{lat},{lng}"
+            self.client.execute("SET", self.place_prefix + place_id,
+                                encode_payload(place, FORMAT_ZLIB_PLACES_V1), "EX", ttl)
+            for place_type in [None, *place.get("types", [])]:
+                members.setdefault(place_type, []).append((lng, lat, place_id))
+
+        for place_type, points in members.items():
+            geo_key, expiry_key = self._index_keys(place_type)
+            expired = self.client.execute(
+                "ZRANGEBYSCORE", expiry_key, "-inf", time.time()
+            )
+            if expired:
+                self.client.execute("ZREM", geo_key, *expired)
+                self.client.execute("ZREM", expiry_key, *expired)
+            if points:
+                self.client.execute(
+                    "GEOADD", geo_key, *(value for point in points for value in point)
+                )
+                self.client.execute(
+                    "ZADD",
+                    expiry_key,
+                    *(
+                        value
+                        for *_, place_id in points
+                        for value in (expires_at, place_id)
+                    )
+                )
+
+    def _search_points(self, lat: float, lng: float, radius: float,
+                       place_type: Optional[str]) -> List[Tuple[str, float, float]]:
+        """
+        (place_id, lat, lng) of the unexpired indexed places within `radius` meters
+        """
+        geo_key, expiry_key = self._index_keys(place_type)
+        try:
+            found = self.client.execute("GEOSEARCH", geo_key, "FROMLONLAT", lng, lat,
+                                        "BYRADIUS", radius, "m", "WITHCOORD")
+            expired = set(
+                self.client.execute("ZRANGEBYSCORE", expiry_key, "-inf", time.time())
+            )
+        except (RespError, ConnectionError, OSError) as e:
+            logger.error(f"Error searching cached places: {str(e)}")
+            return []
+        return [(member.decode(), float(point_lat), float(point_lng))
+                for member, (point_lng, point_lat) in found if member not in expired]
+
+    @timed("cache_read")
+    def find_places_within(self, location: str, radius: float,
+                           place_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Places found by cached searches within `radius` meters of a location"""
+        lat, lng = parse_location(location)
+        points = self._search_points(lat, lng, radius, place_type)
+        if not points:
+            return []
+        # The server's geohash precision is about
+        # half a meter: the circle is checked exactly
+        distances = distances_from(lat, lng, [p_lat for _, p_lat, _ in points],
+                                   [p_lng for *_, p_lng in points])
+        places = self.get_places(
+            [
+                place_id
+                for (place_id, *_), distance in zip(points, distances)
+                if distance <= radius
+            ]
+        )
+        return list(places.values())
+
+    @timed("cache_read")
+    def find_place_points(
+        self,
+        min_lat: float,
+        max_lat: float,
+        min_lng: float,
+        max_lng: float,
+        place_type: str,
+    ) -> List[Tuple[str, float, float]]:
+        """
+        (place_id, lat, lng) of the cached places
+        of a type within a latitude/longitude box
+        """
+        # The circle around the box's center through its corners covers the box
+        lat, lng = (min_lat + max_lat) / 2, (min_lng + max_lng) / 2
+        radius = max(
+            haversine_meters(lat, lng, corner_lat, corner_lng)
+            for corner_lat in (min_lat, max_lat)
+            for corner_lng in (min_lng, max_lng)
+        )
+        return [
+            (place_id, p_lat, p_lng)
+            for place_id, p_lat, p_lng in self._search_points(
+                lat, lng, radius + 1, place_type
+            )
+            if min_lat <= p_lat <= max_lat and min_lng <= p_lng <= max_lng
+        ]
+
+    @timed("cache_read")
+    def get_places(self, place_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Cached places by place_id; unknown and expired ids are left out"""
+        if not place_ids:
+            return {}
+        try:
+            values = self._get_values(
+                [self.place_prefix + place_id for place_id in place_ids]
+            )
+        except (RespError, ConnectionError, OSError) as e:
+            logger.error(f"Error reading cached places: {str(e)}")
+            return {}
+        places = {}
+        for place_id, value in zip(place_ids, values):
+            place = decode_payload(value)
+            if place is not None:
+                places[place_id] = place
+        return places
+
+    def get_places_ages(self, location_keys: List[str]) -> Dict[str, float]:
+        """Seconds since each cached entry among `location_keys` was written"""
+        if not location_keys:
+            return {}
+        try:
+            values = self._get_values([self.prefix + key for key in location_keys])
+        except (RespError, ConnectionError, OSError) as e:
+            logger.error(f"Error reading places cache: {str(e)}")
+            return {}
+        now = time.time()
+        ages = {}
+        for key, value in zip(location_keys, values):
+            entry = decode_payload(value)
+            if entry is not None:
+                # Entries written before cached_at was stored count as just expired
+                ages[key] = now - entry.get(
+                    "cached_at", now - settings.CACHE_EXPIRATION
+                )
+        return ages
+
+    def get_location_views(self) -> Dict[str, int]:
+        """Not tracked: the server keeps no hit counts per entry"""
+        return {}
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        Get statistics about cached data, in the shape of the SQLite backend's
+
+        Entry counts and sizes are read from the server, so the cost grows with
+        the number of cached entries. Evictions happen on the server
+        (maxmemory-policy) and are not counted.
+        """
+        keys = self._scan_keys()
+        by_type: Dict[str, Dict[str, int]] = {}
+        for value in self._get_values(keys):
+            entry = decode_payload(value)
+            if entry is None:
+                continue
+            stats = by_type.setdefault(entry.get("type") or "", empty_statistics())
+            stats["entries"] += 1
+            stats["bytes"] += len(value)
+        for place_type, counts in self._get_counts().items():
+            by_type.setdefault(place_type, empty_statistics()).update(counts)
+        places = {
+            field: sum(stats[field] for stats in by_type.values())
+            for field in empty_statistics()
+        }
+        stored_places = len(self._scan_keys(self.place_prefix + "*"))
+
+        geocoding = RedisGeocodingCache(self.client).get_cache_stats()
+        total_size = places["bytes"] + geocoding["size"]
+        logger.info(
+            "Cache stats: %s places searches with %s distinct places (%s bytes), "
+            "%s geocoding results (%s bytes)",
+            places['entries'],
+            stored_places,
+            places['bytes'],
+            geocoding['count'],
+            geocoding['size'],
+        )
+        return {
+            "places": {
+                "count": places["entries"],
+                "stored_places": stored_places,
+                "size": places["bytes"],
+                "hits": places["hits"],
+                "misses": places["misses"],
+                "evictions": places["evictions"],
+                "by_type": by_type
+            },
+            "geocoding": geocoding,
+            "total_cache_size": total_size
+        }
+
+    def clear_cache(self, cache_type: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Clear the cache
+
+        Args:
+            cache_type: Type of cache to clear. Currently only
+                'places' is supported. If None, clears all.
+
+        Returns:
+            Dict with results of the operation
+        """
+        result = {"deleted": {}}
+        logger.info(
+            "Clearing cache %s", '(' + cache_type + ')' if cache_type else '(all)'
+        )
+        try:
+            if cache_type is None or cache_type == "places":
+                keys = self._scan_keys()
+                deleted = self.client.execute("DEL", *keys) if keys else 0
+                # The stored places and their indexes go with the searches
+                index_keys = [
+                    *self._scan_keys(self.place_prefix + "*"),
+                    *self._scan_keys(self.geo_key + "*"),
+                    *self._scan_keys(self.expiry_key + "*"),
+                    self.stats_key,
+                ]
+                self.client.execute("DEL", *index_keys)
+                result["deleted"]["places"] = deleted
+                logger.info("Deleted %s entries from places cache", deleted)
+            return result
+        except (RespError, ConnectionError, OSError) as e:
+            logger.error(f"Error clearing cache: {str(e)}")
+            raise Exception(f"Error clearing cache: {str(e)}")
+
+
+class RedisGeocodingCache(RedisCache, GeocodingCache):
+    """Geocoding cache shared between API nodes through a Redis-protocol server"""
+
+    namespace = "geocode"
+
+    @timed("cache_read")
+    def address_exists_in_db(self, address: str) -> bool:
+        """Check if an address already exists in the cache"""
+        try:
+            return bool(
+                self.client.execute("EXISTS", self.prefix + canonical_address(address))
+            )
+        except (RespError, ConnectionError, OSError) as e:
+            logger.error(f"Error reading geocode cache: {str(e)}")
+            return False
+
+    def get_coordinates(self, address: str) -> Optional[Dict[str, Any]]:
+        """Get cached coordinates for an address, in any spelling"""
+        key = canonical_address(address)
+        entry = self._get_entry(key)
+        if entry and entry.get("lat") and entry.get("lon"):
+            self._count("hits", "")
+            return {
+                "lat": entry["lat"],
+                "lon": entry["lon"],
+                "address": entry.get("address") or key,
+            }
+        return None
+
+    def save_geocoding_result(self, result: Dict[str, Any]) -> None:
+        """Save a geocoding result to the cache"""
+        address = result['address']
+        logger.debug("Saving geocoding result for '%.30s...'", address)
+        if result['success']:
+            entry = {
+                "success": 1,
+                "lat": result['coordinates']['lat'],
+                "lon": result['coordinates']['lon'],
+                "formatted_address": result.get('formatted_address', ''),
+                "address_components": result.get('address_components', {}),
+                "place_id": result.get('place_id', '')
+            }
+        else:
+            entry = {"success": 0, "error": result.get('error')}
+        # Keyed on the canonical address, keeping the original for display
+        entry["address"] = address
+        self._set_entry(canonical_address(address), entry)
+        # Every write fills a missing entry
+        self._count("misses", "")
+
+    def save_geocoding_results(self, results: List[Dict[str, Any]]) -> None:
+        """
+        Save a batch of geocoding results; each entry
+        is a single SET, so no transaction is needed
+        """
+        for result in results:
+            self.save_geocoding_result(result)
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """
+        Get entry count, bytes, hits, misses and
+        evictions (not counted, see RedisPlacesCache)
+        """
+        keys = self._scan_keys()
+        size = sum(len(value) for value in self._get_values(keys) if value is not None)
+        counts = self._get_counts().get("", {})
+        return {
+            "count": len(keys),
+            "size": size,
+            "hits": counts.get("hits", 0),
+            "misses": counts.get("misses", 0),
+            "evictions": 0
+        }
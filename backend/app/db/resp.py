@@ -0,0 +1,344 @@
+"""
+Minimal client for the Redis serialization protocol (RESP2)
+
+Only the handful of commands used by the shared cache backend are needed, so
+this avoids pulling in a full Redis client library. ``RespStandInServer`` is a
+small in-process server speaking the same protocol, for local development and
+testing without a Redis installation.
+"""
+
+import fnmatch
+import logging
+import math
+import socket
+import socketserver
+import threading
+import time
+import urllib.parse
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger("real-estate-api")
+
+
+class RespError(Exception):
+    """Error reply returned by a RESP server"""
+
+
+def encode_command(*args: Any) -> bytes:
+    """Encode a command as a RESP array of bulk strings"""
+    parts = [f"*{len(args)}\r\n".encode()]
+    for arg in args:
+        if isinstance(arg, bytes):
+            data = arg
+        else:
+            data = str(arg).encode()
+        parts.append(f"${len(data)}\r\n".encode())
+        parts.append(data)
+        parts.append(b"\r\n")
+    return b"".join(parts)
+
+
+def read_reply(stream) -> Any:
+    """
+    Read a single RESP reply from a buffered binary stream
+
+    Args:
+        stream: File-like object opened in binary mode
+
+    Returns:
+        Decoded reply (bytes, int, str, list or None)
+    """
+    line = stream.readline()
+    if not line:
+        raise ConnectionError("Connection closed by server")
+    prefix, payload = line[:1], line[1:-2]
+    if prefix == b"+":
+        return payload.decode()
+    if prefix == b"-":
+        raise RespError(payload.decode())
+    if prefix == b":":
+        return int(payload)
+    if prefix == b"$":
+        length = int(payload)
+        if length == -1:
+            return None
+        data = stream.read(length + 2)
+        return data[:-2]
+    if prefix == b"*":
+        count = int(payload)
+        if count == -1:
+            return None
+        return [read_reply(stream) for _ in range(count)]
+    raise RespError(f"Unknown reply prefix: {prefix!r}")
+
+
+class RespClient:
+    """Thread-safe RESP client holding a single connection"""
+
+    def __init__(self, url: str, timeout: float = 2.0):
+        """
+        Initialize the client
+
+        Args:
+            url: Server URL in the form redis://[:password@]host[:port][/db]
+            timeout: Socket timeout in seconds
+        """
+        parsed = urllib.parse.urlparse(url)
+        self.host = parsed.hostname or "localhost"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self._sock = None
+        self._stream = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> None:
+        logger.debug("Connecting to RESP server at %s:%s", self.host, self.port)
+        self._sock = socket.create_connection(
+            (self.host, self.port), timeout=self.timeout
+        )
+        self._stream = self._sock.makefile("rb")
+        if self.password:
+            self._send(("AUTH", self.password))
+        if self.db:
+            self._send(("SELECT", self.db))
+
+    def _send(self, args: Tuple[Any, ...]) -> Any:
+        self._sock.sendall(encode_command(*args))
+        return read_reply(self._stream)
+
+    def _disconnect(self) -> None:
+        if self._sock is not None:
+            try:
+                self._stream.close()
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._stream = None
+
+    def execute(self, *args: Any) -> Any:
+        """
+        Execute a command, reconnecting once if the connection was lost
+
+        Args:
+            *args: Command name followed by its arguments
+
+        Returns:
+            Decoded reply
+        """
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._send(args)
+                except (ConnectionError, OSError):
+                    self._disconnect()
+                    if attempt:
+                        raise
+
+    def close(self) -> None:
+        """Close the connection"""
+        with self._lock:
+            self._disconnect()
+
+
+class _StandInHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            try:
+                command = read_reply(self.rfile)
+            except (ConnectionError, OSError):
+                return
+            if not command:
+                return
+            name = command[0].decode().upper()
+            args = command[1:]
+            try:
+                reply = self.server.dispatch(name, args)
+            except RespError as e:
+                self.wfile.write(f"-{e}\r\n".encode())
+                continue
+            self.wfile.write(self._encode(reply))
+
+    def _encode(self, reply: Any) -> bytes:
+        if reply is None:
+            return b"$-1\r\n"
+        if isinstance(reply, bool):
+            return f":{int(reply)}\r\n".encode()
+        if isinstance(reply, int):
+            return f":{reply}\r\n".encode()
+        if isinstance(reply, str):
+            return f"+{reply}\r\n".encode()
+        if isinstance(reply, bytes):
+            return f"${len(reply)}\r\n".encode() + reply + b"\r\n"
+        if isinstance(reply, list):
+            return f"*{len(reply)}\r\n".encode() + b"".join(
+                self._encode(r) for r in reply
+            )
+        raise TypeError(f"Cannot encode reply of type {type(reply)}")
+
+
+class RespStandInServer(socketserver.ThreadingTCPServer):
+    """
+    In-process, in-memory server implementing the subset of Redis commands
+    used by the cache backend: PING, GET, MGET, SET [EX], DEL, EXISTS, STRLEN,
+    SCAN, FLUSHDB, SELECT, AUTH, HINCRBY, HGETALL, ZADD, ZRANGEBYSCORE, ZREM,
+    GEOADD and GEOSEARCH (FROMLONLAT ... BYRADIUS ... m [WITHCOORD])
+
+    Sorted sets keep geo members with their coordinates instead of a geohash score.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _StandInHandler)
+        # Strings are bytes, hashes dicts of bytes, sorted sets dicts of member to
+        # score (or to (lng, lat) for geo members)
+        self._data: Dict[bytes, Tuple[Any, Optional[float]]] = {}
+        self._data_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self) -> "RespStandInServer":
+        """Serve requests on a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """Stop serving and release the socket"""
+        self.shutdown()
+        self.server_close()
+
+    def _live(self, key: bytes, kind: type = bytes) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self._data[key]
+            return None
+        if not isinstance(value, kind):
+            raise RespError(
+                "WRONGTYPE Operation against a key holding the wrong kind of value"
+            )
+        return value
+
+    def _container(self, key: bytes) -> Dict[bytes, Any]:
+        value = self._live(key, dict)
+        if value is None:
+            value = {}
+            self._data[key] = (value, None)
+        return value
+
+    def dispatch(self, name: str, args: List[bytes]) -> Any:
+        with self._data_lock:
+            if name == "PING":
+                return "PONG"
+            if name in ("SELECT", "AUTH"):
+                return "OK"
+            if name == "GET":
+                return self._live(args[0])
+            if name == "MGET":
+                values = [self._live(key, object) for key in args]
+                return [value if isinstance(value, bytes) else None for value in values]
+            if name == "SET":
+                expires_at = None
+                options = [a.decode().upper() for a in args[2:]]
+                if "EX" in options:
+                    expires_at = time.time() + int(options[options.index("EX") + 1])
+                self._data[args[0]] = (args[1], expires_at)
+                return "OK"
+            if name == "DEL":
+                return sum(1 for key in args if self._data.pop(key, None) is not None)
+            if name == "EXISTS":
+                return sum(1 for key in args if self._live(key, object) is not None)
+            if name == "STRLEN":
+                value = self._live(args[0])
+                return len(value) if value is not None else 0
+            if name == "SCAN":
+                pattern = "*"
+                options = [a.decode() for a in args[1:]]
+                if "MATCH" in (o.upper() for o in options):
+                    index = [o.upper() for o in options].index("MATCH")
+                    pattern = options[index + 1]
+                keys = [k for k in list(self._data) if self._live(k, object) is not None
+                        and fnmatch.fnmatchcase(k.decode(), pattern)]
+                return [b"0", keys]
+            if name == "FLUSHDB":
+                self._data.clear()
+                return "OK"
+            if name == "HINCRBY":
+                fields = self._container(args[0])
+                fields[args[1]] = str(
+                    int(fields.get(args[1], b"0")) + int(args[2])
+                ).encode()
+                return int(fields[args[1]])
+            if name == "HGETALL":
+                fields = self._live(args[0], dict) or {}
+                return [
+                    item for field, value in fields.items() for item in (field, value)
+                ]
+            if name == "ZADD":
+                members = self._container(args[0])
+                added = 0
+                for score, member in zip(args[1::2], args[2::2]):
+                    added += member not in members
+                    members[member] = float(score)
+                return added
+            if name == "ZRANGEBYSCORE":
+                members = self._live(args[0], dict) or {}
+                low, high = (
+                    float(bound.replace(b"inf", b"Infinity")) for bound in args[1:3]
+                )
+                ordered = sorted(members.items(), key=lambda item: item[1])
+                return [member for member, score in ordered if low <= score <= high]
+            if name == "ZREM":
+                members = self._live(args[0], dict) or {}
+                return sum(
+                    1 for member in args[1:] if members.pop(member, None) is not None
+                )
+            if name == "GEOADD":
+                members = self._container(args[0])
+                added = 0
+                for lng, lat, member in zip(args[1::3], args[2::3], args[3::3]):
+                    added += member not in members
+                    members[member] = (float(lng), float(lat))
+                return added
+            if name == "GEOSEARCH":
+                return self._geosearch(args)
+        raise RespError(f"ERR unknown command '{name}'")
+
+    def _geosearch(self, args: List[bytes]) -> List[Any]:
+        options = [a.decode().upper() for a in args]
+        supported = "FROMLONLAT" in options and "BYRADIUS" in options and "M" in options
+        if not supported:
+            raise RespError("ERR only FROMLONLAT ... BYRADIUS ... m is supported")
+        origin = options.index("FROMLONLAT")
+        lng, lat = float(args[origin + 1]), float(args[origin + 2])
+        radius = float(args[options.index("BYRADIUS") + 1])
+        members = self._live(args[0], dict) or {}
+        found = []
+        for member, (member_lng, member_lat) in members.items():
+            if _distance(lat, lng, member_lat, member_lng) <= radius:
+                coordinates = [repr(member_lng).encode(), repr(member_lat).encode()]
+                found.append(
+                    [member, coordinates] if "WITHCOORD" in options else member
+                )
+        return found
+
+
+def _distance(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance in meters, with the Earth radius Redis uses"""
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (math.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2)
+    return 2 * 6372797.560856 * math.asin(math.sqrt(a))
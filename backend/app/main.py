@@ -1,24 +1,23 @@
+import logging
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-import logging
-import os
 
 from app.api.v1.router import api_router
 from app.core.config import settings
+from app.core.logging_config import LogContextMiddleware, configure_logging
+from app.core.maintenance import maintenance_scheduler
+from app.core.metrics import MetricsMiddleware
+from app.core.profiler import SlowRequestMiddleware, slow_request_sampler
+from app.core.timing import ServerTimingMiddleware, TimedJSONResponse
+from app.services import upstream
+from app.services.neighborhoods import precompute_scheduler
 
 # Configure logging
-os.makedirs(settings.LOGS_DIR, exist_ok=True)
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(f"{settings.LOGS_DIR}/main.log"),
-        logging.StreamHandler()
-    ]
-)
+configure_logging()
 logger = logging.getLogger("real-estate-api")
 
-app = FastAPI(title=settings.PROJECT_NAME)
+app = FastAPI(title=settings.PROJECT_NAME, default_response_class=TimedJSONResponse)
 
 # Enable CORS
 app.add_middleware(
@@ -27,18 +26,46 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Partial /listings/active responses are marked in headers the frontend reads
+    expose_headers=["X-Partial-Result", "X-Pending-Listings"],
 )
 
+# Report per-request timing breakdown (Server-Timing header and a log line)
+if settings.SERVER_TIMING_ENABLED:
+    app.add_middleware(ServerTimingMiddleware)
+
+# Save timings and a stack profile of slow requests to LOGS_DIR
+if settings.SLOW_REQUEST_THRESHOLD_MS > 0:
+    app.add_middleware(SlowRequestMiddleware)
+
+# Record request latency, status codes and in-flight requests per route
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# Tag log records with the request path and sample high-volume routes
+app.add_middleware(LogContextMiddleware)
+
 # Include API router
 app.include_router(api_router, prefix=settings.API_PREFIX)
 
 @app.on_event("startup")
 async def startup_event():
     logger.info("Starting application...")
+    upstream.start_replay()
+    if settings.MAINTENANCE_ENABLED:
+        maintenance_scheduler.start()
+    if settings.PRECOMPUTE_ENABLED:
+        precompute_scheduler.start()
+    if settings.SLOW_REQUEST_THRESHOLD_MS > 0:
+        slow_request_sampler.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
     logger.info("Shutting down application...")
+    await maintenance_scheduler.stop()
+    await precompute_scheduler.stop()
+    slow_request_sampler.stop()
+    upstream.stop_replay()
 
 if __name__ == "__main__":
     import uvicorn
@@ -1,24 +1,272 @@
-import sqlite3
-from typing import Dict, Any, Optional
-import os
 import datetime
 import json
 import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
 from app.core.config import settings
+from app.core.timing import timed
+from app.db.base import GeocodingCache, PlacesCache
+from app.db.codec import FORMAT_ZLIB_PLACES_V1, decode_payload, encode_payload
+from app.services.address import canonical_address
+from app.services.geo import bounding_box, distances_from, parse_location
 
 logger = logging.getLogger("real-estate-api")
 
+# Counters kept per cache and category in the cache_statistics table
+STATISTICS_FIELDS = ("entries", "bytes", "hits", "misses", "evictions")
+
+# Searches deleted per step when evicting from the places cache
+EVICTION_BATCH = 100
+
+# Score columns of the amenity_scores table: the overall score and one per
+# category of app.services.amenities.AMENITY_TYPES
+AMENITY_SCORE_FIELDS = ("walkability", "school", "grocery", "hospital", "transit")
+
+class AccessLog:
+    """
+    Cache hits not yet written to the database
+
+    Reads only note their hits here, so a cache hit never opens a write
+    transaction and WAL readers keep running concurrently. flush() writes the
+    recency and hit counts of the entries and the hit totals per category in
+    one transaction. It runs on every maintenance tick, before evictions and
+    statistics reads, and from the read path once ACCESS_LOG_MAX_PENDING hits
+    are waiting.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # (table, key column) -> key -> [last access time, hits]
+        self._entries: Dict[Tuple[str, str], Dict[str, List[float]]] = {}
+        # (table, category) -> hits
+        self._hits: Dict[Tuple[str, str], int] = {}
+        self._pending = 0
+
+    def note(self, table: str, key_column: str, key: str, category: str) -> bool:
+        """
+        Note a hit on a cache entry
+
+        Returns:
+            True once enough hits are waiting that the caller should flush
+        """
+        with self._lock:
+            access = self._entries.setdefault((table, key_column), {}).setdefault(
+                key, [0.0, 0]
+            )
+            access[0] = time.time()
+            access[1] += 1
+            self._hits[(table, category)] = self._hits.get((table, category), 0) + 1
+            self._pending += 1
+            return self._pending >= settings.ACCESS_LOG_MAX_PENDING
+
+    def flush(self, conn: sqlite3.Connection) -> int:
+        """
+        Write the noted hits and forget them
+
+        Returns:
+            Number of hits written
+        """
+        with self._lock:
+            entries, hits, pending = self._entries, self._hits, self._pending
+            self._entries, self._hits, self._pending = {}, {}, 0
+        if not pending:
+            return 0
+        try:
+            for (table, key_column), accesses in entries.items():
+                # An entry rewritten since its hit keeps its newer access time
+                conn.executemany(
+                    f"UPDATE {table} "
+                    f"SET last_accessed = MAX(IFNULL(last_accessed, 0), ?), "
+                    f"hit_count = hit_count + ? WHERE {key_column} = ?",
+                    [
+                        (accessed, count, key)
+                        for key, (accessed, count) in accesses.items()
+                    ],
+                )
+            conn.executemany(
+                "UPDATE cache_statistics SET hits = hits + ? "
+                "WHERE cache = ? AND category = ?",
+                [(count, table, category) for (table, category), count in hits.items()],
+            )
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.warning(
+                f"Dropped {pending} cache hits that could not be recorded: {str(e)}"
+            )
+            return 0
+        return pending
+
+    def discard(self) -> None:
+        """Forget the noted hits, e.g. after the database they belong to was replaced"""
+        with self._lock:
+            self._entries, self._hits, self._pending = {}, {}, 0
+
+
+# Hits of every cache table in this process
+access_log = AccessLog()
+
+def payload_size(*values: Any) -> int:
+    """Approximate the number of bytes a cache row occupies"""
+    size = 0
+    for value in values:
+        if value is None:
+            continue
+        if isinstance(value, bytes):
+            size += len(value)
+        else:
+            size += len(str(value).encode())
+    return size
+
+def canonicalize_geocoding_keys(conn: sqlite3.Connection, schema: str = "main") -> int:
+    """
+    Re-key geocoding entries stored under a raw address
+
+    Entries without a display_address predate canonical keys: the raw address
+    moves to display_address and the key becomes its canonical form. Where
+    several entries share a canonical key, the successful and most recent one
+    is kept. Runs as a few set-based statements, not row by row.
+
+    Args:
+        conn: Connection to the cache database (the caller commits)
+        schema: Schema holding the geocoding_results table
+
+    Returns:
+        Number of entries re-keyed
+    """
+    conn.create_function("canonical_address", 1, canonical_address, deterministic=True)
+    conn.execute(f"""
+    DELETE FROM {schema}.geocoding_results WHERE rowid IN (
+        SELECT rowid FROM (
+            SELECT rowid, ROW_NUMBER() OVER (
+                PARTITION BY canonical_address(address)
+                ORDER BY success DESC, timestamp DESC, rowid DESC
+            ) AS position
+            FROM {schema}.geocoding_results
+        ) WHERE position > 1
+    )
+    """)
+    cursor = conn.execute(f"""
+    UPDATE {schema}.geocoding_results
+    SET display_address = address, address = canonical_address(address)
+    WHERE display_address IS NULL
+    """)
+    return cursor.rowcount
+
+def split_search_results(results: Dict[str, Any]) -> Tuple[str, List[Dict[str, Any]]]:
+    """
+    Separate the places of a search from the rest of its response
+
+    Returns:
+        The response without its "results" list as JSON text, and that list
+    """
+    envelope = {key: value for key, value in results.items() if key != "results"}
+    return json.dumps(envelope, separators=(",", ":")), results.get("results", [])
+
+def store_place(cursor: sqlite3.Cursor, place: Dict[str, Any]) -> int:
+    """
+    Insert a place into the places table, or refresh the stored copy
+
+    Args:
+        cursor: Cursor of the cache database (the caller commits)
+        place: Place as returned by PlacesClient.search_nearby
+
+    Returns:
+        Row id of the place, referenced by the searches that found it
+    """
+    location = place.get("geometry", {}).get("location", {})
+    lat, lng = location.get("lat", 0), location.get("lng", 0)
+    # Results without an id are told apart by name and position
+    place_id = place.get("place_id") or f"{place.get('name', '')}@{lat},{lng}"
+    types = json.dumps(place.get("types", []), separators=(",", ":"))
+    data = encode_payload(place, FORMAT_ZLIB_PLACES_V1)
+    cursor.execute(
+        """
+        INSERT INTO places (place_id, lat, lng, types, data, size, timestamp)
+        VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
+        ON CONFLICT (place_id) DO UPDATE
+        SET lat = excluded.lat, lng = excluded.lng, types = excluded.types,
+            data = excluded.data, size = excluded.size, timestamp = excluded.timestamp
+        RETURNING id
+        """,
+        (place_id, lat, lng, types, data, payload_size(place_id, types, data)),
+    )
+    return cursor.fetchone()[0]
+
+def normalize_place_searches(conn: sqlite3.Connection) -> int:
+    """
+    Move the places of searches cached as one payload into the places table
+
+    Searches written before the places table hold their whole response in the
+    results column and no place_ids; each is rewritten to reference its places.
+
+    Args:
+        conn: Connection to the cache database (the caller commits)
+
+    Returns:
+        Number of searches rewritten
+    """
+    cursor = conn.cursor()
+    rows = cursor.execute(
+        "SELECT location_key, location, radius, type, keyword, results "
+        "FROM nearby_places WHERE place_ids IS NULL"
+    ).fetchall()
+    for location_key, location, radius, place_type, keyword, results in rows:
+        envelope, places = split_search_results(decode_payload(results) or {})
+        place_ids = json.dumps(
+            [store_place(cursor, place) for place in places], separators=(",", ":")
+        )
+        cursor.execute(
+            "UPDATE nearby_places SET results = ?, place_ids = ?, size = ? "
+            "WHERE location_key = ?",
+            (
+                envelope,
+                place_ids,
+                payload_size(
+                    location_key,
+                    location,
+                    radius,
+                    place_type,
+                    keyword,
+                    envelope,
+                    place_ids,
+                ),
+                location_key,
+            ),
+        )
+    return len(rows)
+
 class Database:
+    # Cache table managed by this class, its primary key and its largest payload column
+    cache_table: Optional[str] = None
+    cache_key_column: Optional[str] = None
+    cache_payload_column: Optional[str] = None
+    # Column splitting the cache statistics into categories, if any
+    cache_category_column: Optional[str] = None
+
     def __init__(self):
         self.conn = None
 
+    @timed("cache_open")
     def connect(self):
         """Create and return a database connection"""
         os.makedirs(os.path.dirname(settings.DB_PATH), exist_ok=True)
-        logger.debug(f"Connecting to database at {settings.DB_PATH}")
+        logger.debug("Connecting to database at %s", settings.DB_PATH)
         # Add check_same_thread=False to allow access from multiple threads
         self.conn = sqlite3.connect(settings.DB_PATH, check_same_thread=False)
         self.conn.row_factory = sqlite3.Row
+        # Only takes effect for a new database file; existing files are converted
+        # once with `clear_cache.py --enable-incremental-vacuum`
+        self.conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        # WAL lets readers proceed while maintenance deletes expired entries
+        self.conn.execute("PRAGMA journal_mode = WAL")
+        # Fire delete triggers for rows removed by INSERT
+        # OR REPLACE so size accounting stays exact
+        self.conn.execute("PRAGMA recursive_triggers = ON")
         return self.conn
     
     def close(self):
@@ -27,6 +275,258 @@ class Database:
             logger.debug("Closing database connection")
             self.conn.close()
 
+    @property
+    def max_cache_bytes(self) -> int:
+        """Byte budget for this cache table (0 means unbounded)"""
+        return 0
+
+    def category_sql(self, row: Optional[str] = None) -> str:
+        """
+        SQL expression for the statistics category of a row (NEW/OLD inside triggers)
+        """
+        if self.cache_category_column is None:
+            return "''"
+        column = (
+            f"{row}.{self.cache_category_column}" if row else self.cache_category_column
+        )
+        return f"IFNULL({column}, '')"
+
+    def init_cache_tracking(self) -> None:
+        """
+        Add access tracking and statistics to the cache table
+        
+        Each row records its payload size, last access time and hit count.
+        Triggers keep entry and byte totals per cache and category in
+        cache_statistics, so checking the budget or reporting stats never
+        requires scanning the table. Hits, misses and evictions are counted
+        there by the code paths that cause them, in the same transaction.
+        """
+        table = self.cache_table
+        cursor = self.conn.cursor()
+        
+        cursor.execute(f"PRAGMA table_info({table})")
+        columns = {row['name'] for row in cursor.fetchall()}
+        if "size" not in columns:
+            logger.info("Adding access tracking columns to %s", table)
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN size INTEGER DEFAULT 0")
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN last_accessed REAL")
+            cursor.execute(
+                f"ALTER TABLE {table} ADD COLUMN hit_count INTEGER DEFAULT 0"
+            )
+            # Legacy rows: approximate their size from the stored payload
+            cursor.execute(
+                f"UPDATE {table} "
+                f"SET size = "
+                f"IFNULL(LENGTH(CAST({self.cache_payload_column} AS BLOB)), 0) "
+                f"+ LENGTH(CAST({self.cache_key_column} AS BLOB))"
+            )
+        
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{table}_lru ON {table} (last_accessed)"
+        )
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{table}_lfu "
+            f"ON {table} (hit_count, last_accessed)"
+        )
+        
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cache_statistics (
+            cache TEXT NOT NULL,
+            category TEXT NOT NULL,
+            entries INTEGER NOT NULL DEFAULT 0,
+            bytes INTEGER NOT NULL DEFAULT 0,
+            hits INTEGER NOT NULL DEFAULT 0,
+            misses INTEGER NOT NULL DEFAULT 0,
+            evictions INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (cache, category)
+        )
+        ''')
+        
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?",
+            (f"{table}_stats_insert",),
+        )
+        if cursor.fetchone() is not None:
+            return
+        
+        # First run against this table: replace the byte-only accounting of older
+        # versions, install the triggers and seed the totals with one full scan
+        logger.info("Creating cache statistics for %s", table)
+        for suffix in ("insert", "delete", "update"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {table}_usage_{suffix}")
+        
+        cursor.execute(f'''
+        CREATE TRIGGER {table}_stats_insert AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO cache_statistics (cache, category, entries, bytes)
+            VALUES ('{table}', {self.category_sql("NEW")}, 1, IFNULL(NEW.size, 0))
+            ON CONFLICT (cache, category) DO UPDATE
+            SET entries = entries + 1, bytes = bytes + excluded.bytes;
+        END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER {table}_stats_delete AFTER DELETE ON {table}
+        BEGIN
+            UPDATE cache_statistics
+            SET entries = entries - 1, bytes = bytes - IFNULL(OLD.size, 0)
+            WHERE cache = '{table}' AND category = {self.category_sql("OLD")};
+        END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER {table}_stats_update AFTER UPDATE OF size ON {table}
+        BEGIN
+            UPDATE cache_statistics
+            SET bytes = bytes + IFNULL(NEW.size, 0) - IFNULL(OLD.size, 0)
+            WHERE cache = '{table}' AND category = {self.category_sql("NEW")};
+        END
+        ''')
+        self.reconcile_statistics(commit=False)
+
+    def reconcile_statistics(self, commit: bool = True) -> Dict[str, Dict[str, int]]:
+        """
+        Recompute entry and byte totals of the cache table with a full scan
+        
+        Only needed if the statistics drifted, e.g. after rows were changed by a
+        tool that bypasses the triggers. Hit, miss and eviction counters are kept.
+        
+        Returns:
+            Statistics per category after reconciliation
+        """
+        table = self.cache_table
+        self.conn.execute(
+            "UPDATE cache_statistics SET entries = 0, bytes = 0 WHERE cache = ?",
+            (table,),
+        )
+        # WHERE true disambiguates the upsert's ON CONFLICT from a join constraint
+        self.conn.execute(f'''
+        INSERT INTO cache_statistics (cache, category, entries, bytes)
+        SELECT ?, {self.category_sql()}, COUNT(*), IFNULL(SUM(size), 0)
+        FROM {table} WHERE true GROUP BY 2
+        ON CONFLICT (cache, category) DO UPDATE
+        SET entries = excluded.entries, bytes = excluded.bytes
+        ''',
+            (table,),
+        )
+        if commit:
+            self.conn.commit()
+        # Not flushing: during schema setup a flush
+        # would commit (or roll back) the setup
+        return self.read_statistics()
+
+    def get_statistics(self) -> Dict[str, Dict[str, int]]:
+        """
+        Get entries, bytes, hits, misses and evictions of the cache table per category
+        """
+        self.flush_accesses()
+        return self.read_statistics()
+
+    def read_statistics(self) -> Dict[str, Dict[str, int]]:
+        """Statistics as stored, without the hits still waiting in the access log"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            f"SELECT category, {', '.join(STATISTICS_FIELDS)} "
+            f"FROM cache_statistics WHERE cache = ?",
+            (self.cache_table,),
+        )
+        return {
+            row['category']: {field: row[field] for field in STATISTICS_FIELDS}
+            for row in cursor
+        }
+
+    def record_access(self, key: str, category: str = "") -> None:
+        """
+        Note a hit on a cache entry, written later by flush_accesses (see AccessLog)
+        """
+        if access_log.note(self.cache_table, self.cache_key_column, key, category):
+            self.flush_accesses()
+
+    def flush_accesses(self) -> int:
+        """Write the cache hits noted by this process"""
+        return access_log.flush(self.conn)
+
+    def record_miss(self, category: str = "", count: int = 1) -> None:
+        """
+        Count cache misses; called by the write
+        that fills the entries, before it commits
+        """
+        self.conn.execute(
+            "INSERT INTO cache_statistics (cache, category, misses) VALUES (?, ?, ?) "
+            "ON CONFLICT (cache, category) "
+            "DO UPDATE SET misses = misses + excluded.misses",
+            (self.cache_table, category, count),
+        )
+
+    def get_cache_usage(self) -> int:
+        """Get the number of payload bytes currently stored in the cache table"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "SELECT IFNULL(SUM(bytes), 0) FROM cache_statistics WHERE cache = ?",
+            (self.cache_table,),
+        )
+        return cursor.fetchone()[0]
+
+    def eviction_order(self) -> str:
+        """ORDER BY clause listing entries from the first to the last to evict"""
+        if settings.CACHE_EVICTION_POLICY == "lfu":
+            return "hit_count ASC, last_accessed ASC"
+        return "last_accessed ASC"
+
+    def evict_to_budget(self) -> int:
+        """
+        Evict the least valuable entries once the table exceeds its byte budget
+        
+        Entries are removed until usage drops to CACHE_EVICTION_TARGET of the budget,
+        so a full cache does not evict on every write. The eviction order follows
+        CACHE_EVICTION_POLICY: 'lru' drops the least recently accessed entries,
+        'lfu' the least hit ones (oldest access first among equals).
+        
+        Returns:
+            Number of evicted entries
+        """
+        max_bytes = self.max_cache_bytes
+        if max_bytes <= 0:
+            return 0
+        
+        used = self.get_cache_usage()
+        if used <= max_bytes:
+            return 0
+        # Recency and hit counts decide what is evicted
+        self.flush_accesses()
+        
+        excess = used - int(max_bytes * settings.CACHE_EVICTION_TARGET)
+        cursor = self.conn.cursor()
+        cursor.execute(
+            f"SELECT {self.cache_key_column} AS key, "
+            f"{self.category_sql()} AS category, size "
+            f"FROM {self.cache_table} ORDER BY {self.eviction_order()}"
+        )
+        victims = []
+        evicted: Dict[str, int] = {}
+        freed = 0
+        for row in cursor:
+            victims.append((row['key'],))
+            evicted[row['category']] = evicted.get(row['category'], 0) + 1
+            freed += row['size'] or 0
+            if freed >= excess:
+                break
+        cursor.close()
+        
+        self.conn.executemany(
+            f"DELETE FROM {self.cache_table} WHERE {self.cache_key_column} = ?", victims
+        )
+        self.conn.executemany(
+            "UPDATE cache_statistics SET evictions = evictions + ? "
+            "WHERE cache = ? AND category = ?",
+            [
+                (count, self.cache_table, category)
+                for category, count in evicted.items()
+            ],
+        )
+        self.conn.commit()
+        logger.info("Evicted %s entries (%s bytes) from %s to stay within %s bytes",
+                    len(victims), freed, self.cache_table, max_bytes)
+        return len(victims)
+
     def is_cache_expired(self, timestamp_str: str) -> bool:
         """
         Check if cached data is expired
@@ -54,13 +554,18 @@ class Database:
             logger.error(f"Error checking cache expiration: {str(e)}")
             return True
 
-class GeocodingDatabase(Database):
+class GeocodingDatabase(Database, GeocodingCache):
+    cache_table = "geocoding_results"
+    cache_key_column = "address"
+    cache_payload_column = "raw_response"
+
     def __init__(self):
         super().__init__()
         self.conn = self.connect()
         self.init_database()
         logger.debug("GeocodingDatabase initialized")
 
+    @timed("cache_open")
     def init_database(self):
         """Initialize the geocoding database schema"""
         cursor = self.conn.cursor()
@@ -84,28 +589,79 @@ class GeocodingDatabase(Database):
             suburb TEXT,
             place_id TEXT,
             raw_response TEXT,
-            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+            display_address TEXT
         )
         ''')
+        self.init_cache_tracking()
+        
+        # Entries are keyed on the canonical address
+        # since the display_address column was added
+        cursor.execute("PRAGMA table_info(geocoding_results)")
+        columns = {row['name'] for row in cursor.fetchall()}
+        if "display_address" not in columns:
+            logger.info("Migrating geocoding_results to canonical address keys")
+            cursor.execute(
+                "ALTER TABLE geocoding_results ADD COLUMN display_address TEXT"
+            )
+            migrated = canonicalize_geocoding_keys(self.conn)
+            logger.info("Re-keyed %s geocoding results", migrated)
         
         self.conn.commit()
 
+    @property
+    def max_cache_bytes(self) -> int:
+        return settings.GEOCODING_CACHE_MAX_BYTES
+
+    @timed("cache_read")
     def address_exists_in_db(self, address: str) -> bool:
         """
         Check if an address already exists in the geocoding database
         
         Args:
-            address: Address to check
+            address: Address to check, in any spelling
             
         Returns:
             bool: True if address exists, False otherwise
         """
         cursor = self.conn.cursor()
-        cursor.execute("SELECT 1 FROM geocoding_results WHERE address = ?", (address,))
+        cursor.execute(
+            "SELECT 1 FROM geocoding_results WHERE address = ?",
+            (canonical_address(address),),
+        )
         result = cursor.fetchone() is not None
-        logger.debug(f"Address '{address[:30]}...' exists in database: {result}")
+        logger.debug("Address '%.30s...' exists in database: %s", address, result)
         return result
 
+    @timed("cache_read")
+    def get_coordinates(self, address: str) -> Optional[Dict[str, Any]]:
+        """
+        Get cached coordinates for an address
+        
+        Args:
+            address: Address to look up, in any spelling
+            
+        Returns:
+            Dict with 'lat' and 'lon' keys and the 'address' the entry was
+            geocoded for, or None if not cached or geocoding failed
+        """
+        key = canonical_address(address)
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "SELECT lat, lon, display_address FROM geocoding_results WHERE address = ?",
+            (key,),
+        )
+        result = cursor.fetchone()
+        if result and result['lat'] and result['lon']:
+            self.record_access(key)
+            return {
+                "lat": result['lat'],
+                "lon": result['lon'],
+                "address": result['display_address'] or key,
+            }
+        return None
+
+    @timed("cache_write")
     def save_geocoding_result(self, result: Dict[str, Any]) -> None:
         """
         Save geocoding result to SQLite database
@@ -113,21 +669,42 @@ class GeocodingDatabase(Database):
         Args:
             result: Geocoding result dict to save
         """
+        self._insert_geocoding_result(self.conn.cursor(), result)
+        # Every write fills a missing entry
+        self.record_miss()
+        self.conn.commit()
+        self.evict_to_budget()
+
+    @timed("cache_write")
+    def save_geocoding_results(self, results: List[Dict[str, Any]]) -> None:
+        """
+        Save a batch of geocoding results in one transaction
+        
+        Args:
+            results: Geocoding result dicts to save
+        """
+        if not results:
+            return
         cursor = self.conn.cursor()
+        for result in results:
+            self._insert_geocoding_result(cursor, result)
+        self.record_miss(count=len(results))
+        self.conn.commit()
+        self.evict_to_budget()
+
+    def _insert_geocoding_result(
+        self, cursor: sqlite3.Cursor, result: Dict[str, Any]
+    ) -> None:
+        """Write a geocoding result without committing"""
         address = result['address']
+        key = canonical_address(address)
         
-        logger.debug(f"Saving geocoding result for '{address[:30]}...'")
+        logger.debug("Saving geocoding result for '%.30s...'", address)
         
         if result['success']:
             # Extract data from result
-            cursor.execute('''
-            INSERT OR REPLACE INTO geocoding_results 
-            (address, success, lat, lon, formatted_address, 
-            house_number, street, city, county, state, country, 
-            postcode, suburb, place_id, raw_response)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                result['address'],
+            values = (
+                key,
                 1 if result['success'] else 0,
                 result['coordinates']['lat'],
                 result['coordinates']['lon'],
@@ -141,37 +718,63 @@ class GeocodingDatabase(Database):
                 result['address_components'].get('postcode', ''),
                 result['address_components'].get('suburb', ''),
                 result.get('place_id', ''),
-                json.dumps(result.get('raw_response', {}))
-            ))
-            logger.debug(f"Successfully saved geocoding result for '{address[:30]}...'")
+                # Coordinates and address components live in their own columns,
+                # so the full provider response is only kept when configured
+                encode_payload(result.get('raw_response', {}))
+                if settings.GEOCODING_STORE_RAW_RESPONSE else None
+            )
+            cursor.execute('''
+            INSERT OR REPLACE INTO geocoding_results 
+            (address, success, lat, lon, formatted_address, 
+            house_number, street, city, county, state, country, 
+            postcode, suburb, place_id, raw_response, display_address, size,
+            last_accessed, hit_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
+            ''',
+                values + (address, payload_size(address, *values), time.time()),
+            )
+            logger.debug("Successfully saved geocoding result for '%.30s...'", address)
         else:
             # For failed geocoding attempts, just store the address and error
+            if settings.GEOCODING_STORE_RAW_RESPONSE:
+                error = result
+            else:
+                error = {name: result.get(name) for name in ('error', 'status_code')}
+            values = (
+                key,
+                0,
+                encode_payload(error)
+            )
             cursor.execute('''
             INSERT OR REPLACE INTO geocoding_results 
-            (address, success, raw_response)
-            VALUES (?, ?, ?)
-            ''', (
-                result['address'],
-                0,
-                json.dumps(result)
-            ))
-            logger.debug(f"Saved failed geocoding result for '{address[:30]}...'")
-        
-        self.conn.commit()
+            (address, success, raw_response, display_address, size, last_accessed,
+            hit_count)
+            VALUES (?, ?, ?, ?, ?, ?, 0)
+            ''',
+                values + (address, payload_size(address, *values), time.time()),
+            )
+            logger.debug("Saved failed geocoding result for '%.30s...'", address)
+
+class PlacesDatabase(Database, PlacesCache):
+    cache_table = "nearby_places"
+    cache_key_column = "location_key"
+    cache_payload_column = "results"
+    cache_category_column = "type"
 
-class PlacesDatabase(Database):
     def __init__(self):
         super().__init__()
         self.conn = self.connect()
         self.init_database()
         logger.debug("PlacesDatabase initialized")
 
+    @timed("cache_open")
     def init_database(self):
         """Initialize the places database schema"""
         cursor = self.conn.cursor()
         logger.debug("Initializing places database schema")
         
-        # Create table for caching nearby places results
+        # Create table for caching nearby places searches; the places they found
+        # are stored once each in the places table and referenced by row id
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS nearby_places (
             location_key TEXT PRIMARY KEY,
@@ -180,71 +783,450 @@ class PlacesDatabase(Database):
             type TEXT,
             keyword TEXT,
             results TEXT,
+            place_ids TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        # Lets maintenance delete expired entries in small chunks without full scans
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_nearby_places_timestamp "
+            "ON nearby_places (timestamp)"
+        )
+        
+        cursor.execute("PRAGMA table_info(nearby_places)")
+        legacy = "place_ids" not in {row['name'] for row in cursor.fetchall()}
+        if legacy:
+            cursor.execute("ALTER TABLE nearby_places ADD COLUMN place_ids TEXT")
+        
+        # Places found by any search, deduplicated by place_id; refs counts the
+        # searches referencing a place, which is deleted with the last of them
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS places (
+            id INTEGER PRIMARY KEY,
+            place_id TEXT NOT NULL UNIQUE,
+            lat REAL,
+            lng REAL,
+            types TEXT,
+            data BLOB,
+            size INTEGER DEFAULT 0,
+            refs INTEGER NOT NULL DEFAULT 0,
             timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
         )
         ''')
+        # Spatial index of the places for radius queries
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS places_rtree "
+            "USING rtree(id, min_lat, max_lat, min_lng, max_lng)"
+        )
+        
+        self.init_cache_tracking()
+        self.init_place_store()
+        if legacy:
+            logger.info("Moving cached places searches to the places table")
+            count = normalize_place_searches(self.conn)
+            logger.info(
+                "Moved the places of %s cached searches to the places table", count
+            )
         
         self.conn.commit()
 
-    def get_cached_places(self, location_key: str) -> Optional[Dict[str, Any]]:
-        """Get cached places data if it exists and is not expired"""
+    def init_place_store(self) -> None:
+        """
+        Install the triggers maintaining the places table
+        
+        Writing or deleting a search adjusts the reference counts of its places
+        and deletes the places no longer referenced, so evicting or expiring
+        searches also frees their places. Places keep their R*Tree entry and
+        their totals in cache_statistics (cache 'places') up to date.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS nearby_places_refs_insert
+        AFTER INSERT ON nearby_places
+        BEGIN
+            UPDATE places SET refs = refs + 1
+            WHERE id IN (SELECT value FROM json_each(NEW.place_ids));
+        END
+        ''')
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS nearby_places_refs_delete
+        AFTER DELETE ON nearby_places
+        BEGIN
+            UPDATE places SET refs = refs - 1
+            WHERE id IN (SELECT value FROM json_each(OLD.place_ids));
+            DELETE FROM places
+            WHERE id IN (SELECT value FROM json_each(OLD.place_ids)) AND refs <= 0;
+        END
+        ''')
+        # New references are counted first so places in both lists are kept
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS nearby_places_refs_update
+        AFTER UPDATE OF place_ids ON nearby_places
+        BEGIN
+            UPDATE places SET refs = refs + 1
+            WHERE id IN (SELECT value FROM json_each(NEW.place_ids));
+            UPDATE places SET refs = refs - 1
+            WHERE id IN (SELECT value FROM json_each(OLD.place_ids));
+            DELETE FROM places
+            WHERE id IN (SELECT value FROM json_each(OLD.place_ids)) AND refs <= 0;
+        END
+        ''')
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS places_insert AFTER INSERT ON places
+        BEGIN
+            INSERT INTO places_rtree
+            VALUES (NEW.id, NEW.lat, NEW.lat, NEW.lng, NEW.lng);
+            INSERT INTO cache_statistics (cache, category, entries, bytes)
+            VALUES ('places', '', 1, IFNULL(NEW.size, 0))
+            ON CONFLICT (cache, category) DO UPDATE
+            SET entries = entries + 1, bytes = bytes + excluded.bytes;
+        END
+        ''')
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS places_delete AFTER DELETE ON places
+        BEGIN
+            DELETE FROM places_rtree WHERE id = OLD.id;
+            UPDATE cache_statistics
+            SET entries = entries - 1, bytes = bytes - IFNULL(OLD.size, 0)
+            WHERE cache = 'places' AND category = '';
+        END
+        ''')
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS places_update
+        AFTER UPDATE OF lat, lng, size ON places
+        BEGIN
+            UPDATE places_rtree
+            SET min_lat = NEW.lat, max_lat = NEW.lat,
+                min_lng = NEW.lng, max_lng = NEW.lng
+            WHERE id = NEW.id;
+            UPDATE cache_statistics
+            SET bytes = bytes + IFNULL(NEW.size, 0) - IFNULL(OLD.size, 0)
+            WHERE cache = 'places' AND category = '';
+        END
+        ''')
+
+    def reconcile_statistics(self, commit: bool = True) -> Dict[str, Dict[str, int]]:
+        """
+        Recompute the totals of the searches and of the places table with a full scan
+        """
+        self.conn.execute('''
+        INSERT INTO cache_statistics (cache, category, entries, bytes)
+        SELECT 'places', '', COUNT(*), IFNULL(SUM(size), 0) FROM places WHERE true
+        ON CONFLICT (cache, category) DO UPDATE
+        SET entries = excluded.entries, bytes = excluded.bytes
+        ''')
+        return super().reconcile_statistics(commit)
+
+    def get_cache_usage(self) -> int:
+        """
+        Get the bytes stored for cached searches, including the places they reference
+        """
         cursor = self.conn.cursor()
         cursor.execute(
-            "SELECT results, timestamp FROM nearby_places WHERE location_key = ?", 
+            "SELECT IFNULL(SUM(bytes), 0) FROM cache_statistics "
+            "WHERE cache IN (?, 'places')",
+            (self.cache_table,),
+        )
+        return cursor.fetchone()[0]
+
+    def evict_to_budget(self) -> int:
+        """
+        Evict the least valuable searches once the cache exceeds its byte budget
+        
+        A search frees its own row and the places no other search references,
+        which is only known once it is deleted, so searches are evicted in
+        batches until the usage read back from cache_statistics reaches
+        CACHE_EVICTION_TARGET of the budget.
+        
+        Returns:
+            Number of evicted searches
+        """
+        max_bytes = self.max_cache_bytes
+        if max_bytes <= 0:
+            return 0
+        
+        used = self.get_cache_usage()
+        if used <= max_bytes:
+            return 0
+        # Recency and hit counts decide what is evicted
+        self.flush_accesses()
+        
+        target = int(max_bytes * settings.CACHE_EVICTION_TARGET)
+        evicted: Dict[str, int] = {}
+        count = 0
+        freed = used
+        while used > target:
+            victims = self.conn.execute(
+                f"SELECT location_key, {self.category_sql()} AS category "
+                f"FROM nearby_places ORDER BY {self.eviction_order()} LIMIT ?",
+                (EVICTION_BATCH,),
+            ).fetchall()
+            if not victims:
+                break
+            self.conn.executemany("DELETE FROM nearby_places WHERE location_key = ?",
+                                  [(row['location_key'],) for row in victims])
+            for row in victims:
+                evicted[row['category']] = evicted.get(row['category'], 0) + 1
+            count += len(victims)
+            used = self.get_cache_usage()
+        
+        self.conn.executemany(
+            "UPDATE cache_statistics SET evictions = evictions + ? "
+            "WHERE cache = ? AND category = ?",
+            [
+                (evictions, self.cache_table, category)
+                for category, evictions in evicted.items()
+            ],
+        )
+        self.conn.commit()
+        logger.info("Evicted %s searches (%s bytes) from %s to stay within %s bytes",
+                    count, freed - used, self.cache_table, max_bytes)
+        return count
+
+    @property
+    def max_cache_bytes(self) -> int:
+        return settings.PLACES_CACHE_MAX_BYTES
+
+    @timed("cache_read")
+    def get_places_entry(
+        self, location_key: str
+    ) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """Get cached places data and whether it is expired"""
+        cursor = self.conn.cursor()
+        # One row per referenced place, in search order, or a single row without places
+        cursor.execute(
+            """
+            SELECT n.results, n.place_ids, n.type, n.timestamp, p.data
+            FROM nearby_places AS n
+            LEFT JOIN json_each(n.place_ids) AS ref
+            LEFT JOIN places AS p ON p.id = ref.value
+            WHERE n.location_key = ?
+            ORDER BY ref.key
+            """,
             (location_key,)
         )
-        result = cursor.fetchone()
+        rows = cursor.fetchall()
         
-        if result:
+        if rows:
+            result = rows[0]
             is_expired = self.is_cache_expired(result['timestamp'])
             if not is_expired:
-                logger.debug(f"Found valid places cache for key: {location_key[:15]}...")
-                return json.loads(result['results'])
+                logger.debug("Found valid places cache for key: %.15s...", location_key)
+                self.record_access(location_key, result['type'] or '')
             else:
-                logger.debug(f"Found expired places cache for key: {location_key[:15]}...")
-        else:
-            logger.debug(f"No places cache found for key: {location_key[:15]}...")
+                logger.debug(
+                    "Found expired places cache for key: %.15s...", location_key
+                )
+            if result['place_ids'] is None:
+                # Written by a version without the places table, before migration
+                return decode_payload(result['results']), is_expired
+            results = json.loads(result['results'])
+            results["results"] = [
+                decode_payload(row['data']) for row in rows if row['data'] is not None
+            ]
+            return results, is_expired
         
-        return None
+        logger.debug("No places cache found for key: %.15s...", location_key)
+        return None, False
 
+    @timed("cache_write")
     def cache_places(self, location_key: str, location: str, radius: int, place_type: str, 
                      keyword: Optional[str], results: Dict[str, Any]) -> None:
-        """Cache places search results"""
+        """Cache places search results, storing each place once in the places table"""
         cursor = self.conn.cursor()
-        logger.debug(f"Caching places results for location key: {location_key[:15]}...")
+        logger.debug("Caching places results for location key: %.15s...", location_key)
+        
+        # The previous entry releases its places before they are stored again,
+        # so places it shares with the new results are not deleted
+        cursor.execute(
+            "DELETE FROM nearby_places WHERE location_key = ?", (location_key,)
+        )
+        envelope, places = split_search_results(results)
+        place_ids = json.dumps(
+            [store_place(cursor, place) for place in places], separators=(",", ":")
+        )
         
+        values = (
+            location_key,
+            location,
+            radius,
+            place_type,
+            keyword,
+            envelope,
+            place_ids,
+        )
         cursor.execute(
             """
-            INSERT OR REPLACE INTO nearby_places 
-            (location_key, location, radius, type, keyword, results, timestamp)
-            VALUES (?, ?, ?, ?, ?, ?, datetime('now'))
+            INSERT INTO nearby_places 
+            (location_key, location, radius, type, keyword, results, place_ids,
+             timestamp, size, last_accessed, hit_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'), ?, ?, 0)
             """,
-            (location_key, location, radius, place_type, keyword, json.dumps(results))
+            values + (payload_size(*values), time.time()),
         )
+        # Every write fills a missing or expired entry
+        self.record_miss(place_type or '')
         self.conn.commit()
-        logger.debug(f"Cached {len(results.get('results', []))} places results")
+        logger.debug("Cached %s places results", len(places))
+        self.evict_to_budget()
+
+    @timed("cache_read")
+    def find_places_within(self, location: str, radius: float,
+                           place_type: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Places found by cached searches within `radius` meters of a location"""
+        lat, lng = parse_location(location)
+        min_lat, max_lat, min_lng, max_lng = bounding_box(lat, lng, radius)
+        query = (
+            "SELECT p.lat, p.lng, p.data "
+            "FROM places_rtree AS r JOIN places AS p ON p.id = r.id "
+            "WHERE r.max_lat >= ? AND r.min_lat <= ? "
+            "AND r.max_lng >= ? AND r.min_lng <= ?"
+        )
+        params: List[Any] = [min_lat, max_lat, min_lng, max_lng]
+        if place_type:
+            query += " AND EXISTS (SELECT 1 FROM json_each(p.types) WHERE value = ?)"
+            params.append(place_type)
+        # The R*Tree narrows the search to a box; the circle is checked exactly
+        rows = self.conn.execute(query, params).fetchall()
+        if not rows:
+            return []
+        distances = distances_from(
+            lat, lng, [row['lat'] for row in rows], [row['lng'] for row in rows]
+        )
+        return [
+            decode_payload(row['data'])
+            for row, distance in zip(rows, distances)
+            if distance <= radius
+        ]
+
+    @timed("cache_read")
+    def find_place_points(
+        self,
+        min_lat: float,
+        max_lat: float,
+        min_lng: float,
+        max_lng: float,
+        place_type: str,
+    ) -> List[Tuple[str, float, float]]:
+        """
+        (place_id, lat, lng) of the stored places
+        of a type within a latitude/longitude box
+        """
+        cursor = self.conn.execute(
+            "SELECT p.place_id, p.lat, p.lng "
+            "FROM places_rtree AS r JOIN places AS p ON p.id = r.id "
+            "WHERE r.max_lat >= ? AND r.min_lat <= ? "
+            "AND r.max_lng >= ? AND r.min_lng <= ? "
+            "AND EXISTS (SELECT 1 FROM json_each(p.types) WHERE value = ?)",
+            (min_lat, max_lat, min_lng, max_lng, place_type),
+        )
+        return [(row['place_id'], row['lat'], row['lng']) for row in cursor]
+
+    @timed("cache_read")
+    def get_places(self, place_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Stored places by place_id; unknown ids are left out"""
+        places = {}
+        # Stay below SQLite's limit on bound parameters
+        for start in range(0, len(place_ids), 500):
+            ids = place_ids[start:start + 500]
+            placeholders = ", ".join("?" * len(ids))
+            cursor = self.conn.execute(
+                f"SELECT place_id, data FROM places WHERE place_id IN ({placeholders})",
+                ids,
+            )
+            places.update(
+                (row['place_id'], decode_payload(row['data'])) for row in cursor
+            )
+        return places
+
+    @timed("cache_read")
+    def get_places_ages(self, location_keys: List[str]) -> Dict[str, float]:
+        """Seconds since each cached entry among `location_keys` was written"""
+        ages = {}
+        # Stay below SQLite's limit on bound parameters
+        for start in range(0, len(location_keys), 500):
+            keys = location_keys[start:start + 500]
+            placeholders = ", ".join("?" * len(keys))
+            cursor = self.conn.execute(
+                "SELECT location_key, "
+                "(julianday('now') - julianday(timestamp)) * 86400 AS age "
+                f"FROM nearby_places WHERE location_key IN ({placeholders})",
+                keys,
+            )
+            ages.update((row['location_key'], row['age']) for row in cursor)
+        return ages
+
+    def get_location_views(self) -> Dict[str, int]:
+        """Cache hits per searched location"""
+        self.flush_accesses()
+        cursor = self.conn.execute(
+            "SELECT location, SUM(hit_count) AS views FROM nearby_places "
+            "WHERE hit_count > 0 GROUP BY location"
+        )
+        return {row['location']: row['views'] for row in cursor}
 
     def get_cache_stats(self) -> Dict[str, Any]:
-        """Get statistics about cached data"""
+        """
+        Get statistics about cached data
+        
+        Reads the incrementally maintained cache_statistics table, so the cost
+        does not grow with the number of cached entries.
+        """
         logger.debug("Retrieving cache statistics")
-        cursor = self.conn.cursor()
         
-        # Get places stats
-        cursor.execute("SELECT COUNT(*) FROM nearby_places")
-        places_count = cursor.fetchone()[0]
+        # Get places stats, split by place type
+        by_type = self.get_statistics()
+        places = {
+            field: sum(stats[field] for stats in by_type.values())
+            for field in STATISTICS_FIELDS
+        }
         
-        cursor.execute("SELECT SUM(LENGTH(results)) FROM nearby_places")
-        places_size = cursor.fetchone()[0] or 0
+        # The places searches reference count towards the places cache
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "SELECT entries, bytes FROM cache_statistics WHERE cache = 'places'"
+        )
+        row = cursor.fetchone()
+        stored_places = row['entries'] if row else 0
+        places["bytes"] += row['bytes'] if row else 0
+        
+        # Geocoding results share the database and have a single category
+        cursor.execute(
+            f"SELECT {', '.join(STATISTICS_FIELDS)} FROM cache_statistics "
+            f"WHERE cache = 'geocoding_results'"
+        )
+        row = cursor.fetchone()
+        geocoding = {field: row[field] if row else 0 for field in STATISTICS_FIELDS}
         
         # Calculate total size
-        total_size = places_size
+        total_size = places["bytes"] + geocoding["bytes"]
         
-        logger.info(f"Cache stats: {places_count} places ({places_size} bytes)")
+        logger.info(
+            "Cache stats: %s places searches with %s distinct places (%s bytes), "
+            "%s geocoding results (%s bytes)",
+            places['entries'],
+            stored_places,
+            places['bytes'],
+            geocoding['entries'],
+            geocoding['bytes'],
+        )
         
         return {
             "places": {
-                "count": places_count,
-                "size": places_size
+                "count": places["entries"],
+                "stored_places": stored_places,
+                "size": places["bytes"],
+                "hits": places["hits"],
+                "misses": places["misses"],
+                "evictions": places["evictions"],
+                "by_type": by_type
+            },
+            "geocoding": {
+                "count": geocoding["entries"],
+                "size": geocoding["bytes"],
+                "hits": geocoding["hits"],
+                "misses": geocoding["misses"],
+                "evictions": geocoding["evictions"]
             },
             "total_cache_size": total_size
         }
@@ -262,15 +1244,22 @@ class PlacesDatabase(Database):
         cursor = self.conn.cursor()
         result = {"deleted": {}}
         
-        logger.info(f"Clearing cache {'(' + cache_type + ')' if cache_type else '(all)'}")
+        logger.info(
+            "Clearing cache %s", '(' + cache_type + ')' if cache_type else '(all)'
+        )
         
         try:
             if cache_type is None or cache_type == "places":
-                cursor.execute("SELECT COUNT(*) FROM nearby_places")
-                places_count = cursor.fetchone()[0]
+                places_count = sum(
+                    stats["entries"] for stats in self.get_statistics().values()
+                )
+                # The delete triggers zero the entry and
+                # byte totals in the same transaction
                 cursor.execute("DELETE FROM nearby_places")
+                # Normally already deleted along with the searches referencing them
+                cursor.execute("DELETE FROM places")
                 result["deleted"]["places"] = places_count
-                logger.info(f"Deleted {places_count} entries from places cache")
+                logger.info("Deleted %s entries from places cache", places_count)
             
             self.conn.commit()
             return result
@@ -278,4 +1267,549 @@ class PlacesDatabase(Database):
         except Exception as e:
             logger.error(f"Error clearing cache: {str(e)}")
             self.conn.rollback()
-            raise Exception(f"Error clearing cache: {str(e)}") 
\ No newline at end of file
+            raise Exception(f"Error clearing cache: {str(e)}") 
+
+class BlobIndexDatabase(Database):
+    """
+    Index of image files kept on disk by app.services.blobs.BlobStore
+
+    Rows reference their file by the digest in cache_payload_column, and rows
+    with identical images share a file. Once no row references a file anymore,
+    whoever deleted the row (eviction, maintenance or a clear), its digest is
+    recorded in garbage_table and the file is removed by collect_garbage.
+    """
+    cache_payload_column = "digest"
+    garbage_table: str
+
+    def init_blob_tracking(self) -> None:
+        """
+        Create the garbage table, its release trigger and the access tracking columns
+        """
+        cursor = self.conn.cursor()
+        cursor.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{self.cache_table}_digest "
+            f"ON {self.cache_table} (digest)"
+        )
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.garbage_table} (digest TEXT PRIMARY KEY)"
+        )
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {self.cache_table}_release
+        AFTER DELETE ON {self.cache_table}
+        WHEN NOT EXISTS (SELECT 1 FROM {self.cache_table} WHERE digest = OLD.digest)
+        BEGIN
+            INSERT OR IGNORE INTO {self.garbage_table} (digest) VALUES (OLD.digest);
+        END
+        ''')
+        self.init_cache_tracking()
+
+    def remove_entry(self, key: str) -> None:
+        """Forget an entry, e.g. after its file went missing"""
+        self.conn.execute(
+            f"DELETE FROM {self.cache_table} WHERE {self.cache_key_column} = ?", (key,)
+        )
+        self.conn.commit()
+
+    def collect_garbage(self, remove: Callable[[str], Optional[bool]]) -> int:
+        """
+        Remove the files no longer referenced
+
+        Runs in one write transaction, so no row referencing a digest can be
+        added between checking it and removing its file.
+
+        Args:
+            remove: Removes the file of a digest; returns False if the file is
+                still in use and was kept, to be removed by a later run
+
+        Returns:
+            Number of files removed
+        """
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            candidates = [
+                row['digest']
+                for row in self.conn.execute(
+                    f"SELECT digest FROM {self.garbage_table} AS g "
+                    f"WHERE NOT EXISTS "
+                    f"(SELECT 1 FROM {self.cache_table} AS e WHERE e.digest = g.digest)"
+                )
+            ]
+            digests = [digest for digest in candidates if remove(digest) is not False]
+            # Digests referenced again since they were released are forgotten,
+            # kept files stay for the next run
+            kept = set(candidates) - set(digests)
+            self.conn.execute(f"DELETE FROM {self.garbage_table}")
+            self.conn.executemany(
+                f"INSERT INTO {self.garbage_table} (digest) VALUES (?)",
+                [(digest,) for digest in kept],
+            )
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        if digests:
+            logger.debug(
+                "Removed %s unreferenced files of %s", len(digests), self.cache_table
+            )
+        return len(digests)
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Get entry count, bytes, hits, misses and evictions"""
+        stats = self.get_statistics().get("", {})
+        return {
+            "count": stats.get("entries", 0),
+            "size": stats.get("bytes", 0),
+            "hits": stats.get("hits", 0),
+            "misses": stats.get("misses", 0),
+            "evictions": stats.get("evictions", 0)
+        }
+
+    def clear_cache(self) -> int:
+        """Delete all entries; their files are removed by collect_garbage"""
+        count = self.get_cache_stats()["count"]
+        self.conn.execute(f"DELETE FROM {self.cache_table}")
+        self.conn.commit()
+        logger.info("Deleted %s entries from %s", count, self.cache_table)
+        return count
+
+
+class PhotoDatabase(BlobIndexDatabase):
+    """Index of the place photos kept on disk by app.services.photos"""
+    cache_table = "place_photos"
+    cache_key_column = "photo_key"
+    garbage_table = "photo_garbage"
+
+    def __init__(self):
+        super().__init__()
+        self.conn = self.connect()
+        self.init_database()
+        logger.debug("PhotoDatabase initialized")
+
+    @timed("cache_open")
+    def init_database(self):
+        """Initialize the photo index schema"""
+        cursor = self.conn.cursor()
+        logger.debug("Initializing photo database schema")
+        
+        # One row per photo reference and size
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS place_photos (
+            photo_key TEXT PRIMARY KEY,
+            photo_reference TEXT,
+            max_width INTEGER,
+            max_height INTEGER,
+            digest TEXT NOT NULL,
+            content_type TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_place_photos_timestamp "
+            "ON place_photos (timestamp)"
+        )
+        self.init_blob_tracking()
+        
+        self.conn.commit()
+
+    @property
+    def max_cache_bytes(self) -> int:
+        return settings.PHOTO_CACHE_MAX_BYTES
+
+    @timed("cache_read")
+    def get_photo(self, photo_key: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        Look up a cached photo, including expired entries
+
+        Returns: Tuple of ({'digest', 'content_type', 'size'},
+            expired); the entry is None if not cached
+        """
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "SELECT digest, content_type, size, timestamp FROM place_photos "
+            "WHERE photo_key = ?",
+            (photo_key,),
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None, False
+        is_expired = self.is_cache_expired(row['timestamp'])
+        if not is_expired:
+            self.record_access(photo_key)
+        return {
+            "digest": row['digest'],
+            "content_type": row['content_type'],
+            "size": row['size'],
+        }, is_expired
+
+    @timed("cache_write")
+    def save_photo(
+        self,
+        photo_key: str,
+        photo_reference: str,
+        max_width: Optional[int],
+        max_height: Optional[int],
+        digest: str,
+        content_type: str,
+        size: int,
+    ) -> None:
+        """Index a photo stored on disk, then evict down to the budget"""
+        self.conn.execute(
+            """
+            INSERT OR REPLACE INTO place_photos
+            (photo_key, photo_reference, max_width, max_height, digest, content_type,
+             timestamp, size, last_accessed, hit_count)
+            VALUES (?, ?, ?, ?, ?, ?, datetime('now'), ?, ?, 0)
+            """,
+            (
+                photo_key,
+                photo_reference,
+                max_width,
+                max_height,
+                digest,
+                content_type,
+                size,
+                time.time(),
+            ),
+        )
+        self.record_miss()
+        self.conn.commit()
+        self.evict_to_budget()
+
+
+class MediaDatabase(BlobIndexDatabase):
+    """Index of the resized listing media kept on disk by app.services.media"""
+    cache_table = "listing_media"
+    cache_key_column = "variant_key"
+    garbage_table = "media_garbage"
+
+    def __init__(self):
+        super().__init__()
+        self.conn = self.connect()
+        self.init_database()
+        logger.debug("MediaDatabase initialized")
+
+    @timed("cache_open")
+    def init_database(self):
+        """Initialize the listing media index schema"""
+        cursor = self.conn.cursor()
+        logger.debug("Initializing media database schema")
+        
+        # One row per listing image, width and format; media_url is the source the
+        # variant was made from
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS listing_media (
+            variant_key TEXT PRIMARY KEY,
+            listing_key TEXT NOT NULL,
+            media_index INTEGER NOT NULL,
+            width INTEGER NOT NULL,
+            format TEXT NOT NULL,
+            media_url TEXT,
+            digest TEXT NOT NULL,
+            content_type TEXT,
+            timestamp DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_listing_media_timestamp "
+            "ON listing_media (timestamp)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_listing_media_source "
+            "ON listing_media (listing_key, media_index)"
+        )
+        self.init_blob_tracking()
+        
+        self.conn.commit()
+
+    @property
+    def max_cache_bytes(self) -> int:
+        return settings.MEDIA_CACHE_MAX_BYTES
+
+    @timed("cache_read")
+    def get_variant(self, variant_key: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        Look up a cached media variant, including expired entries
+
+        Returns: Tuple of ({'digest', 'content_type', 'size', 'media_url'}, expired);
+            the entry is None if not cached
+        """
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "SELECT digest, content_type, size, media_url, timestamp "
+            "FROM listing_media WHERE variant_key = ?",
+            (variant_key,),
+        )
+        row = cursor.fetchone()
+        if row is None:
+            return None, False
+        is_expired = self.is_cache_expired(row['timestamp'])
+        if not is_expired:
+            self.record_access(variant_key)
+        return {
+            "digest": row['digest'],
+            "content_type": row['content_type'],
+            "size": row['size'],
+            "media_url": row['media_url'],
+        }, is_expired
+
+    @timed("cache_write")
+    def save_variants(self, listing_key: str, media_index: int, media_url: str,
+                      variants: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Index the variants rendered from one listing
+        image, then evict down to the budget
+
+        Args:
+            variants: {'width', 'format', 'digest',
+                'content_type', 'size'} by variant key
+        """
+        now = time.time()
+        self.conn.executemany(
+            """
+            INSERT OR REPLACE INTO listing_media
+            (variant_key, listing_key, media_index, width, format, media_url, digest,
+             content_type, timestamp, size, last_accessed, hit_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, datetime('now'), ?, ?, 0)
+            """,
+            [
+                (
+                    key,
+                    listing_key,
+                    media_index,
+                    v['width'],
+                    v['format'],
+                    media_url,
+                    v['digest'],
+                    v['content_type'],
+                    v['size'],
+                    now,
+                )
+                for key, v in variants.items()
+            ],
+        )
+        self.record_miss()
+        self.conn.commit()
+        self.evict_to_budget()
+
+    def renew_variants(self, listing_key: str, media_index: int,
+                       media_url: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Mark the variants of a listing image, in every format, fresh again if they
+        were made from `media_url`
+
+        Returns: {'digest', 'content_type', 'size',
+            'media_url'} of the renewed variants by variant key
+        """
+        rows = self.conn.execute(
+            "UPDATE listing_media SET timestamp = datetime('now') "
+            "WHERE listing_key = ? AND media_index = ? AND media_url = ? "
+            "RETURNING variant_key, digest, content_type, size, media_url",
+            (listing_key, media_index, media_url),
+        ).fetchall()
+        self.conn.commit()
+        return {
+            row['variant_key']: {
+                "digest": row['digest'],
+                "content_type": row['content_type'],
+                "size": row['size'],
+                "media_url": row['media_url'],
+            }
+            for row in rows
+        }
+
+
+class AmenityScoreDatabase(Database):
+    """
+    Amenity scores of listings (see app.services.amenities), indexed for sorting
+
+    Scores are derived from the place store. Every write or delete of a cached
+    search is logged in amenity_score_changes by trigger, keyed on the searched
+    location, so the listings around it can be rescored without rescoring all.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.conn = self.connect()
+        self.init_database()
+        logger.debug("AmenityScoreDatabase initialized")
+
+    @timed("cache_open")
+    def init_database(self):
+        """Initialize the amenity score schema"""
+        cursor = self.conn.cursor()
+        logger.debug("Initializing amenity score database schema")
+        
+        score_columns = ", ".join(f"{field} REAL" for field in AMENITY_SCORE_FIELDS)
+        cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS amenity_scores (
+            listing_key TEXT PRIMARY KEY,
+            lat REAL NOT NULL,
+            lng REAL NOT NULL,
+            {score_columns},
+            scored_at REAL,
+            seen_at REAL
+        )
+        ''')
+        for field in AMENITY_SCORE_FIELDS:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_amenity_scores_{field} "
+                f"ON amenity_scores ({field})"
+            )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_amenity_scores_seen_at "
+            "ON amenity_scores (seen_at)"
+        )
+        
+        # Searched locations whose places changed since the last refresh, with the
+        # largest radius searched there
+        cursor.execute(
+            "CREATE TABLE IF NOT EXISTS amenity_score_changes "
+            "(location TEXT PRIMARY KEY, radius INTEGER)"
+        )
+        # With the Redis backend there are no cached searches in SQLite to follow
+        if cursor.execute(
+            "SELECT 1 FROM sqlite_master "
+            "WHERE type = 'table' AND name = 'nearby_places'"
+        ).fetchone():
+            for event, row in (("INSERT", "NEW"), ("DELETE", "OLD")):
+                cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS nearby_places_{event.lower()}_scores
+                AFTER {event} ON nearby_places
+                BEGIN
+                    INSERT INTO amenity_score_changes (location, radius)
+                    VALUES ({row}.location, {row}.radius)
+                    ON CONFLICT(location) DO UPDATE
+                    SET radius = MAX(radius, excluded.radius);
+                END
+                ''')
+        
+        self.conn.commit()
+
+    @timed("cache_read")
+    def get_scores(self, listing_keys: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Stored scores by listing key; listings never scored are left out
+
+        Returns:
+            {'lat', 'lng', and each field of AMENITY_SCORE_FIELDS} by listing key
+        """
+        scores = {}
+        # Stay below SQLite's limit on bound parameters
+        for start in range(0, len(listing_keys), 500):
+            keys = listing_keys[start:start + 500]
+            placeholders = ", ".join("?" * len(keys))
+            cursor = self.conn.execute(
+                f"SELECT listing_key, lat, lng, {', '.join(AMENITY_SCORE_FIELDS)} "
+                f"FROM amenity_scores WHERE listing_key IN ({placeholders})",
+                keys,
+            )
+            scores.update(
+                (row['listing_key'], {field: row[field] for field in row.keys()[1:]})
+                for row in cursor
+            )
+        return scores
+
+    def get_scored_locations(self) -> List[Tuple[str, float, float]]:
+        """(listing_key, lat, lng) of every scored listing"""
+        return [
+            (row['listing_key'], row['lat'], row['lng'])
+            for row in self.conn.execute(
+                "SELECT listing_key, lat, lng FROM amenity_scores"
+            )
+        ]
+
+    @timed("cache_write")
+    def save_scores(
+        self, scores: List[Tuple[str, float, float, Dict[str, float]]]
+    ) -> None:
+        """
+        Store listing scores
+
+        Args:
+            scores: (listing_key, lat, lng, {field: score}) of each listing
+        """
+        now = time.time()
+        fields = ", ".join(AMENITY_SCORE_FIELDS)
+        self.conn.executemany(
+            f"INSERT OR REPLACE INTO amenity_scores "
+            f"(listing_key, lat, lng, {fields}, scored_at, seen_at) "
+            f"VALUES (?, ?, ?, {', '.join('?' * len(AMENITY_SCORE_FIELDS))}, ?, ?)",
+            [
+                (
+                    key,
+                    lat,
+                    lng,
+                    *(values[field] for field in AMENITY_SCORE_FIELDS),
+                    now,
+                    now,
+                )
+                for key, lat, lng, values in scores
+            ],
+        )
+        self.conn.commit()
+
+    def mark_seen(self, listing_keys: List[str]) -> None:
+        """Record that listings are still active, so prune_unseen keeps them"""
+        now = time.time()
+        for start in range(0, len(listing_keys), 500):
+            keys = listing_keys[start:start + 500]
+            placeholders = ", ".join("?" * len(keys))
+            self.conn.execute(
+                f"UPDATE amenity_scores SET seen_at = ? "
+                f"WHERE listing_key IN ({placeholders})",
+                [now, *keys],
+            )
+        self.conn.commit()
+
+    def prune_unseen(self, max_age: float) -> int:
+        """
+        Delete the scores of listings not seen for
+        `max_age` seconds, likely no longer active
+        """
+        cursor = self.conn.execute(
+            "DELETE FROM amenity_scores WHERE seen_at < ?", (time.time() - max_age,)
+        )
+        self.conn.commit()
+        return cursor.rowcount
+
+    def take_changes(self) -> List[Tuple[str, int]]:
+        """
+        Searched locations whose places changed since the last call, clearing the log
+
+        Returns:
+            (location, radius) of each changed search location
+        """
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            changes = [
+                (row['location'], row['radius'])
+                for row in self.conn.execute(
+                    "SELECT location, radius FROM amenity_score_changes"
+                )
+            ]
+            self.conn.execute("DELETE FROM amenity_score_changes")
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        return changes
+
+    @timed("cache_read")
+    def top_listings(
+        self, sort: str, limit: int, offset: int = 0
+    ) -> List[Dict[str, Any]]:
+        """
+        Scored listings, highest `sort` score first
+
+        Args:
+            sort: One of AMENITY_SCORE_FIELDS
+        """
+        if sort not in AMENITY_SCORE_FIELDS:
+            raise ValueError(f"Unknown amenity score '{sort}'")
+        cursor = self.conn.execute(
+            f"SELECT listing_key, lat, lng, {', '.join(AMENITY_SCORE_FIELDS)} "
+            f"FROM amenity_scores WHERE {sort} IS NOT NULL "
+            f"ORDER BY {sort} DESC LIMIT ? OFFSET ?",
+            (limit, offset),
+        )
+        return [dict(row) for row in cursor]
@@ -1,6 +1,6 @@
+from typing import Any, Dict, List, Optional
+
 from pydantic import BaseModel, Field
-from typing import List, Dict, Any, Optional
-from datetime import datetime
 
 
 class Coordinates(BaseModel):
@@ -66,6 +66,8 @@ class Place(BaseModel):
     types: Optional[List[str]] = None
     opening_hours: Optional[Dict[str, Any]] = None
     price_level: Optional[int] = None
+    photos: Optional[List[Dict[str, Any]]] = None
+    distance_meters: Optional[float] = None  # From the searched location
     
     class Config:
         extra = "allow"  # Allow extra fields
@@ -77,9 +79,70 @@ class PlacesResponse(BaseModel):
     next_page_token: Optional[str] = None
 
 
+class AmenityLocation(BaseModel):
+    """A location to find amenities around, usually a listing"""
+    key: Optional[str] = None  # Echoed back, e.g. the ListingKey
+    lat: float = Field(ge=-90, le=90)
+    lng: float = Field(ge=-180, le=180)
+
+
+class AmenitiesRequest(BaseModel):
+    """Locations to find the nearest amenities around"""
+    locations: List[AmenityLocation]
+    max_distance: float = Field(
+        5000, gt=0, le=50000
+    )  # Meters within which a nearest place is reported
+
+
+class NearestPlace(BaseModel):
+    """Nearest cached place of an amenity category"""
+    place_id: str
+    name: Optional[str] = None
+    distance_meters: float
+    location: Optional[Coordinates] = None
+
+
+class LocationAmenities(BaseModel):
+    """Nearest amenities around one location"""
+    key: Optional[str] = None
+    nearest: Dict[
+        str, Optional[NearestPlace]
+    ]  # By category; None if there is none within max_distance
+    counts: Dict[str, int]  # Places of each category within its radius
+
+
+class AmenitiesResponse(BaseModel):
+    """Nearest amenities around each requested location, in request order"""
+    radii: Dict[str, int]  # Radius in meters counted within, by category
+    results: List[LocationAmenities]
+
+
+class ListingScores(BaseModel):
+    """Stored amenity scores of a listing, from 0 to 100"""
+    listing_key: str
+    lat: float
+    lng: float
+    walkability: Optional[
+        float
+    ] = None  # Category scores weighted by AMENITY_SCORE_WEIGHTS
+    school: Optional[float] = None
+    grocery: Optional[float] = None
+    hospital: Optional[float] = None
+    transit: Optional[float] = None
+
+
+class ListingScoresResponse(BaseModel):
+    """Scored listings, highest score first"""
+    sort: str
+    results: List[ListingScores]
+
+
 class CacheStats(BaseModel):
     """Cache statistics response model"""
     places: Dict[str, Any]
+    geocoding: Optional[Dict[str, Any]] = None
+    photos: Optional[Dict[str, Any]] = None
+    media: Optional[Dict[str, Any]] = None
     total_cache_size: int
     total_cache_size_formatted: str
     db_size: Optional[int] = None
@@ -90,4 +153,68 @@ class CacheClearResponse(BaseModel):
     """Response for cache clearing operation"""
     deleted: Dict[str, int]
     success: bool
-    message: str 
\ No newline at end of file
+    message: str 
+
+
+class MaintenanceStatus(BaseModel):
+    """Progress of the in-process cache maintenance job"""
+    enabled: bool
+    interval: int
+    tick_budget: float
+    phase: str
+    ticks: int
+    last_tick_at: Optional[str] = None
+    last_tick_seconds: Optional[float] = None
+    deleted: Dict[str, int]
+    pending_expired: Dict[str, int]
+    pages_freed: int
+    freelist_pages: Optional[int] = None
+    incremental_vacuum: Optional[bool] = None
+    db_size: Optional[int] = None
+    last_error: Optional[str] = None
+
+
+class PrecomputeStatus(BaseModel):
+    """Progress of the background neighborhood precomputation"""
+    enabled: bool
+    running: bool
+    interval: int
+    listings_per_run: int
+    runs: int
+    last_run_at: Optional[str] = None
+    last_run_seconds: Optional[float] = None
+    listings: int
+    searches_fresh: int
+    searches_fetched: int
+    searches_failed: int
+    listings_scored: int = 0
+    last_error: Optional[str] = None
+
+
+class SnapshotImportResponse(BaseModel):
+    """Result of loading a cache snapshot"""
+    entries: Dict[str, int]
+    processing_time: str
+
+
+class CircuitBreakerState(BaseModel):
+    """Circuit breaker state of an upstream provider"""
+    provider: str
+    state: str
+    consecutive_failures: int
+    failures: int
+    short_circuited: int
+    opened_at: Optional[str] = None
+    retry_at: Optional[str] = None
+
+
+class QuotaState(BaseModel):
+    """Client-side quota of an upstream provider"""
+    provider: str
+    rate: float
+    burst: int
+    tokens: float
+    waiting: int
+    daily_calls: int
+    daily_limit: int
+    cache_only: bool
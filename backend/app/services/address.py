@@ -0,0 +1,306 @@
+"""
+Address canonicalization for the geocoding cache
+
+The geocoding cache is keyed on `canonical_address(address)` so that spellings
+of the same street address share one entry: "123 Main Street Apt 4, Austin, TX
+78701-1234, USA" and "123  MAIN ST, Austin, Texas, 78701" both become
+"123 MAIN ST, AUSTIN, TX 78701". The original string is kept for display.
+
+Units are stripped, so every unit of a street address has the same canonical
+address and one geocoding entry serves them all.
+
+Canonicalization is deterministic and local; it does not validate addresses.
+"""
+
+import re
+from typing import List, Optional
+
+# Unit designators and the unit number following them ("Apt 4B", "#12", "Ste. 300")
+UNIT_PATTERN = re.compile(
+    r"\s*(?:#|\b(?:apt|apartment|unit|ste|suite|bldg|building|fl|floor|rm|room|lot|spc|space)\b\.?)"
+    r"\s*#?\s*(?P<unit>[\w-]*\d[\w-]*|[a-z]\b)",
+    re.IGNORECASE
+)
+
+ZIP_PATTERN = re.compile(r"^(\d{5})(?:-?\d{4})?$")
+
+# USPS Publication 28, Appendix C1: street suffixes and their common variants
+STREET_SUFFIXES = {
+    "ALLEY": "ALY",
+    "ALLY": "ALY",
+    "AVENUE": "AVE",
+    "AV": "AVE",
+    "AVEN": "AVE",
+    "AVENU": "AVE",
+    "AVN": "AVE",
+    "AVNUE": "AVE",
+    "BEND": "BND",
+    "BOULEVARD": "BLVD",
+    "BOUL": "BLVD",
+    "BOULV": "BLVD",
+    "BRANCH": "BR",
+    "BRIDGE": "BRG",
+    "CANYON": "CYN",
+    "CENTER": "CTR",
+    "CENTRE": "CTR",
+    "CENTR": "CTR",
+    "CNTR": "CTR",
+    "CIRCLE": "CIR",
+    "CIRC": "CIR",
+    "CIRCL": "CIR",
+    "CRCL": "CIR",
+    "COURT": "CT",
+    "CRT": "CT",
+    "COVE": "CV",
+    "CREEK": "CRK",
+    "CROSSING": "XING",
+    "CRSSNG": "XING",
+    "DRIVE": "DR",
+    "DRIV": "DR",
+    "DRV": "DR",
+    "ESTATES": "ESTS",
+    "EXPRESSWAY": "EXPY",
+    "EXPRESS": "EXPY",
+    "EXPW": "EXPY",
+    "FIELD": "FLD",
+    "FIELDS": "FLDS",
+    "FOREST": "FRST",
+    "FREEWAY": "FWY",
+    "FRWY": "FWY",
+    "GARDEN": "GDN",
+    "GARDENS": "GDNS",
+    "GLEN": "GLN",
+    "GROVE": "GRV",
+    "HARBOR": "HBR",
+    "HEIGHTS": "HTS",
+    "HT": "HTS",
+    "HIGHWAY": "HWY",
+    "HIGHWY": "HWY",
+    "HIWAY": "HWY",
+    "HWAY": "HWY",
+    "HILL": "HL",
+    "HILLS": "HLS",
+    "HOLLOW": "HOLW",
+    "HLLW": "HOLW",
+    "JUNCTION": "JCT",
+    "KNOLL": "KNL",
+    "LAKE": "LK",
+    "LANDING": "LNDG",
+    "LANE": "LN",
+    "MANOR": "MNR",
+    "MEADOW": "MDW",
+    "MEADOWS": "MDWS",
+    "MILL": "ML",
+    "ORCHARD": "ORCH",
+    "PARKWAY": "PKWY",
+    "PARKWY": "PKWY",
+    "PKY": "PKWY",
+    "PLACE": "PL",
+    "PLAZA": "PLZ",
+    "POINT": "PT",
+    "RANCH": "RNCH",
+    "RIDGE": "RDG",
+    "ROAD": "RD",
+    "SHORE": "SHR",
+    "SPRING": "SPG",
+    "SPRINGS": "SPGS",
+    "SQUARE": "SQ",
+    "STATION": "STA",
+    "STREET": "ST",
+    "STR": "ST",
+    "STRT": "ST",
+    "SUMMIT": "SMT",
+    "TERRACE": "TER",
+    "TERR": "TER",
+    "TRACE": "TRCE",
+    "TRAIL": "TRL",
+    "TRAILS": "TRL",
+    "VALLEY": "VLY",
+    "VIEW": "VW",
+    "VILLAGE": "VLG",
+    "VISTA": "VIS",
+    "WOODS": "WDS",
+}
+
+DIRECTIONALS = {
+    "NORTH": "N", "SOUTH": "S", "EAST": "E", "WEST": "W",
+    "NORTHEAST": "NE", "NORTHWEST": "NW", "SOUTHEAST": "SE", "SOUTHWEST": "SW",
+}
+
+STATES = {
+    "ALABAMA": "AL",
+    "ALASKA": "AK",
+    "ARIZONA": "AZ",
+    "ARKANSAS": "AR",
+    "CALIFORNIA": "CA",
+    "COLORADO": "CO",
+    "CONNECTICUT": "CT",
+    "DELAWARE": "DE",
+    "DISTRICT OF COLUMBIA": "DC",
+    "FLORIDA": "FL",
+    "GEORGIA": "GA",
+    "HAWAII": "HI",
+    "IDAHO": "ID",
+    "ILLINOIS": "IL",
+    "INDIANA": "IN",
+    "IOWA": "IA",
+    "KANSAS": "KS",
+    "KENTUCKY": "KY",
+    "LOUISIANA": "LA",
+    "MAINE": "ME",
+    "MARYLAND": "MD",
+    "MASSACHUSETTS": "MA",
+    "MICHIGAN": "MI",
+    "MINNESOTA": "MN",
+    "MISSISSIPPI": "MS",
+    "MISSOURI": "MO",
+    "MONTANA": "MT",
+    "NEBRASKA": "NE",
+    "NEVADA": "NV",
+    "NEW HAMPSHIRE": "NH",
+    "NEW JERSEY": "NJ",
+    "NEW MEXICO": "NM",
+    "NEW YORK": "NY",
+    "NORTH CAROLINA": "NC",
+    "NORTH DAKOTA": "ND",
+    "OHIO": "OH",
+    "OKLAHOMA": "OK",
+    "OREGON": "OR",
+    "PENNSYLVANIA": "PA",
+    "RHODE ISLAND": "RI",
+    "SOUTH CAROLINA": "SC",
+    "SOUTH DAKOTA": "SD",
+    "TENNESSEE": "TN",
+    "TEXAS": "TX",
+    "UTAH": "UT",
+    "VERMONT": "VT",
+    "VIRGINIA": "VA",
+    "WASHINGTON": "WA",
+    "WEST VIRGINIA": "WV",
+    "WISCONSIN": "WI",
+    "WYOMING": "WY",
+}
+STATE_CODES = set(STATES.values())
+
+# Listings are all in the United States, so the country adds nothing to the key
+COUNTRIES = {
+    "US",
+    "USA",
+    "U S",
+    "U S A",
+    "UNITED STATES",
+    "UNITED STATES OF AMERICA",
+    "AMERICA",
+}
+
+
+def _clean(part: str) -> str:
+    """Upper-case, drop periods and apostrophes, collapse whitespace"""
+    part = re.sub(r"[.']", "", part.upper())
+    return " ".join(part.split())
+
+
+def canonical_street(street: str) -> str:
+    """
+    Canonical form of the street line: units stripped, USPS abbreviations
+
+    Directionals are abbreviated before the street name and at the end of the
+    line, the suffix only as the last word (or before a trailing directional),
+    so "North Park Avenue" becomes "N PARK AVE" but "Avenue North" stays "AVENUE N".
+    """
+    tokens = _clean(UNIT_PATTERN.sub("", street)).split()
+    if not tokens:
+        return ""
+
+    # Leading directional, after the house number if there is one, but only
+    # with a name and suffix after it: "7 South St" is on South Street
+    first = 1 if tokens[0][0].isdigit() and len(tokens) > 2 else 0
+    if len(tokens) - first > 2 and tokens[first] in DIRECTIONALS:
+        tokens[first] = DIRECTIONALS[tokens[first]]
+
+    last = len(tokens) - 1
+    if last > first and tokens[last] in DIRECTIONALS:
+        tokens[last] = DIRECTIONALS[tokens[last]]
+        last -= 1
+    if last > first and tokens[last] in STREET_SUFFIXES:
+        tokens[last] = STREET_SUFFIXES[tokens[last]]
+    return " ".join(tokens)
+
+
+def _split_state(words: List[str]) -> Optional[str]:
+    """
+    State code of a state name or code ending a
+    city part ("AUSTIN TX"), removed from `words`
+    """
+    if " ".join(words) in STATES:
+        return None
+    for size in (3, 2, 1):
+        if len(words) > size:
+            name = " ".join(words[-size:])
+            state = STATES.get(name) or (name if name in STATE_CODES else None)
+            if state:
+                del words[-size:]
+                return state
+    return None
+
+
+def canonical_address(address: Optional[str]) -> str:
+    """
+    Canonical form of an address, used as its geocoding cache key
+
+    Expects the comma-separated "street, city, state, postal code, country"
+    form of get_address_from_listing, with any of the parts missing. The state
+    may share a part with the city ("Austin TX") or the postal code ("TX 78701").
+
+    Args:
+        address: Address as provided by a listing or a client
+
+    Returns:
+        "STREET, CITY, ST 12345" with absent parts left out; "" for no address
+    """
+    if not address:
+        return ""
+    parts = [part for part in (_clean(part) for part in address.split(",")) if part]
+    if not parts:
+        return ""
+
+    street = canonical_street(parts[0])
+    localities: List[str] = []
+    state = zip5 = ""
+    for part in parts[1:]:
+        if part in COUNTRIES:
+            continue
+        words = part.split()
+        match = ZIP_PATTERN.match(words[-1])
+        if match:
+            zip5 = match.group(1)
+            words = words[:-1]
+            if not words:
+                continue
+        split = _split_state(words)
+        if split:
+            state = split
+            localities.append(" ".join(words))
+            continue
+        name = " ".join(words)
+        if name in STATES and (localities or match):
+            state = STATES[name]
+        elif name in STATE_CODES and (localities or match):
+            # Taken as the state after the city or before the postal code
+            state = name
+        else:
+            localities.append(name)
+
+    region = " ".join(part for part in (state, zip5) if part)
+    return ", ".join(part for part in [street] + localities + [region] if part)
+
+
+def unit_designation(address: str) -> str:
+    """
+    The unit of an address in canonical form ("APT 4B" and "#4b" are both "4B")
+
+    Returns:
+        The unit number, or "" for an address without a unit
+    """
+    match = UNIT_PATTERN.search(address.split(",")[0])
+    return match.group("unit").upper() if match else ""
@@ -0,0 +1,381 @@
+"""
+Nearest amenities and amenity scores around listings, from cached place data
+
+Places come from the place store filled by nearby searches (listing panels and
+app/services/neighborhoods.py). No provider is called, so results only cover
+areas whose searches are cached. For each category the distances from every
+location to every candidate place are computed as one matrix
+(app.services.geo.haversine_matrix), and the nearest place, the count within
+the category's panel radius and the distance-decayed score are read off its rows.
+
+Scores are stored per listing in the amenity_scores table (AmenityScoreDatabase)
+for indexed sorting. refresh_scores only scores listings that are new or moved,
+and rescores those around searches whose cached places changed since. Requests
+only read: score_listings scores listings missing from the table in memory and
+notes them in `seen_listings`, which the maintenance tick stores
+(refresh_seen_scores).
+"""
+
+import logging
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.db.base import PlacesCache
+from app.db.factory import get_places_cache
+from app.models.database import AmenityScoreDatabase
+from app.services.geo import bounding_box, haversine_matrix, parse_location
+from app.services.places import PANEL_CATEGORIES
+
+logger = logging.getLogger("real-estate-api")
+
+# Amenity categories and the place type their listing panels search for
+AMENITY_TYPES = {
+    "school": "school",
+    "grocery": "supermarket",
+    "hospital": "hospital",
+    "transit": "transit_station",
+}
+
+# Radius in meters within which places of each
+# category are counted (that of its panel search)
+AMENITY_RADII = {
+    category: dict(PANEL_CATEGORIES)[place_type]
+    for category, place_type in AMENITY_TYPES.items()
+}
+
+# Locations per distance matrix, which bounds
+# its size to LOCATION_CHUNK x candidate places
+LOCATION_CHUNK = 256
+
+
+def search_box(lats: Sequence[float], lngs: Sequence[float],
+               distance: float) -> Tuple[float, float, float, float]:
+    """
+    Latitude/longitude box containing every point
+    within `distance` meters of any of the locations
+
+    Returns:
+        (min_lat, max_lat, min_lng, max_lng)
+    """
+    boxes = np.array([bounding_box(lat, lng, distance) for lat, lng in zip(lats, lngs)])
+    return boxes[:, 0].min(), boxes[:, 1].max(), boxes[:, 2].min(), boxes[:, 3].max()
+
+
+def category_distances(
+    places_db: PlacesCache,
+    lats: np.ndarray,
+    lngs: np.ndarray,
+    place_type: str,
+    reach: float,
+) -> Iterator[Tuple[slice, Optional[np.ndarray], List[Tuple[str, float, float]]]]:
+    """
+    Distances from locations to the stored places
+    of a type, LOCATION_CHUNK locations at a time
+
+    Args:
+        reach: Places further than this (meters) from every location may be left out
+
+    Yields:
+        (slice of the locations, their distance matrix to the places or None
+        if there are none, (place_id, lat, lng) of the matrix columns)
+    """
+    points = places_db.find_place_points(*search_box(lats, lngs, reach), place_type)
+    place_lats = np.array([lat for _, lat, _ in points], dtype=np.float64)
+    place_lngs = np.array([lng for _, _, lng in points], dtype=np.float64)
+    for start in range(0, len(lats), LOCATION_CHUNK):
+        chunk = slice(start, start + LOCATION_CHUNK)
+        distances = (
+            haversine_matrix(lats[chunk], lngs[chunk], place_lats, place_lngs)
+            if points
+            else None
+        )
+        yield chunk, distances, points
+
+
+def nearest_amenities(places_db: PlacesCache, locations: List[Tuple[float, float]],
+                      max_distance: float) -> List[Dict[str, Any]]:
+    """
+    Nearest place of each amenity category, and the
+    count within its radius, around each location
+
+    Args:
+        places_db: Places cache to read the place store from
+        locations: (lat, lng) of each location
+        max_distance: Places further away than this (meters) are not reported as nearest
+
+    Returns:
+        For each location in order: {'nearest': {category: {'place_id', 'name',
+        'distance_meters', 'location'} or None}, 'counts': {category: count}}
+    """
+    lats = np.array([lat for lat, _ in locations], dtype=np.float64)
+    lngs = np.array([lng for _, lng in locations], dtype=np.float64)
+    results: List[Dict[str, Any]] = [{"nearest": {}, "counts": {}} for _ in locations]
+    if not locations:
+        return results
+
+    for category, place_type in AMENITY_TYPES.items():
+        radius = AMENITY_RADII[category]
+        for chunk, distances, points in category_distances(
+            places_db, lats, lngs, place_type, max(max_distance, radius)
+        ):
+            if distances is not None:
+                nearest = distances.argmin(axis=1)
+                nearest_distances = distances[np.arange(len(nearest)), nearest]
+                counts = np.count_nonzero(distances <= radius, axis=1)
+            for row, result in enumerate(results[chunk]):
+                if distances is not None and nearest_distances[row] <= max_distance:
+                    result["nearest"][category] = {
+                        "place_id": points[nearest[row]][0],
+                        "distance_meters": round(float(nearest_distances[row]), 1)
+                    }
+                else:
+                    result["nearest"][category] = None
+                result["counts"][category] = (
+                    int(counts[row]) if distances is not None else 0
+                )
+
+    # Only the nearest places are decoded, for their names
+    place_ids = {
+        place["place_id"]
+        for result in results
+        for place in result["nearest"].values()
+        if place
+    }
+    places = places_db.get_places(sorted(place_ids))
+    for result in results:
+        for place in filter(None, result["nearest"].values()):
+            stored = places.get(place["place_id"], {})
+            place["name"] = stored.get("name")
+            place["location"] = (stored.get("geometry") or {}).get("location")
+    return results
+
+
+def amenity_scores(
+    places_db: PlacesCache, locations: List[Tuple[float, float]]
+) -> List[Dict[str, Optional[float]]]:
+    """
+    Distance-decayed amenity scores around each location, from 0 to 100
+
+    Each place within its category's radius contributes exp(-d / AMENITY_DECAY_METERS)
+    at distance d, and a category scores 100 * (1 - exp(-sum of contributions)):
+    one place next door scores 63, three score 95. `walkability` is the mean of
+    the category scores weighted by AMENITY_SCORE_WEIGHTS.
+
+    A location without any stored place within the radius of its category has
+    no place data to score from (its searches are not cached yet), so all its
+    scores are None rather than 0.
+
+    Returns:
+        {'walkability', and a score per category} for each location in order
+    """
+    lats = np.array([lat for lat, _ in locations], dtype=np.float64)
+    lngs = np.array([lng for _, lng in locations], dtype=np.float64)
+    scores = {category: np.zeros(len(locations)) for category in AMENITY_TYPES}
+    covered = np.zeros(len(locations), dtype=bool)
+    if not locations:
+        return []
+
+    for category, place_type in AMENITY_TYPES.items():
+        radius = AMENITY_RADII[category]
+        for chunk, distances, _ in category_distances(
+            places_db, lats, lngs, place_type, radius
+        ):
+            if distances is not None:
+                within = distances <= radius
+                decayed = np.where(
+                    within, np.exp(-distances / settings.AMENITY_DECAY_METERS), 0.0
+                )
+                scores[category][chunk] = 100 * (1 - np.exp(-decayed.sum(axis=1)))
+                covered[chunk] |= within.any(axis=1)
+
+    weights = {
+        category: settings.AMENITY_SCORE_WEIGHTS.get(category, 0.0)
+        for category in AMENITY_TYPES
+    }
+    total_weight = sum(weights.values()) or 1.0
+    walkability = (
+        sum(scores[category] * weight for category, weight in weights.items())
+        / total_weight
+    )
+    return [
+        {
+            "walkability": round(float(walkability[i]), 1),
+            **{
+                category: round(float(scores[category][i]), 1)
+                for category in AMENITY_TYPES
+            },
+        }
+        if covered[i]
+        else dict.fromkeys(("walkability", *AMENITY_TYPES))
+        for i in range(len(locations))
+    ]
+
+
+class SeenListings:
+    """
+    Listings served since their scores were last stored
+
+    Requests note their listings here instead of writing the score table;
+    refresh_seen_scores stores the scores of new or moved listings and marks
+    the others seen from the maintenance tick.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # listing_key -> (lat, lng)
+        self._listings: Dict[str, Tuple[float, float]] = {}
+
+    def note(self, listings: List[Tuple[str, float, float]]) -> None:
+        with self._lock:
+            self._listings.update((key, (lat, lng)) for key, lat, lng in listings)
+
+    def take(self) -> List[Tuple[str, float, float]]:
+        """The noted listings as (listing_key, lat, lng), forgetting them"""
+        with self._lock:
+            listings, self._listings = self._listings, {}
+        return [(key, lat, lng) for key, (lat, lng) in listings.items()]
+
+
+# Listings served by this process
+seen_listings = SeenListings()
+
+
+def changed_listings(
+    score_db: AmenityScoreDatabase, changes: List[Tuple[str, int]]
+) -> List[Tuple[str, float, float]]:
+    """
+    Scored listings close enough to a changed search
+    for its places to count towards their scores
+    """
+    locations = []
+    for location, radius in changes:
+        try:
+            locations.append((*parse_location(location), radius or 0))
+        except ValueError:
+            continue
+    scored = score_db.get_scored_locations()
+    if not locations or not scored:
+        return []
+
+    change_lats, change_lngs, radii = (
+        np.array(values, dtype=np.float64) for values in zip(*locations)
+    )
+    # Places of a search lie within its radius, and count
+    # towards listings within their category's radius
+    reach = radii + max(AMENITY_RADII.values())
+    lats = np.array([lat for _, lat, _ in scored], dtype=np.float64)
+    lngs = np.array([lng for _, _, lng in scored], dtype=np.float64)
+    affected = []
+    for start in range(0, len(scored), LOCATION_CHUNK):
+        chunk = slice(start, start + LOCATION_CHUNK)
+        near = (
+            haversine_matrix(lats[chunk], lngs[chunk], change_lats, change_lngs)
+            <= reach
+        ).any(axis=1)
+        affected.extend(scored[start + i] for i in np.flatnonzero(near))
+    return affected
+
+
+def refresh_scores(places_db: PlacesCache, score_db: AmenityScoreDatabase,
+                   listings: List[Tuple[str, float, float]]) -> Dict[str, int]:
+    """
+    Bring the stored scores of listings up to date
+
+    Scores the listings never scored or whose coordinates changed, and rescores
+    every stored listing near a search whose cached places changed since the
+    last refresh.
+
+    Args:
+        listings: (listing_key, lat, lng) of active listings
+
+    Returns:
+        {'scored': new or moved listings, 'rescored': listings near changed searches}
+    """
+    stored = score_db.get_scores([key for key, _, _ in listings])
+    to_score = {
+        key: (key, lat, lng) for key, lat, lng in listings
+        if key not in stored or (stored[key]['lat'], stored[key]['lng']) != (lat, lng)
+    }
+    scored = len(to_score)
+    for key, lat, lng in changed_listings(score_db, score_db.take_changes()):
+        to_score.setdefault(key, (key, lat, lng))
+
+    if to_score:
+        rows = list(to_score.values())
+        scores = amenity_scores(places_db, [(lat, lng) for _, lat, lng in rows])
+        score_db.save_scores(
+            [(key, lat, lng, values) for (key, lat, lng), values in zip(rows, scores)]
+        )
+    score_db.mark_seen([key for key, _, _ in listings if key not in to_score])
+    return {"scored": scored, "rescored": len(to_score) - scored}
+
+
+def score_listings(
+    places_db: PlacesCache, listings: List[Tuple[str, float, float]]
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Amenity scores of listings, without writing to the database
+
+    Stored scores are used for listings that have not moved; the others are
+    scored from the place store. The listings are noted in `seen_listings`, so
+    the next maintenance tick stores their scores and marks them seen.
+
+    Args:
+        listings: (listing_key, lat, lng) of each listing
+
+    Returns: {'walkability', and a score per category}
+        by listing key; empty if scoring failed
+    """
+    score_db = AmenityScoreDatabase()
+    try:
+        stored = score_db.get_scores([key for key, _, _ in listings])
+        to_score = [
+            (key, lat, lng)
+            for key, lat, lng in listings
+            if key not in stored
+            or (stored[key]['lat'], stored[key]['lng']) != (lat, lng)
+        ]
+        scored = amenity_scores(places_db, [(lat, lng) for _, lat, lng in to_score])
+    except Exception as e:
+        logger.error(f"Error scoring listing amenities: {str(e)}")
+        return {}
+    finally:
+        score_db.close()
+    seen_listings.note(listings)
+    scores = {
+        key: {
+            field: value
+            for field, value in values.items()
+            if field not in ("lat", "lng")
+        }
+        for key, values in stored.items()
+    }
+    scores.update((key, values) for (key, _, _), values in zip(to_score, scored))
+    return scores
+
+
+def refresh_seen_scores() -> Dict[str, int]:
+    """
+    Store the scores of the listings served since the last call, and rescore
+    the stored listings around searches whose cached places changed
+
+    Returns:
+        Counts of refresh_scores
+    """
+    listings = seen_listings.take()
+    # The score table installs triggers on nearby_places, so it is opened before
+    # the places cache (a connection predating them fails its first write there)
+    score_db = AmenityScoreDatabase()
+    places_db = get_places_cache()
+    try:
+        return refresh_scores(places_db, score_db, listings)
+    except Exception:
+        # Noted again so the next tick stores them
+        seen_listings.note(listings)
+        raise
+    finally:
+        places_db.close()
+        score_db.close()
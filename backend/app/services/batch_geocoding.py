@@ -0,0 +1,179 @@
+"""
+Backfilling the geocoding cache through the Geoapify batch API
+
+`run_backfill` splits the addresses that are not cached yet into chunks of
+GEOCODING_BATCH_SIZE and submits each chunk as one batch job. It then polls
+the jobs in turn and saves each job's results in one transaction.
+
+Submitted jobs are recorded in a state file until their results are saved. An
+interrupted backfill run again with the same state file collects the results of
+those jobs instead of submitting them again; addresses already saved are skipped
+because they are cached.
+
+All provider calls run at background priority (see app/services/quota.py).
+"""
+
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+import requests
+
+from app.core.config import settings
+from app.db.base import GeocodingCache
+from app.db.factory import get_geocoding_cache
+from app.services import quota, upstream
+from app.services.address import canonical_address
+from app.services.geocoding import GeocodingClient
+
+logger = logging.getLogger("real-estate-api")
+
+DEFAULT_STATE_PATH = os.path.join(settings.DATA_DIR, "geocode_backfill.json")
+
+
+def load_state(path: str) -> Dict[str, Any]:
+    """Jobs left unfinished by an earlier run"""
+    if not os.path.exists(path):
+        return {"jobs": []}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_state(path: str, state: Dict[str, Any]) -> None:
+    """Write the state file atomically, so an interruption never leaves it truncated"""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+
+
+def uncached_addresses(addresses: Iterable[str], geocoding_db: GeocodingCache,
+                       exclude: Iterable[str] = ()) -> List[str]:
+    """
+    Addresses missing from the cache, one per canonical address, in input order
+
+    Args:
+        addresses: Candidate addresses
+        geocoding_db: Geocoding cache
+        exclude: Addresses already submitted in a job
+
+    Returns:
+        The addresses left to geocode
+    """
+    seen = {canonical_address(address) for address in exclude}
+    pending = []
+    for address in addresses:
+        address = address.strip()
+        key = canonical_address(address)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        if not geocoding_db.address_exists_in_db(address):
+            pending.append(address)
+    return pending
+
+
+def wait_for_job(
+    client: GeocodingClient, job: Dict[str, Any]
+) -> Optional[List[Dict[str, Any]]]:
+    """
+    Poll a batch job until its results are ready
+
+    Returns:
+        The job's geocoding results, or None if GEOCODING_BATCH_TIMEOUT passed first
+    """
+    deadline = job["submitted_at"] + settings.GEOCODING_BATCH_TIMEOUT
+    while True:
+        results = client.get_batch_results(job["id"], job["addresses"])
+        if results is not None:
+            return results
+        if time.time() + settings.GEOCODING_BATCH_POLL_INTERVAL > deadline:
+            return None
+        time.sleep(settings.GEOCODING_BATCH_POLL_INTERVAL)
+
+
+def run_backfill(addresses: Iterable[str], state_path: str = DEFAULT_STATE_PATH,
+                 chunk_size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Geocode every uncached address through batch jobs and save the results
+
+    Args:
+        addresses: Addresses to backfill
+        state_path: File recording submitted jobs, for resuming
+        chunk_size: Addresses per job (default GEOCODING_BATCH_SIZE)
+
+    Returns:
+        Dict with address, job and result counts, and an 'error' if the backfill
+        stopped early (run it again with the same state file to resume)
+    """
+    start_time = time.time()
+    chunk_size = chunk_size or settings.GEOCODING_BATCH_SIZE
+    client = GeocodingClient()
+    geocoding_db = get_geocoding_cache()
+    state = load_state(state_path)
+    result: Dict[str, Any] = {"resumed_jobs": len(state["jobs"]), "submitted_jobs": 0,
+                              "geocoded": 0, "failed": 0}
+    try:
+        with quota.background_priority():
+            addresses = list(addresses)
+            submitted = [
+                address for job in state["jobs"] for address in job["addresses"]
+            ]
+            pending = uncached_addresses(addresses, geocoding_db, exclude=submitted)
+            result["addresses"] = len(addresses)
+            result["to_geocode"] = len(pending) + len(submitted)
+            logger.info(
+                "Backfilling %s addresses (%s in resumed jobs)",
+                result["to_geocode"],
+                len(submitted),
+            )
+
+            # Submit everything first so the provider works on all chunks while we poll
+            for offset in range(0, len(pending), chunk_size):
+                chunk = pending[offset:offset + chunk_size]
+                job_id = client.submit_batch(chunk)
+                state["jobs"].append(
+                    {"id": job_id, "addresses": chunk, "submitted_at": time.time()}
+                )
+                save_state(state_path, state)
+                result["submitted_jobs"] += 1
+
+            while state["jobs"]:
+                job = state["jobs"][0]
+                try:
+                    results = wait_for_job(client, job)
+                except requests.exceptions.HTTPError as e:
+                    if e.response is None or e.response.status_code != 404:
+                        raise
+                    # The provider no longer knows the job; its
+                    # addresses are submitted again next run
+                    logger.warning("Batch job %s expired, dropping it", job["id"])
+                    state["jobs"].pop(0)
+                    save_state(state_path, state)
+                    continue
+                if results is None:
+                    result["error"] = (f"Batch job {job['id']} did not finish within "
+                                       f"{settings.GEOCODING_BATCH_TIMEOUT}s")
+                    break
+                successful = [r for r in results if r['success']]
+                geocoding_db.save_geocoding_results(successful)
+                result["geocoded"] += len(successful)
+                result["failed"] += len(results) - len(successful)
+                state["jobs"].pop(0)
+                save_state(state_path, state)
+                logger.info("Saved results of batch job %s (%s of %s geocoded)",
+                            job["id"], len(successful), len(results))
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Batch geocoding stopped: {upstream.redact(str(e))}")
+        result["error"] = upstream.redact(str(e))
+    finally:
+        geocoding_db.close()
+
+    if not state["jobs"] and os.path.exists(state_path):
+        os.remove(state_path)
+    result["pending_jobs"] = len(state["jobs"])
+    result["processing_time"] = f"{time.time() - start_time:.2f}s"
+    return result
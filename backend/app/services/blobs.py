@@ -0,0 +1,145 @@
+"""
+Content-addressed file storage for cached images
+
+Files are named by the SHA-256 of their content, so identical images are kept
+once, and a digest doubles as a strong ETag. The SQLite indexes pointing at the
+files (see BlobIndexDatabase in app/models/database.py) decide when a file is
+no longer needed.
+
+A file being sent is pinned: collect_garbage leaves it on disk until the
+response is done, and removes it on a later run.
+"""
+
+import hashlib
+import os
+import tempfile
+import threading
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+from fastapi.responses import FileResponse
+from starlette.types import Receive, Scope, Send
+
+
+class BlobStore:
+    """Files named by the SHA-256 of their content, fanned out over 256 directories"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        # Digest -> responses sending its file
+        self._pins: Dict[str, int] = {}
+        self._pins_lock = threading.Lock()
+
+    def path(self, digest: str) -> str:
+        """Location of the file holding the content with this digest"""
+        return os.path.join(self.directory, digest[:2], digest)
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def write(self, content: bytes) -> str:
+        """
+        Store content unless a file with the same content exists
+
+        Returns:
+            The content's digest
+        """
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Readers never see a partly written file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    f.write(content)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        return digest
+
+    def remove(self, digest: str) -> bool:
+        """
+        Remove the file of a digest unless it is being sent
+
+        Returns:
+            False if the file is pinned and was kept
+        """
+        with self._pins_lock:
+            if digest in self._pins:
+                return False
+            try:
+                os.unlink(self.path(digest))
+            except FileNotFoundError:
+                pass
+        return True
+
+    def pin(self, digest: str) -> bool:
+        """
+        Keep the file of a digest until unpin is called
+
+        Returns:
+            Whether the file exists; if not, the digest is not pinned
+        """
+        with self._pins_lock:
+            if not os.path.exists(self.path(digest)):
+                return False
+            self._pins[digest] = self._pins.get(digest, 0) + 1
+        return True
+
+    def unpin(self, digest: str) -> None:
+        with self._pins_lock:
+            count = self._pins.pop(digest, 0) - 1
+            if count > 0:
+                self._pins[digest] = count
+
+
+class PinnedFileResponse(FileResponse):
+    """FileResponse of a pinned blob, unpinned once sent (or the client went away)"""
+
+    def __init__(self, store: BlobStore, digest: str, **kwargs):
+        super().__init__(store.path(digest), **kwargs)
+        self.store = store
+        self.digest = digest
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.store.unpin(self.digest)
+
+
+def blob_response(
+    request: Request,
+    store: BlobStore,
+    digest: str,
+    content_type: str,
+    max_age: int,
+    headers: Optional[Dict[str, str]] = None,
+) -> Optional[Response]:
+    """
+    Stream a stored file with its digest as ETag
+
+    Answers a matching If-None-Match with 304; FileResponse handles Range requests.
+    The file is pinned until it is sent.
+
+    Returns:
+        The response, or None if the file was removed since it was looked up
+        (look it up again, which stores it anew)
+    """
+    etag = f'"{digest}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={max_age}",
+        **(headers or {}),
+    }
+    if_none_match = request.headers.get("if-none-match", "")
+    if (
+        etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))
+        or if_none_match.strip() == "*"
+    ):
+        return Response(status_code=304, headers=headers)
+    if not store.pin(digest):
+        return None
+    return PinnedFileResponse(store, digest, media_type=content_type, headers=headers)
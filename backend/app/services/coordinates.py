@@ -0,0 +1,141 @@
+"""
+Coordinate resolution for listings, cheapest source first
+
+1. "listing": Latitude/Longitude provided by RESO
+2. "cache": the geocoding cache entry for the listing's address
+3. "same_street": the cache entry was geocoded for another unit of the same
+   street address (entries are keyed on the canonical address, without units)
+4. "geocoder": a Geoapify geocode, saved to the cache
+
+The first three are local lookups (`resolve_locally`). Remote geocodes run on
+a shared pool (`geocode_in_background`) so they can finish, and fill the
+cache, after the request that started them has responded.
+"""
+
+import contextvars
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import COORDINATE_SOURCES, record_cache_lookup
+from app.db.base import GeocodingCache
+from app.db.factory import get_geocoding_cache
+from app.services.address import canonical_address, unit_designation
+from app.services.geocoding import GeocodingClient
+
+logger = logging.getLogger("real-estate-api")
+
+SOURCE_LISTING = "listing"
+SOURCE_CACHE = "cache"
+SOURCE_SAME_STREET = "same_street"
+SOURCE_GEOCODER = "geocoder"
+
+_geocoding_executor = ThreadPoolExecutor(max_workers=settings.GEOCODING_CONCURRENCY,
+                                         thread_name_prefix="geocoding")
+_geocodes_in_flight: Dict[str, Future] = {}
+_in_flight_lock = threading.RLock()
+
+
+def listing_coordinates(listing: Dict[str, Any]) -> Optional[Dict[str, float]]:
+    """Coordinates provided with a RESO listing, if present and plausible"""
+    try:
+        lat = float(listing.get("Latitude"))
+        lng = float(listing.get("Longitude"))
+    except (TypeError, ValueError):
+        return None
+    # Missing coordinates are sometimes sent as 0,0
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180) or (lat == 0 and lng == 0):
+        return None
+    return {"lat": lat, "lng": lng}
+
+
+def resolve_locally(
+    listing: Dict[str, Any], address: Optional[str], geocoding_db: GeocodingCache
+) -> Tuple[Optional[Dict[str, float]], Optional[str]]:
+    """
+    Resolve a listing's coordinates without calling the geocoder
+
+    Args:
+        listing: RESO listing
+        address: Address of the listing (see get_address_from_listing)
+        geocoding_db: Geocoding cache
+
+    Returns: Tuple of (coordinates as {"lat", "lng"},
+        source); both None if a remote geocode is needed
+    """
+    coordinates = listing_coordinates(listing)
+    if coordinates:
+        return record_source(coordinates, SOURCE_LISTING)
+    if not address:
+        return None, None
+
+    cached = geocoding_db.get_coordinates(address)
+    record_cache_lookup("geocoding", "address", "hit" if cached else "miss")
+    if not cached:
+        return None, None
+    coordinates = {"lat": cached['lat'], "lng": cached['lon']}
+    if unit_designation(cached['address']) != unit_designation(address):
+        logger.debug("Using coordinates of another unit for %s", address)
+        return record_source(coordinates, SOURCE_SAME_STREET)
+    logger.debug("Found cached coordinates for %s", address)
+    return record_source(coordinates, SOURCE_CACHE)
+
+
+def record_source(
+    coordinates: Optional[Dict[str, float]], source: str
+) -> Tuple[Optional[Dict[str, float]], str]:
+    COORDINATE_SOURCES.inc(source=source)
+    return coordinates, source
+
+
+def geocode_and_cache(
+    address: str, geocoding_client: GeocodingClient
+) -> Optional[Dict[str, float]]:
+    """
+    Geocode an address and save a successful result to the geocoding cache
+
+    Returns:
+        Coordinates as {"lat", "lng"}, or None if geocoding failed
+    """
+    result = geocoding_client.geocode_address(address)
+    if not result['success']:
+        logger.warning("Failed to geocode address: %s", address)
+        return None
+
+    # Runs on a worker thread, possibly after the
+    # request finished, so it uses its own connection
+    db = get_geocoding_cache()
+    try:
+        db.save_geocoding_result(result)
+    finally:
+        db.close()
+    logger.debug("Successfully geocoded %s", address)
+    COORDINATE_SOURCES.inc(source=SOURCE_GEOCODER)
+    return {"lat": result['coordinates']['lat'], "lng": result['coordinates']['lon']}
+
+
+def geocode_in_background(address: str, geocoding_client: GeocodingClient) -> Future:
+    """
+    Start geocoding an address, or join the geocode
+    already in flight for any spelling of it
+    """
+    key = canonical_address(address)
+    with _in_flight_lock:
+        future = _geocodes_in_flight.get(key)
+        if future is None:
+            future = _geocoding_executor.submit(
+                contextvars.copy_context().run,
+                geocode_and_cache,
+                address,
+                geocoding_client,
+            )
+            _geocodes_in_flight[key] = future
+            future.add_done_callback(lambda _: _forget_geocode(key))
+    return future
+
+
+def _forget_geocode(key: str) -> None:
+    with _in_flight_lock:
+        _geocodes_in_flight.pop(key, None)
@@ -1,8 +1,12 @@
-import requests
-import urllib.parse
 import logging
-from typing import Dict, Any
+import urllib.parse
+from typing import Any, Dict, List, Optional
+
+import requests
+
 from app.core.config import settings
+from app.core.timing import timed
+from app.services import upstream
 
 logger = logging.getLogger("real-estate-api")
 
@@ -11,10 +15,12 @@ class GeocodingClient:
         """Initialize the geocoding client"""
         self.api_key = settings.GEOAPIFY_API_KEY
         self.base_url = settings.GEOAPIFY_BASE_URL
+        self.batch_url = settings.GEOAPIFY_BATCH_URL
         self.headers = {
             "Accept": "application/json"
         }
     
+    @timed("geocoder")
     def geocode_address(self, address: str) -> Dict[str, Any]:
         """
         Geocode an address to get latitude, longitude and other location data
@@ -31,47 +37,23 @@ class GeocodingClient:
         # Construct the API URL
         url = f"{self.base_url}?text={encoded_address}&apiKey={self.api_key}"
         
-        logger.debug(f"Geocoding address: {address}")
+        logger.debug("Geocoding address: %s", address)
         
         try:
             # Make the request
-            response = requests.get(url, headers=self.headers)
-            response.raise_for_status()
+            response = upstream.request("geoapify", "GET", url, headers=self.headers)
             
             # Parse the response
             data = response.json()
             
             if data.get('features') and len(data['features']) > 0:
-                feature = data['features'][0]
-                props = feature['properties']
-                
-                # Extract the most useful information
-                result = {
-                    'success': True,
-                    'address': address,
-                    'coordinates': {
-                        'lat': props.get('lat'),
-                        'lon': props.get('lon')
-                    },
-                    'formatted_address': props.get('formatted'),
-                    'address_components': {
-                        'house_number': props.get('housenumber'),
-                        'street': props.get('street'),
-                        'city': props.get('city'),
-                        'county': props.get('county'),
-                        'state': props.get('state'),
-                        'country': props.get('country'),
-                        'postcode': props.get('postcode'),
-                        'suburb': props.get('suburb')
-                    },
-                    'place_id': props.get('place_id'),
-                    'raw_response': data
-                }
-                
-                logger.debug(f"Successfully geocoded {address}")
+                result = geocoding_result(
+                    address, data['features'][0]['properties'], data
+                )
+                logger.debug("Successfully geocoded %s", address)
                 return result
             else:
-                logger.warning(f"No geocoding results found for {address}")
+                logger.warning("No geocoding results found for %s", address)
                 return {
                     'success': False,
                     'address': address,
@@ -80,10 +62,108 @@ class GeocodingClient:
                 }
                 
         except requests.exceptions.RequestException as e:
-            logger.error(f"Error geocoding address {address}: {str(e)}")
+            logger.error(
+                f"Error geocoding address {address}: {upstream.redact(str(e))}"
+            )
             return {
                 'success': False,
                 'address': address,
-                'error': str(e),
+                'error': upstream.redact(str(e)),
                 'status_code': getattr(e.response, 'status_code', None)
-            } 
\ No newline at end of file
+            } 
+
+    def submit_batch(self, addresses: List[str]) -> str:
+        """
+        Submit addresses to the asynchronous batch geocoding API
+        
+        Args:
+            addresses: Addresses to geocode (at most 1000)
+            
+        Returns:
+            str: Id of the batch job
+            
+        Raises:
+            requests.exceptions.RequestException: The job could not be submitted
+        """
+        url = f"{self.batch_url}?apiKey={self.api_key}"
+        logger.info("Submitting batch geocoding job for %s addresses", len(addresses))
+        response = upstream.request(
+            "geoapify", "POST", url, json=addresses, headers=self.headers
+        )
+        return response.json()['id']
+
+    def get_batch_results(
+        self, job_id: str, addresses: List[str]
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Fetch the results of a batch geocoding job
+        
+        Args:
+            job_id: Id returned by submit_batch
+            addresses: Addresses submitted with the job
+            
+        Returns:
+            One geocoding result per address, in the format of geocode_address,
+            or None while the job is still running
+            
+        Raises:
+            requests.exceptions.RequestException: The job status could not be fetched
+        """
+        url = f"{self.batch_url}?id={urllib.parse.quote(job_id)}&apiKey={self.api_key}"
+        response = upstream.request("geoapify", "GET", url, headers=self.headers)
+        if response.status_code == 202:
+            return None
+
+        found = {}
+        for item in response.json():
+            text = (item.get('query') or {}).get('text')
+            if (
+                text is not None
+                and item.get('lat') is not None
+                and item.get('lon') is not None
+            ):
+                found.setdefault(text, item)
+        results = []
+        for address in addresses:
+            item = found.get(address)
+            if item is None:
+                results.append(
+                    {'success': False, 'address': address, 'error': 'No results found'}
+                )
+            else:
+                results.append(geocoding_result(address, item, item))
+        logger.info(
+            "Batch geocoding job %s geocoded %s of %s addresses",
+            job_id,
+            len(found),
+            len(addresses),
+        )
+        return results
+
+
+def geocoding_result(
+    address: str, props: Dict[str, Any], raw_response: Any
+) -> Dict[str, Any]:
+    """Successful geocoding result from the properties of a Geoapify match"""
+    # Extract the most useful information
+    return {
+        'success': True,
+        'address': address,
+        'coordinates': {
+            'lat': props.get('lat'),
+            'lon': props.get('lon')
+        },
+        'formatted_address': props.get('formatted'),
+        'address_components': {
+            'house_number': props.get('housenumber'),
+            'street': props.get('street'),
+            'city': props.get('city'),
+            'county': props.get('county'),
+            'state': props.get('state'),
+            'country': props.get('country'),
+            'postcode': props.get('postcode'),
+            'suburb': props.get('suburb')
+        },
+        'place_id': props.get('place_id'),
+        'raw_response': raw_response
+    }
@@ -0,0 +1,303 @@
+"""
+Listing media thumbnails backed by a content-addressed blob store on disk
+
+RESO Media URLs point at full-resolution MLS images. The first request for an
+image downloads it once and renders it at every width of MEDIA_WIDTHS in every
+format (WebP, and JPEG for clients that don't accept WebP) on a pool of
+MEDIA_WORKERS threads (Pillow releases the GIL while decoding, resizing and
+encoding), so a later request in the other format is served from disk. The
+variants are kept as files named by the SHA-256 of their content under
+MEDIA_CACHE_DIR; the MediaDatabase index maps each listing image, width and
+format to its file and enforces MEDIA_CACHE_MAX_BYTES, least recently used first.
+
+Variants expire like other cache entries. An expired image is only downloaded
+again if the listing's Media URL at that index has changed; otherwise its
+variants are renewed as they are.
+"""
+
+import asyncio
+import contextvars
+import io
+import logging
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+from PIL import Image, ImageOps
+
+from app.core.config import settings
+from app.core.metrics import record_cache_lookup
+from app.models.database import MediaDatabase
+from app.services import upstream
+from app.services.blobs import BlobStore
+from app.services.reso import RESOClient
+
+logger = logging.getLogger("real-estate-api")
+
+LISTING_KEY_PATTERN = re.compile(r"^[\w-]+$")
+
+# Output formats by name: Pillow format and content type
+FORMATS = {
+    "webp": ("WEBP", "image/webp"),
+    "jpeg": ("JPEG", "image/jpeg"),
+}
+
+# Seconds a listing's Media URLs are reused, so
+# the images of one gallery share a RESO call
+LISTING_MEDIA_TTL = 60
+
+_media_executor = ThreadPoolExecutor(
+    max_workers=settings.MEDIA_WORKERS, thread_name_prefix="media"
+)
+_media_in_flight: Dict[str, Future] = {}
+_listing_media: Dict[str, Tuple[float, Future]] = {}
+_in_flight_lock = threading.Lock()
+
+blob_store = BlobStore(settings.MEDIA_CACHE_DIR)
+
+
+def variant_width(width: int) -> int:
+    """Smallest width of MEDIA_WIDTHS covering `width`, or the largest one"""
+    widths = sorted(settings.MEDIA_WIDTHS)
+    return next((w for w in widths if w >= width), widths[-1])
+
+
+def variant_key(listing_key: str, media_index: int, width: int, fmt: str) -> str:
+    """Cache key of a listing image at one of MEDIA_WIDTHS"""
+    return f"{listing_key}/{media_index}/{width}.{fmt}"
+
+
+def listing_media_urls(listing_key: str) -> Optional[List[Optional[str]]]:
+    """
+    Media URLs of a listing, in the order of its Media array
+
+    Callers within LISTING_MEDIA_TTL seconds of each other share one RESO call.
+
+    Returns:
+        The URLs, or None if the listing could not be fetched
+    """
+    now = time.monotonic()
+    with _in_flight_lock:
+        for key in [
+            key
+            for key, (fetched, _) in _listing_media.items()
+            if now - fetched > LISTING_MEDIA_TTL
+        ]:
+            del _listing_media[key]
+        _, future = _listing_media.get(listing_key, (now, None))
+        owner = future is None
+        if owner:
+            future = Future()
+            _listing_media[listing_key] = (now, future)
+    if not owner:
+        return future.result()
+
+    try:
+        listing = RESOClient(dataset_id="actris_ref").get_listing(listing_key)
+        urls = (
+            [media.get("MediaURL") for media in listing.get("Media") or []]
+            if listing
+            else None
+        )
+    except BaseException as e:
+        _forget_listing_media(listing_key, future)
+        future.set_exception(e)
+        raise
+    if urls is None:
+        # Not found or not reachable: ask again next time
+        _forget_listing_media(listing_key, future)
+    future.set_result(urls)
+    return urls
+
+
+def _forget_listing_media(listing_key: str, future: Future) -> None:
+    with _in_flight_lock:
+        if _listing_media.get(listing_key, (None, None))[1] is future:
+            del _listing_media[listing_key]
+
+
+def render_variants(source: bytes) -> List[Tuple[int, str, bytes]]:
+    """
+    Resize an image to every width of MEDIA_WIDTHS, encoded in every format
+
+    The source is decoded once. Images are never enlarged: widths beyond the
+    source's are encoded at its size.
+
+    Returns:
+        (width, format, encoded image) for each width and format of FORMATS
+
+    Raises:
+        OSError: The source is not an image Pillow can decode
+    """
+    widths = sorted(set(settings.MEDIA_WIDTHS), reverse=True)
+    with Image.open(io.BytesIO(source)) as image:
+        # JPEG sources are decoded at the smallest
+        # scale still covering the largest width
+        image.draft("RGB", (widths[0], widths[0]))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+
+    rendered = []
+    # Each width is resized from the previous one,
+    # which is cheaper than starting from the source
+    for width in widths:
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.Resampling.LANCZOS)
+        for fmt, (pil_format, _) in FORMATS.items():
+            buffer = io.BytesIO()
+            image.save(buffer, format=pil_format, quality=settings.MEDIA_QUALITY)
+            rendered.append((width, fmt, buffer.getvalue()))
+    return rendered
+
+
+def fetch_and_render(listing_key: str, media_index: int,
+                     cached_url: Optional[str]) -> Dict[str, Any]:
+    """
+    Download a listing image once, then render and index its variants
+
+    Args:
+        cached_url: Source URL of the expired variants, which are renewed
+            instead if the listing still has that image at `media_index`
+
+    Returns: {'variants': {variant_key: {'digest', 'content_type', 'size',
+        'media_url'}}}, or an 'error'
+    """
+    urls = listing_media_urls(listing_key)
+    if urls is None:
+        return {"error": "Listing not found", "status_code": 404}
+    if media_index >= len(urls) or not urls[media_index]:
+        return {"error": "Listing has no such image", "status_code": 404}
+    media_url = urls[media_index]
+
+    # Runs on a worker thread, possibly after the
+    # request gave up, so it uses its own connection
+    media_db = MediaDatabase()
+    try:
+        if media_url == cached_url:
+            renewed = media_db.renew_variants(listing_key, media_index, media_url)
+            if len(renewed) == len(set(settings.MEDIA_WIDTHS)) * len(FORMATS):
+                return {"variants": renewed}
+
+        logger.info("Rendering image %s of listing %s", media_index, listing_key)
+        try:
+            response = upstream.request("reso_media", "GET", media_url)
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error downloading listing image: {upstream.redact(str(e))}")
+            status_code = e.response.status_code if e.response is not None else None
+            return {"error": upstream.redact(str(e)), "status_code": status_code}
+        try:
+            rendered = render_variants(response.content)
+        except (OSError, Image.DecompressionBombError) as e:
+            logger.warning(
+                "Cannot render image %s of listing %s: %s", media_index, listing_key, e
+            )
+            return {"error": f"Unsupported image: {e}", "status_code": 415}
+
+        variants = {}
+        for width, fmt, content in rendered:
+            variants[variant_key(listing_key, media_index, width, fmt)] = {
+                "width": width,
+                "format": fmt,
+                "digest": blob_store.write(content),
+                "content_type": FORMATS[fmt][1],
+                "size": len(content),
+                "media_url": media_url,
+            }
+        media_db.save_variants(listing_key, media_index, media_url, variants)
+        media_db.collect_garbage(blob_store.remove)
+    finally:
+        media_db.close()
+    return {"variants": variants}
+
+
+def render_in_background(listing_key: str, media_index: int,
+                         cached_url: Optional[str]) -> Future:
+    """
+    Start rendering a listing image, or join the rendering already in flight for it
+    """
+    key = f"{listing_key}/{media_index}"
+    with _in_flight_lock:
+        future = _media_in_flight.get(key)
+        if future is None:
+            future = _media_executor.submit(
+                contextvars.copy_context().run,
+                fetch_and_render,
+                listing_key,
+                media_index,
+                cached_url,
+            )
+            _media_in_flight[key] = future
+            future.add_done_callback(lambda _: _forget_media(key))
+    return future
+
+
+def _forget_media(key: str) -> None:
+    with _in_flight_lock:
+        _media_in_flight.pop(key, None)
+
+
+def lookup_variant(key: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """
+    Cached variant and whether it is expired, forgetting entries whose file is gone
+
+    Opens the index and may write to it, so async callers run it on a worker thread.
+    """
+    media_db = MediaDatabase()
+    try:
+        entry, expired = media_db.get_variant(key)
+        if entry is not None and not blob_store.exists(entry['digest']):
+            logger.warning(
+                "Media file %s is missing, rendering it again", entry['digest']
+            )
+            media_db.remove_entry(key)
+            return None, False
+        return entry, expired
+    finally:
+        media_db.close()
+
+
+async def get_media(
+    listing_key: str, media_index: int, width: int, fmt: str
+) -> Dict[str, Any]:
+    """
+    Get a listing image at the variant width covering `width`, rendering it on a miss
+
+    If rendering fails, an expired variant is served instead.
+
+    Returns:
+        {'digest', 'content_type', 'size', 'media_url'} of the stored variant
+        (see blob_store.path), or an 'error'
+    """
+    key = variant_key(listing_key, media_index, variant_width(width), fmt)
+    entry, expired = await asyncio.to_thread(lookup_variant, key)
+    if entry is not None and not expired:
+        record_cache_lookup("media", "", "hit")
+        return entry
+    record_cache_lookup("media", "", "stale" if entry else "miss")
+
+    cached_url = entry['media_url'] if entry else None
+    result = await asyncio.wrap_future(
+        render_in_background(listing_key, media_index, cached_url)
+    )
+    if "error" in result:
+        if entry is not None:
+            logger.warning(
+                "Rendering failed, serving expired image %s", entry['digest']
+            )
+            return entry
+        return result
+    return result["variants"][key]
+
+
+def clear_media() -> int:
+    """Delete all cached listing media and their files"""
+    media_db = MediaDatabase()
+    try:
+        count = media_db.clear_cache()
+        media_db.collect_garbage(blob_store.remove)
+    finally:
+        media_db.close()
+    return count
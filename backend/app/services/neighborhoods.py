@@ -0,0 +1,289 @@
+"""
+Background precomputation of the nearby places shown in listing panels
+
+Opening a listing panel searches every category of PANEL_CATEGORIES around the
+listing. NeighborhoodPrecompute runs those searches for the active listings
+ahead of their first viewer, so panel opens are served from the places cache:
+
+- The most viewed listings go first (cache hits at their location), then the
+  newest on the market.
+- Searches whose cache entry will still be fresh at the next run are skipped.
+- Provider calls run at background priority. A run stops when the provider is
+  unavailable or its quota is used up, and the next run picks up where it left off.
+- The amenity scores of the listings are then brought up to date from the
+  places just cached (see app/services/amenities.py).
+
+PrecomputeScheduler runs it every PRECOMPUTE_INTERVAL seconds on the
+application's event loop.
+"""
+
+import asyncio
+import datetime
+import logging
+import time
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core.config import settings
+from app.db.base import GeocodingCache
+from app.db.factory import get_geocoding_cache, get_places_cache
+from app.models.database import AmenityScoreDatabase
+from app.services import quota
+from app.services.amenities import refresh_scores
+from app.services.coordinates import geocode_and_cache, listing_coordinates
+from app.services.geo import parse_location
+from app.services.geocoding import GeocodingClient
+from app.services.places import PANEL_CATEGORIES, PlacesClient
+from app.services.reso import RESOClient, get_address_from_listing
+
+logger = logging.getLogger("real-estate-api")
+
+
+def panel_location(coordinates: Dict[str, float]) -> str:
+    """
+    Location string of a listing's panel searches
+
+    NearbyPlaces.js builds it from the listing's coordinates with JavaScript
+    number formatting, and the places cache key depends on the exact string.
+    """
+    def js_number(value: float) -> str:
+        if value == int(value):
+            return str(int(value))
+        text = repr(value)
+        # Python switches to exponent notation below 1e-4, JavaScript below 1e-6
+        if "e" in text and abs(value) >= 1e-6:
+            text = format(Decimal(text), "f")
+        return text
+
+    return f"{js_number(coordinates['lat'])},{js_number(coordinates['lng'])}"
+
+
+def listed_on(listing: Dict[str, Any]) -> str:
+    """Date the listing came on the market, as an ISO string ('' if unknown)"""
+    return str(listing.get("OnMarketDate") or listing.get("ListingContractDate")
+               or listing.get("OriginalEntryTimestamp") or "")
+
+
+class NeighborhoodPrecompute:
+    """Fills the places cache with the panel searches of active listings"""
+
+    def __init__(self):
+        self.status: Dict[str, Any] = {
+            "runs": 0,
+            "last_run_at": None,
+            "last_run_seconds": None,
+            "listings": 0,
+            "searches_fresh": 0,
+            "searches_fetched": 0,
+            "searches_failed": 0,
+            "listings_scored": 0,
+            "last_error": None
+        }
+
+    def listing_locations(
+        self,
+        listings: List[Dict[str, Any]],
+        geocoding_db: GeocodingCache,
+        geocoding_client: GeocodingClient,
+    ) -> List[Tuple[Dict[str, Any], str]]:
+        """
+        Listings with the location of their panel
+        searches, geocoding those without coordinates
+        """
+        located = []
+        seen = set()
+        for listing in listings:
+            key = listing.get("ListingKey")
+            if key in seen:
+                continue
+            seen.add(key)
+            # Resolved like /listings/active does, without counting towards its metrics
+            coordinates = listing_coordinates(listing)
+            address = get_address_from_listing(listing)
+            if coordinates is None and address:
+                cached = geocoding_db.get_coordinates(address)
+                if cached:
+                    coordinates = {"lat": cached['lat'], "lng": cached['lon']}
+                else:
+                    coordinates = geocode_and_cache(address, geocoding_client)
+            if coordinates is not None:
+                located.append((listing, panel_location(coordinates)))
+        return located
+
+    def run(self, limit: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Precompute the panel searches of up to `limit` active listings
+
+        Args:
+            limit: Listings to cover (default PRECOMPUTE_LISTINGS)
+
+        Returns:
+            Status with the counts of this run
+        """
+        start = time.time()
+        counts = {
+            "listings": 0,
+            "searches_fresh": 0,
+            "searches_fetched": 0,
+            "searches_failed": 0,
+            "listings_scored": 0,
+        }
+        error = None
+        # Opened first: the score table installs triggers on nearby_places, and a
+        # places connection opened before them fails its first write there
+        score_db = AmenityScoreDatabase()
+        places_db = get_places_cache()
+        geocoding_db = get_geocoding_cache()
+        places_client = PlacesClient()
+        try:
+            with quota.background_priority():
+                listings = list(
+                    RESOClient(
+                        dataset_id="actris_ref"
+                    ).iter_active_residential_listings(
+                        limit or settings.PRECOMPUTE_LISTINGS
+                    )
+                )
+                located = self.listing_locations(
+                    listings, geocoding_db, GeocodingClient()
+                )
+                views = places_db.get_location_views()
+                located.sort(
+                    key=lambda item: (views.get(item[1], 0), listed_on(item[0])),
+                    reverse=True,
+                )
+                counts["listings"] = len(located)
+
+                # Entries that expire before the next run are refreshed now
+                max_age = settings.CACHE_EXPIRATION - settings.PRECOMPUTE_INTERVAL
+                searches = [
+                    (
+                        location,
+                        place_type,
+                        radius,
+                        places_client.generate_location_key(
+                            location, radius, place_type
+                        ),
+                    )
+                    for _, location in located
+                    for place_type, radius in PANEL_CATEGORIES
+                ]
+                ages = places_db.get_places_ages([key for *_, key in searches])
+
+                for location, place_type, radius, key in searches:
+                    if key in ages and ages[key] < max_age:
+                        counts["searches_fresh"] += 1
+                        continue
+                    results = places_client.search_nearby(
+                        location=location, radius=radius, place_type=place_type
+                    )
+                    if "error" not in results:
+                        places_db.cache_places(
+                            key, location, radius, place_type, None, results
+                        )
+                        counts["searches_fetched"] += 1
+                        continue
+                    counts["searches_failed"] += 1
+                    status_code = results.get("status_code")
+                    if status_code is None or status_code == 429 or status_code >= 500:
+                        # Unavailable, circuit open or quota used
+                        # up: leave the rest for the next run
+                        error = results["error"]
+                        break
+
+            # Listings not seen for CACHE_EXPIRATION have likely left the market
+            scored = refresh_scores(
+                places_db,
+                score_db,
+                [
+                    (listing.get("ListingKey"), *parse_location(location))
+                    for listing, location in located
+                ],
+            )
+            counts["listings_scored"] = scored["scored"] + scored["rescored"]
+            score_db.prune_unseen(settings.CACHE_EXPIRATION)
+        except Exception as e:
+            logger.error(f"Neighborhood precomputation failed: {str(e)}")
+            error = str(e)
+        finally:
+            places_db.close()
+            geocoding_db.close()
+            score_db.close()
+
+        elapsed = time.time() - start
+        self.status.update(counts)
+        self.status["runs"] += 1
+        self.status["last_run_at"] = datetime.datetime.now(
+            datetime.timezone.utc
+        ).isoformat()
+        self.status["last_run_seconds"] = round(elapsed, 3)
+        self.status["last_error"] = error
+        logger.info(
+            "Precomputed neighborhoods of %s listings in %.1fs: "
+            "%s fetched, %s fresh, %s failed, %s scored%s",
+            counts["listings"],
+            elapsed,
+            counts["searches_fetched"],
+            counts["searches_fresh"],
+            counts["searches_failed"],
+            counts["listings_scored"],
+            f" (stopped: {error})" if error else "",
+        )
+        return self.status
+
+
+class PrecomputeScheduler:
+    """Runs NeighborhoodPrecompute periodically on the application's event loop"""
+
+    def __init__(self, precompute: NeighborhoodPrecompute):
+        self.precompute = precompute
+        self._task: Optional[asyncio.Task] = None
+        self._lock = asyncio.Lock()
+
+    def start(self) -> None:
+        """Start the periodic precomputation task"""
+        if self._task is None:
+            logger.info(
+                "Starting neighborhood precomputation for %s listings every %ss",
+                settings.PRECOMPUTE_LISTINGS,
+                settings.PRECOMPUTE_INTERVAL,
+            )
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Stop the periodic precomputation task"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def run_once(self) -> Dict[str, Any]:
+        """
+        Run the precomputation off the event loop, unless a run is already in progress
+        """
+        if self._lock.locked():
+            return self.get_status()
+        async with self._lock:
+            await asyncio.to_thread(self.precompute.run)
+        return self.get_status()
+
+    async def _run(self) -> None:
+        while True:
+            await self.run_once()
+            await asyncio.sleep(settings.PRECOMPUTE_INTERVAL)
+
+    def get_status(self) -> Dict[str, Any]:
+        """Get scheduler configuration and the counts of the last run"""
+        return {
+            "enabled": self._task is not None,
+            "running": self._lock.locked(),
+            "interval": settings.PRECOMPUTE_INTERVAL,
+            "listings_per_run": settings.PRECOMPUTE_LISTINGS,
+            **self.precompute.status
+        }
+
+
+precompute_scheduler = PrecomputeScheduler(NeighborhoodPrecompute())
@@ -0,0 +1,161 @@
+"""
+Place photo proxy backed by a content-addressed blob store on disk
+
+Photos are downloaded from Google once per photo reference and size, and kept
+as files named by the SHA-256 of their content under PHOTO_CACHE_DIR; identical
+images share one file. The PhotoDatabase index maps each request to its file
+and enforces PHOTO_CACHE_MAX_BYTES, least recently used first. Files are
+removed once no index row references them anymore.
+
+Concurrent requests for a photo that is not cached share one download.
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import logging
+import re
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.config import settings
+from app.core.metrics import record_cache_lookup
+from app.models.database import PhotoDatabase
+from app.services.blobs import BlobStore
+from app.services.places import PlacesClient
+
+logger = logging.getLogger("real-estate-api")
+
+# Photo names of the Places API ("places/<id>/photos/<ref>"), or legacy photo references
+PHOTO_REFERENCE_PATTERN = re.compile(r"^(?:places/[\w-]+/photos/[\w-]+|[\w-]+)$")
+
+_photo_executor = ThreadPoolExecutor(max_workers=settings.PHOTO_FETCH_CONCURRENCY,
+                                     thread_name_prefix="photos")
+_photos_in_flight: Dict[str, Future] = {}
+_in_flight_lock = threading.Lock()
+
+blob_store = BlobStore(settings.PHOTO_CACHE_DIR)
+
+
+def photo_key(
+    photo_reference: str, max_width: Optional[int], max_height: Optional[int]
+) -> str:
+    """Cache key of a photo at a requested size"""
+    return hashlib.sha256(
+        f"{photo_reference}|{max_width or ''}|{max_height or ''}".encode()
+    ).hexdigest()
+
+
+def lookup_photo(key: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+    """
+    Cached photo and whether it is expired, forgetting entries whose file is gone
+
+    Opens the index and may write to it, so async callers run it on a worker thread.
+    """
+    photo_db = PhotoDatabase()
+    try:
+        entry, expired = photo_db.get_photo(key)
+        if entry is not None and not blob_store.exists(entry['digest']):
+            logger.warning(
+                "Photo file %s is missing, downloading it again", entry['digest']
+            )
+            photo_db.remove_entry(key)
+            return None, False
+        return entry, expired
+    finally:
+        photo_db.close()
+
+
+def fetch_and_store(key: str, photo_reference: str, max_width: Optional[int],
+                    max_height: Optional[int]) -> Dict[str, Any]:
+    """
+    Download a photo into the blob store and index it
+
+    Returns:
+        {'digest', 'content_type', 'size'}, or the download's 'error'
+    """
+    result = PlacesClient().get_photo(photo_reference, max_width, max_height)
+    if "error" in result:
+        return result
+
+    content = result["content"]
+    digest = blob_store.write(content)
+    # Runs on a worker thread, possibly after the
+    # request gave up, so it uses its own connection
+    photo_db = PhotoDatabase()
+    try:
+        photo_db.save_photo(key, photo_reference, max_width, max_height, digest,
+                            result["content_type"], len(content))
+        photo_db.collect_garbage(blob_store.remove)
+    finally:
+        photo_db.close()
+    return {
+        "digest": digest,
+        "content_type": result["content_type"],
+        "size": len(content),
+    }
+
+
+def fetch_in_background(key: str, photo_reference: str, max_width: Optional[int],
+                        max_height: Optional[int]) -> Future:
+    """Start downloading a photo, or join the download already in flight for it"""
+    with _in_flight_lock:
+        future = _photos_in_flight.get(key)
+        if future is None:
+            future = _photo_executor.submit(
+                contextvars.copy_context().run,
+                fetch_and_store,
+                key,
+                photo_reference,
+                max_width,
+                max_height,
+            )
+            _photos_in_flight[key] = future
+            future.add_done_callback(lambda _: _forget_photo(key))
+    return future
+
+
+def _forget_photo(key: str) -> None:
+    with _in_flight_lock:
+        _photos_in_flight.pop(key, None)
+
+
+async def get_photo(photo_reference: str, max_width: Optional[int],
+                    max_height: Optional[int]) -> Dict[str, Any]:
+    """
+    Get a photo from the blob store, downloading it on a miss
+
+    If the download fails, an expired copy is served instead.
+
+    Returns:
+        {'digest', 'content_type', 'size'} of the stored photo (see
+        blob_store.path), or the download's 'error'
+    """
+    key = photo_key(photo_reference, max_width, max_height)
+    entry, expired = await asyncio.to_thread(lookup_photo, key)
+    if entry is not None and not expired:
+        record_cache_lookup("photos", "", "hit")
+        return entry
+    record_cache_lookup("photos", "", "stale" if entry else "miss")
+
+    result = await asyncio.wrap_future(
+        fetch_in_background(key, photo_reference, max_width, max_height)
+    )
+    if "error" in result and entry is not None:
+        logger.warning(
+            "Photo download failed, serving expired photo %s", entry['digest']
+        )
+        return entry
+    return result
+
+
+def clear_photos() -> int:
+    """Delete all cached photos and their files"""
+    photo_db = PhotoDatabase()
+    try:
+        count = photo_db.clear_cache()
+        photo_db.collect_garbage(blob_store.remove)
+    finally:
+        photo_db.close()
+    return count
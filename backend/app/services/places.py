@@ -1,17 +1,32 @@
-import requests
-import logging
 import hashlib
-from typing import Dict, Any, Optional
+import logging
+from typing import Any, Dict, Optional
+
+import requests
+
 from app.core.config import settings
+from app.core.timing import timed
+from app.services import upstream
 
 logger = logging.getLogger("real-estate-api")
 
+# Place types and radii requested by a listing panel (NearbyPlaces.js); the
+# searches are precomputed for active listings by app/services/neighborhoods.py
+PANEL_CATEGORIES = [
+    ("restaurant", 1000),
+    ("school", 1500),
+    ("hospital", 2000),
+    ("supermarket", 1500),
+    ("transit_station", 1000),
+]
+
 class PlacesClient:
     def __init__(self):
         """Initialize the Google Places API client"""
         self.api_key = settings.GOOGLE_MAPS_API_KEY
         self.places_api_url = settings.PLACES_API_BASE_URL
     
+    @timed("places_api")
     def search_nearby(
         self, 
         location: str,
@@ -33,7 +48,9 @@ class PlacesClient:
         Returns:
             Dictionary with search results
         """
-        logger.info(f"Searching for {place_type} places near {location} within {radius}m")
+        logger.info(
+            "Searching for %s places near %s within %sm", place_type, location, radius
+        )
         
         # If using a page token, only that parameter is needed
         if pagetoken:
@@ -72,11 +89,16 @@ class PlacesClient:
         try:
             # Define the fields needed based on what's used in NearbyPlaces.js
             # Set the field mask based on the data we need for our frontend
-            field_mask = "places.displayName,places.id,places.formattedAddress,places.location,places.rating,places.userRatingCount,places.types,places.regularOpeningHours,places.priceLevel"
+            field_mask = (
+                "places.displayName,places.id,places.formattedAddress,places.location,"
+                "places.rating,places.userRatingCount,places.types,"
+                "places.regularOpeningHours,places.priceLevel,places.photos"
+            )
             
             # If using pagetoken, GET request is used
             if pagetoken:
-                response = requests.get(
+                response = upstream.request(
+                    "google_places", "GET",
                     self.places_api_url,
                     params=params,
                     headers={"X-Goog-FieldMask": field_mask}
@@ -87,32 +109,101 @@ class PlacesClient:
                     "Content-Type": "application/json",
                     "X-Goog-FieldMask": field_mask
                 }
-                response = requests.post(
+                response = upstream.request(
+                    "google_places", "POST",
                     self.places_api_url,
                     json=payload,
                     params=params,
                     headers=headers
                 )
             
-            response.raise_for_status()
             data = response.json()
             
             # Transform the response to match our expected format
             transformed_data = self._transform_places_response(data)
-            logger.info(f"Found {len(transformed_data['results'])} places")
+            logger.info("Found %s places", len(transformed_data['results']))
             
             return transformed_data
         
         except requests.exceptions.RequestException as e:
-            logger.error(f"Error searching for places: {str(e)}")
-            error_response = {"error": str(e), "status": "ERROR"}
-            if hasattr(e, 'response') and e.response is not None:
-                error_response["status_code"] = e.response.status_code
-                try:
-                    error_response["response"] = e.response.json()
-                except:
-                    error_response["response"] = e.response.text
-            return error_response
+            logger.error(f"Error searching for places: {upstream.redact(str(e))}")
+            return self._error_response(e)
+    
+    @timed("places_api")
+    def get_photo(self, photo_reference: str, max_width: Optional[int] = None,
+                  max_height: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Download a place photo
+        
+        Args:
+            photo_reference: Photo name from a places result ("places/.../photos/..."),
+                or a legacy Places API photo reference
+            max_width: Maximum width in pixels
+            max_height: Maximum height in pixels
+            
+        Returns:
+            Dictionary with the image 'content' and its 'content_type', or an 'error'
+        """
+        logger.info("Downloading place photo %.40s...", photo_reference)
+        try:
+            if "/photos/" in photo_reference:
+                # Ask for the photo's address instead of a redirect, so both
+                # calls can be recorded and replayed like other provider calls
+                params = {"key": self.api_key, "skipHttpRedirect": "true"}
+                if max_width:
+                    params["maxWidthPx"] = max_width
+                if max_height:
+                    params["maxHeightPx"] = max_height
+                media = upstream.request(
+                    "google_places", "GET",
+                    f"{settings.PLACE_PHOTO_API_URL_NEW}/{photo_reference}/media",
+                    params=params
+                ).json()
+                if not media.get("photoUri"):
+                    return {
+                        "error": "Photo has no address",
+                        "status": "ERROR",
+                        "status_code": 404,
+                    }
+                response = upstream.request("google_places", "GET", media["photoUri"])
+            else:
+                params = {"key": self.api_key, "photoreference": photo_reference}
+                if max_width:
+                    params["maxwidth"] = max_width
+                if max_height:
+                    params["maxheight"] = max_height
+                response = upstream.request(
+                    "google_places", "GET", settings.PLACE_PHOTO_API_URL, params=params
+                )
+            
+            content_type = response.headers.get("Content-Type", "")
+            if not content_type.startswith("image/"):
+                return {
+                    "error": f"Unexpected photo content type '{content_type}'",
+                    "status": "ERROR",
+                    "status_code": 502,
+                }
+            return {"content": response.content, "content_type": content_type}
+        
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Error downloading place photo: {upstream.redact(str(e))}")
+            return self._error_response(e)
+
+    def _error_response(
+        self, e: requests.exceptions.RequestException
+    ) -> Dict[str, Any]:
+        """
+        Error result of a failed provider call, with
+        the provider's status and response if any
+        """
+        error_response = {"error": upstream.redact(str(e)), "status": "ERROR"}
+        if hasattr(e, 'response') and e.response is not None:
+            error_response["status_code"] = e.response.status_code
+            try:
+                error_response["response"] = e.response.json()
+            except:
+                error_response["response"] = e.response.text
+        return error_response
     
     def _transform_places_response(self, new_api_response: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -158,6 +249,15 @@ class PlacesClient:
                     "weekday_text": place.get("regularOpeningHours", {}).get("weekdayDescriptions", [])
                 }
             
+            # Add the first photo, for the photo proxy (GET /api/places/photo)
+            if place.get("photos"):
+                photo = place["photos"][0]
+                transformed_place["photos"] = [{
+                    "photo_reference": photo.get("name", ""),
+                    "width": photo.get("widthPx"),
+                    "height": photo.get("heightPx")
+                }]
+            
             # Add price level if available
             if "priceLevel" in place:
                 price_level_map = {
@@ -194,7 +294,7 @@ class PlacesClient:
             if len(address_parts) >= 2:
                 # Use the first part and truncate other parts
                 vicinity = address_parts[0].strip()
-                logger.debug(f"Shortened vicinity to: {vicinity}")
+                logger.debug("Shortened vicinity to: %s", vicinity)
         
         return vicinity
     
@@ -211,7 +311,7 @@ class PlacesClient:
         Returns:
             Unique cache key
         """
-        logger.debug(f"Generating location key for {place_type} near {location}")
+        logger.debug("Generating location key for %s near %s", place_type, location)
         
         # Create a string with all parameters
         key_string = f"{location}_{radius}_{place_type}"
@@ -220,6 +320,6 @@ class PlacesClient:
         
         # Create a hash of the string
         key = hashlib.md5(key_string.encode()).hexdigest()
-        logger.debug(f"Generated location key: {key}")
+        logger.debug("Generated location key: %s", key)
         
         return key 
\ No newline at end of file
@@ -0,0 +1,251 @@
+"""
+Client-side rate limiting of upstream provider calls
+
+Each provider listed in QUOTA_RATES gets a token bucket refilled at that many
+calls per second, holding up to QUOTA_BURST tokens. A call takes a token,
+queueing until one is available. Interactive calls (made for a user request)
+are served before background calls (cache warming, batch jobs); background
+work runs inside `background_priority()`.
+
+Waiting is bounded: a call that would queue longer than QUOTA_MAX_WAIT
+(QUOTA_BACKGROUND_MAX_WAIT for background calls) fails at once with
+QuotaExceededError rather than holding its request. Once a provider has used
+its QUOTA_DAILY_LIMITS calls for the UTC day, every call fails the same way
+until midnight, so the API serves from the cache only.
+
+Buckets and daily counts are kept per process.
+"""
+
+import datetime
+import heapq
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+
+from app.core.config import settings
+from app.core.metrics import QUOTA_DAILY_CALLS, QUOTA_REJECTED, QUOTA_WAIT
+
+logger = logging.getLogger("real-estate-api")
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+_priority: ContextVar[int] = ContextVar("upstream_priority", default=INTERACTIVE)
+
+
+class QuotaExceededError(requests.exceptions.RequestException):
+    """
+    Raised instead of calling a provider when its quota leaves no room for the call
+    """
+
+    def __init__(self, provider: str, reason: str):
+        super().__init__(f"Quota for {provider} exceeded ({reason})")
+        self.provider = provider
+        self.reason = reason
+
+
+@contextmanager
+def background_priority() -> Iterator[None]:
+    """Run the enclosed provider calls behind interactive ones"""
+    token = _priority.set(BACKGROUND)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def utc_day() -> str:
+    return datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d")
+
+
+class TokenBucket:
+    """
+    Token bucket with a priority queue of waiting callers
+
+    Args:
+        provider: Provider name, used in errors and metrics
+        rate: Tokens added per second
+        burst: Bucket capacity
+        daily_limit: Calls allowed per UTC day (0 for no limit)
+    """
+
+    def __init__(self, provider: str, rate: float, burst: int, daily_limit: int = 0):
+        self.provider = provider
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.daily_limit = daily_limit
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.day = utc_day()
+        self.daily_calls = 0
+        self._waiters: List[tuple] = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _reject(self, reason: str) -> None:
+        QUOTA_REJECTED.inc(provider=self.provider, reason=reason)
+        raise QuotaExceededError(self.provider, reason)
+
+    def _take_daily_call(self) -> None:
+        day = utc_day()
+        if day != self.day:
+            self.day = day
+            self.daily_calls = 0
+        if self.daily_limit and self.daily_calls >= self.daily_limit:
+            self._reject("daily_limit")
+        self.daily_calls += 1
+        QUOTA_DAILY_CALLS.set(self.daily_calls, provider=self.provider)
+        if self.daily_calls == self.daily_limit:
+            logger.warning(
+                "Daily quota of %s calls to %s used up, "
+                "serving from the cache only until midnight UTC",
+                self.daily_limit,
+                self.provider,
+            )
+
+    def acquire(
+        self, priority: int = INTERACTIVE, max_wait: Optional[float] = None
+    ) -> float:
+        """
+        Take a token, waiting behind calls of the same or higher priority
+
+        Args:
+            priority: INTERACTIVE or BACKGROUND
+            max_wait: Longest time to queue in seconds
+
+        Returns:
+            Seconds spent waiting
+
+        Raises:
+            QuotaExceededError: The daily limit is used up,
+                or no token is expected within max_wait
+        """
+        start = time.monotonic()
+        deadline = start + max_wait if max_wait is not None else None
+        with self._condition:
+            if (
+                self.daily_limit
+                and self.day == utc_day()
+                and self.daily_calls >= self.daily_limit
+            ):
+                self._reject("daily_limit")
+
+            self._refill(start)
+            # Fail now if the callers ahead of us already
+            # need more than max_wait worth of tokens
+            ahead = sum(1 for waiter in self._waiters if waiter[0] <= priority)
+            if (
+                deadline is not None
+                and (ahead + 1 - self.tokens) / self.rate > max_wait
+            ):
+                self._reject("wait_limit")
+
+            entry = (priority, next(self._sequence))
+            heapq.heappush(self._waiters, entry)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._waiters[0] == entry and self.tokens >= 1:
+                        heapq.heappop(self._waiters)
+                        self._take_daily_call()
+                        self.tokens -= 1
+                        break
+                    if deadline is not None and now >= deadline:
+                        self._waiters.remove(entry)
+                        heapq.heapify(self._waiters)
+                        self._reject("wait_limit")
+                    wait = (
+                        (1 - self.tokens) / self.rate
+                        if self._waiters[0] == entry
+                        else None
+                    )
+                    if deadline is not None:
+                        wait = (
+                            deadline - now
+                            if wait is None
+                            else min(wait, deadline - now)
+                        )
+                    self._condition.wait(wait)
+            finally:
+                # The next caller in line may be able to proceed now
+                self._condition.notify_all()
+
+        waited = time.monotonic() - start
+        QUOTA_WAIT.observe(
+            waited, provider=self.provider, priority=PRIORITY_NAMES[priority]
+        )
+        return waited
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current state for the system API"""
+        with self._condition:
+            self._refill(time.monotonic())
+            daily_calls = self.daily_calls if self.day == utc_day() else 0
+            return {
+                "provider": self.provider,
+                "rate": self.rate,
+                "burst": self.burst,
+                "tokens": round(self.tokens, 2),
+                "waiting": len(self._waiters),
+                "daily_calls": daily_calls,
+                "daily_limit": self.daily_limit,
+                "cache_only": bool(self.daily_limit) and daily_calls >= self.daily_limit
+            }
+
+
+_buckets: Dict[str, TokenBucket] = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(provider: str) -> Optional[TokenBucket]:
+    """The token bucket of a provider, or None if its calls are not rate limited"""
+    rate = settings.QUOTA_RATES.get(provider)
+    daily_limit = settings.QUOTA_DAILY_LIMITS.get(provider, 0)
+    if not rate and not daily_limit:
+        return None
+    with _buckets_lock:
+        bucket = _buckets.get(provider)
+        if bucket is None:
+            # A daily limit alone doesn't throttle: the
+            # bucket refills faster than any client calls
+            bucket = _buckets[provider] = TokenBucket(
+                provider,
+                rate or 1e6,
+                settings.QUOTA_BURST.get(provider, 1) if rate else 10**6,
+                daily_limit,
+            )
+        return bucket
+
+
+def acquire(provider: str) -> None:
+    """Wait for the provider's quota to allow a call at the current priority"""
+    bucket = get_bucket(provider)
+    if bucket is None:
+        return
+    priority = _priority.get()
+    max_wait = (
+        settings.QUOTA_MAX_WAIT
+        if priority == INTERACTIVE
+        else settings.QUOTA_BACKGROUND_MAX_WAIT
+    )
+    bucket.acquire(priority, max_wait)
+
+
+def quota_states() -> List[Dict[str, Any]]:
+    """Snapshots of the rate-limited providers"""
+    providers = sorted(set(settings.QUOTA_RATES) | set(settings.QUOTA_DAILY_LIMITS))
+    return [
+        bucket.snapshot() for bucket in map(get_bucket, providers) if bucket is not None
+    ]
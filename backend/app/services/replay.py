@@ -0,0 +1,337 @@
+"""
+Recording and replaying of upstream provider exchanges
+
+FixtureRecorder appends every exchange with a provider to
+`<fixtures dir>/<provider>.jsonl`, one JSON object per line. Secrets in query
+strings (API keys, access tokens) are never written.
+
+UpstreamStandInServer serves recorded exchanges over HTTP so the API can run
+its full request paths offline. It listens on `/<provider>/<original path>`;
+a request is answered with the recorded exchange for the same method, path,
+query and body, or, failing that, in turn with the exchanges recorded for the
+same method and path. Latency, jitter and error responses can be injected.
+The Geoapify batch geocoding API is stood in for statefully: submitted jobs
+finish after a set time and answer each address from the recorded single
+geocodes.
+"""
+
+import base64
+import itertools
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+
+logger = logging.getLogger("real-estate-api")
+
+# Query parameters holding credentials; they are dropped from fixtures and lookups
+SECRET_PARAMS = {"access_token", "apiKey", "key"}
+
+ExchangeKey = Tuple[str, str, Tuple[Tuple[str, str], ...], Optional[str]]
+
+GEOCODE_PATH = "/v1/geocode/search"
+BATCH_GEOCODE_PATH = "/v1/batch/geocode/search"
+
+
+def canonical_query(query: str) -> Tuple[Tuple[str, str], ...]:
+    """Decoded, sorted query parameters without credentials"""
+    return tuple(
+        sorted(
+            (name, value)
+            for name, value in parse_qsl(query, keep_blank_values=True)
+            if name not in SECRET_PARAMS
+        )
+    )
+
+
+def canonical_body(body: Optional[bytes]) -> Optional[str]:
+    """Request body in a form that compares equal for equivalent JSON documents"""
+    if not body:
+        return None
+    if isinstance(body, bytes):
+        body = body.decode("utf-8", errors="replace")
+    try:
+        return json.dumps(json.loads(body), sort_keys=True, separators=(",", ":"))
+    except ValueError:
+        return body
+
+
+def exchange_key(
+    method: str, path: str, query: str, body: Optional[bytes]
+) -> ExchangeKey:
+    return (method.upper(), path, canonical_query(query), canonical_body(body))
+
+
+class FixtureRecorder:
+    """Append provider exchanges to per-provider JSON Lines fixture files"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def record(self, provider: str, response: requests.Response) -> None:
+        request = response.request
+        url = urlsplit(request.url)
+        content_type = response.headers.get("Content-Type", "")
+        exchange: Dict[str, Any] = {
+            "method": request.method,
+            "path": url.path,
+            "query": canonical_query(url.query),
+            "body": canonical_body(request.body),
+            "status": response.status_code,
+            "content_type": content_type,
+            "elapsed_ms": round(response.elapsed.total_seconds() * 1000, 1)
+        }
+        if "json" in content_type or content_type.startswith("text/"):
+            exchange["response"] = response.text
+        else:
+            exchange["response_base64"] = base64.b64encode(response.content).decode(
+                "ascii"
+            )
+
+        line = json.dumps(exchange) + "\n"
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(os.path.join(self.directory, f"{provider}.jsonl"), "a") as f:
+                f.write(line)
+
+
+def load_fixtures(directory: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Read all recorded exchanges, by provider"""
+    fixtures: Dict[str, List[Dict[str, Any]]] = {}
+    if not os.path.isdir(directory):
+        return fixtures
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(".jsonl"):
+            continue
+        with open(os.path.join(directory, name)) as f:
+            fixtures[name[: -len(".jsonl")]] = [
+                json.loads(line) for line in f if line.strip()
+            ]
+    return fixtures
+
+
+class FixtureIndex:
+    """Lookup of recorded exchanges by exact request, with per-path fallback"""
+
+    def __init__(self, fixtures: Dict[str, List[Dict[str, Any]]]):
+        self.exact: Dict[Tuple[str, ExchangeKey], Dict[str, Any]] = {}
+        by_path: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = {}
+        for provider, exchanges in fixtures.items():
+            for exchange in exchanges:
+                query = tuple(tuple(pair) for pair in exchange["query"])
+                key = (
+                    exchange["method"],
+                    exchange["path"],
+                    query,
+                    exchange.get("body"),
+                )
+                self.exact.setdefault((provider, key), exchange)
+                by_path.setdefault(
+                    (provider, exchange["method"], exchange["path"]), []
+                ).append(exchange)
+        self._cycles: Dict[Tuple[str, str, str], Iterator[Dict[str, Any]]] = {
+            key: itertools.cycle(exchanges) for key, exchanges in by_path.items()
+        }
+        self._lock = threading.Lock()
+
+    def find(self, provider: str, key: ExchangeKey) -> Optional[Dict[str, Any]]:
+        exchange = self.exact.get((provider, key))
+        if exchange is not None:
+            return exchange
+        cycle = self._cycles.get((provider, key[0], key[1]))
+        if cycle is None:
+            return None
+        with self._lock:
+            return next(cycle)
+
+
+class BatchGeocodingStandIn:
+    """
+    Stand-in of the Geoapify batch geocoding API
+
+    A POST of a JSON list of addresses creates a job; GETs with its id answer
+    202 until `job_ms` have passed, then the results, taken from the recorded
+    single geocode of each address.
+    """
+
+    def __init__(self, index: FixtureIndex, job_ms: float):
+        self.index = index
+        self.job_ms = job_ms
+        self.jobs: Dict[str, Tuple[List[str], float]] = {}
+        self._lock = threading.Lock()
+
+    def handle(self, method: str, query: str, body: Optional[bytes]) -> Tuple[int, Any]:
+        """Status and JSON payload answering a batch API request"""
+        if method == "POST":
+            try:
+                addresses = json.loads(body or b"")
+            except ValueError:
+                addresses = None
+            if not isinstance(addresses, list) or not all(
+                isinstance(a, str) for a in addresses
+            ):
+                return 400, {"error": "Expected a JSON list of addresses"}
+            job_id = uuid.uuid4().hex
+            with self._lock:
+                self.jobs[job_id] = (addresses, time.monotonic() + self.job_ms / 1000)
+            return 202, {"id": job_id, "status": "pending",
+                         "url": f"https://api.geoapify.com{BATCH_GEOCODE_PATH}?id={job_id}"}
+
+        job_id = dict(parse_qsl(query)).get("id", "")
+        with self._lock:
+            job = self.jobs.get(job_id)
+        if job is None:
+            return 404, {"error": f"Unknown batch job {job_id}"}
+        addresses, ready_at = job
+        if time.monotonic() < ready_at:
+            return 202, {"id": job_id, "status": "pending"}
+        return 200, [self._geocode(address) for address in addresses]
+
+    def _geocode(self, address: str) -> Dict[str, Any]:
+        item: Dict[str, Any] = {"query": {"text": address}}
+        exchange = self.index.find(
+            "geoapify",
+            exchange_key("GET", GEOCODE_PATH, urlencode({"text": address}), None),
+        )
+        if exchange is not None and exchange.get("status") == 200:
+            features = (
+                json.loads(exchange.get("response") or "{}").get("features") or []
+            )
+            if features:
+                item.update(features[0].get("properties", {}))
+        return item
+
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "UpstreamStandInServer"
+
+    def _handle(self) -> None:
+        url = urlsplit(self.path)
+        provider, _, path = url.path.lstrip("/").partition("/")
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else None
+
+        batch = provider == "geoapify" and "/" + path == BATCH_GEOCODE_PATH
+        exchange = None if batch else self.server.index.find(
+            provider, exchange_key(self.command, "/" + path, url.query, body)
+        )
+        self.server.delay(exchange)
+
+        if random.random() < self.server.error_rate:
+            status = self.server.error_status
+            payload = json.dumps({"error": "Injected upstream error"}).encode()
+            headers = {"Content-Type": "application/json"}
+            if status == 429:
+                headers["Retry-After"] = "1"
+        elif batch:
+            status, answer = self.server.batch_geocoding.handle(
+                self.command, url.query, body
+            )
+            payload = json.dumps(answer).encode()
+            headers = {"Content-Type": "application/json"}
+        elif exchange is None:
+            status = 404
+            payload = json.dumps(
+                {"error": f"No recorded exchange for {self.command} {url.path}"}
+            ).encode()
+            headers = {"Content-Type": "application/json"}
+        else:
+            status = exchange["status"]
+            if "response_base64" in exchange:
+                payload = base64.b64decode(exchange["response_base64"])
+            else:
+                payload = exchange.get("response", "").encode()
+            headers = {
+                "Content-Type": exchange.get("content_type") or "application/json"
+            }
+
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = _handle
+    do_POST = _handle
+
+    def log_message(self, format, *args):
+        logger.debug("Stand-in upstream: " + format, *args)
+
+
+class UpstreamStandInServer(ThreadingHTTPServer):
+    """
+    Local HTTP server replaying recorded provider exchanges
+
+    Args:
+        fixtures: Recorded exchanges by provider (see load_fixtures)
+        host: Interface to listen on
+        port: Port to listen on, 0 picks a free one
+        latency_ms: Added delay per response; None
+            replays each exchange's recorded latency
+        jitter_ms: Random delay of up to +/- this much is added to the latency
+        error_rate: Fraction of requests answered with error_status instead
+        error_status: HTTP status of injected errors (429 responses carry Retry-After)
+        batch_job_ms: Time a batch geocoding job takes to finish
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(
+        self,
+        fixtures: Dict[str, List[Dict[str, Any]]],
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency_ms: Optional[float] = None,
+        jitter_ms: float = 0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        batch_job_ms: float = 1000,
+    ):
+        super().__init__((host, port), _StandInHandler)
+        self.index = FixtureIndex(fixtures)
+        self.batch_geocoding = BatchGeocodingStandIn(self.index, batch_job_ms)
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def delay(self, exchange: Optional[Dict[str, Any]]) -> None:
+        latency = self.latency_ms
+        if latency is None:
+            latency = exchange.get("elapsed_ms", 0) if exchange else 0
+        if self.jitter_ms:
+            latency += random.uniform(-self.jitter_ms, self.jitter_ms)
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+    def start(self) -> "UpstreamStandInServer":
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="upstream-stand-in", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
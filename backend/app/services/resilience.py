@@ -0,0 +1,219 @@
+"""
+Failure handling shared by all upstream provider calls
+
+A failed call is retried a bounded number of times with jittered exponential
+backoff; a `Retry-After` header on 429 and 503 responses replaces the backoff
+when it is short enough to wait for. Each provider has a circuit breaker: after
+CIRCUIT_FAILURE_THRESHOLD consecutive failures (or a Retry-After too long to
+wait for) the circuit opens and calls fail immediately with CircuitOpenError.
+After CIRCUIT_RESET_TIMEOUT one trial call is let through; its outcome closes
+the circuit or opens it again.
+
+Only timeouts, connection errors, 429 and 5xx responses count as failures.
+Other client errors mean the provider is healthy and the request was wrong.
+"""
+
+import datetime
+import logging
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from app.core.config import settings
+from app.core.metrics import CIRCUIT_BREAKER_STATE
+
+logger = logging.getLogger("real-estate-api")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Circuit states as exported in the circuit_breaker_state metric
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of calling a provider whose circuit is open"""
+
+    def __init__(self, provider: str, retry_in: float):
+        super().__init__(
+            f"Circuit for {provider} is open; next trial call in {retry_in:.1f}s"
+        )
+        self.provider = provider
+        self.retry_in = retry_in
+
+
+def is_retryable(error: requests.exceptions.RequestException) -> bool:
+    """Whether a failed call indicates an unhealthy provider and may be retried"""
+    if isinstance(error, CircuitOpenError):
+        return False
+    response = getattr(error, "response", None)
+    if response is None:
+        # Timeouts and connection errors
+        return isinstance(
+            error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)
+        )
+    return response.status_code in RETRYABLE_STATUS_CODES
+
+
+def retry_after(response: Optional[requests.Response]) -> Optional[float]:
+    """Seconds to wait according to a Retry-After header (delay seconds or HTTP date)"""
+    if response is None:
+        return None
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=datetime.timezone.utc)
+    return max(
+        0.0, (when - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+    )
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff before retry number `attempt` (starting at 0)"""
+    return random.uniform(
+        0,
+        min(
+            settings.UPSTREAM_BACKOFF_MAX, settings.UPSTREAM_BACKOFF_BASE * 2**attempt
+        ),
+    )
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker for one provider
+
+    Args:
+        provider: Provider name, used in errors, logs and metrics
+        failure_threshold: Consecutive failures that open the circuit
+        reset_timeout: Seconds the circuit stays open before a trial call
+    """
+
+    def __init__(self, provider: str, failure_threshold: int, reset_timeout: float):
+        self.provider = provider
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.retry_at = 0.0
+        self.failures = 0
+        self.short_circuited = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+        CIRCUIT_BREAKER_STATE.set(STATE_VALUES[CLOSED], provider=provider)
+
+    def _set_state(self, state: str) -> None:
+        if state != self.state:
+            logger.warning("Circuit for %s %s", self.provider, state.replace("_", "-"))
+        self.state = state
+        CIRCUIT_BREAKER_STATE.set(STATE_VALUES[state], provider=self.provider)
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless a call to the provider may go ahead"""
+        with self._lock:
+            now = time.time()
+            if self.state == OPEN and now >= self.retry_at:
+                self._set_state(HALF_OPEN)
+            if self.state == CLOSED or (
+                self.state == HALF_OPEN and not self._trial_in_flight
+            ):
+                self._trial_in_flight = self.state == HALF_OPEN
+                return
+            self.short_circuited += 1
+            raise CircuitOpenError(self.provider, max(0.0, self.retry_at - now))
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+            if self.state != CLOSED:
+                self.opened_at = None
+                self._set_state(CLOSED)
+
+    def abandon(self) -> None:
+        """Forget a call that failed for reasons unrelated to the provider"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self, open_for: Optional[float] = None) -> None:
+        """
+        Count a failed call
+
+        Args:
+            open_for: Open the circuit for at least this many seconds regardless of
+                the failure count (used for a Retry-After too long to wait for)
+        """
+        with self._lock:
+            now = time.time()
+            self.failures += 1
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if (
+                self.state == HALF_OPEN
+                or self.consecutive_failures >= self.failure_threshold
+                or open_for is not None
+            ):
+                if self.state != OPEN:
+                    self.opened_at = now
+                self.retry_at = now + max(self.reset_timeout, open_for or 0)
+                self._set_state(OPEN)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current state for the system API"""
+        with self._lock:
+            def iso(timestamp: Optional[float]) -> Optional[str]:
+                if timestamp is None:
+                    return None
+                return datetime.datetime.fromtimestamp(
+                    timestamp, datetime.timezone.utc
+                ).isoformat()
+
+            return {
+                "provider": self.provider,
+                "state": self.state,
+                "consecutive_failures": self.consecutive_failures,
+                "failures": self.failures,
+                "short_circuited": self.short_circuited,
+                "opened_at": iso(self.opened_at),
+                "retry_at": iso(self.retry_at) if self.state != CLOSED else None
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(provider: str) -> CircuitBreaker:
+    """The circuit breaker of a provider, created on first use"""
+    with _breakers_lock:
+        breaker = _breakers.get(provider)
+        if breaker is None:
+            breaker = _breakers[provider] = CircuitBreaker(
+                provider,
+                settings.CIRCUIT_FAILURE_THRESHOLD,
+                settings.CIRCUIT_RESET_TIMEOUT,
+            )
+        return breaker
+
+
+def breaker_states() -> List[Dict[str, Any]]:
+    """Snapshots of all circuit breakers"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return [breaker.snapshot() for breaker in breakers]
@@ -1,7 +1,11 @@
-import requests
-from typing import List, Dict, Any, Optional
 import logging
+from typing import Any, Dict, Iterator, List, Optional
+
+import requests
+
 from app.core.config import settings
+from app.core.timing import timed
+from app.services import upstream
 
 logger = logging.getLogger("real-estate-api")
 
@@ -20,12 +24,16 @@ class RESOClient:
             'Accept': 'application/json'
         }
 
-    def get_active_residential_listings(self, limit: int = 100) -> List[Dict[str, Any]]:
+    @timed("reso")
+    def get_active_residential_listings(
+        self, limit: int = 100, skip: int = 0
+    ) -> List[Dict[str, Any]]:
         """
         Fetch active listings from the RESO Web API
         
         Args:
             limit: Maximum number of listings to return
+            skip: Number of listings to skip, for paging through the feed
             
         Returns:
             List of active residential listings
@@ -35,18 +43,41 @@ class RESOClient:
                    f"?access_token={self.access_token}"
                    f"&$filter={filter_param}"
                    f"&$top={limit}")
+        if skip:
+            endpoint += f"&$skip={skip}"
 
         try:
-            logger.info(f"Fetching {limit} active residential listings from RESO API")
-            response = requests.get(endpoint, headers=self.headers)
-            response.raise_for_status()
+            logger.info("Fetching %s active residential listings from RESO API", limit)
+            response = upstream.request("reso", "GET", endpoint, headers=self.headers)
             listings = response.json().get('value', [])
-            logger.info(f"Retrieved {len(listings)} listings from RESO API")
+            logger.info("Retrieved %s listings from RESO API", len(listings))
             return listings
         except requests.exceptions.RequestException as e:
-            logger.error(f"Error fetching active listings: {e}")
+            logger.error(f"Error fetching active listings: {upstream.redact(str(e))}")
             return []
 
+    def iter_active_residential_listings(
+        self, limit: int, page_size: int = 200
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Page through up to `limit` active listings
+        
+        Args:
+            limit: Maximum number of listings to return
+            page_size: Listings requested per call
+            
+        Returns:
+            Iterator over the listings, fetching pages as it goes
+        """
+        for skip in range(0, limit, page_size):
+            listings = self.get_active_residential_listings(
+                limit=min(page_size, limit - skip), skip=skip
+            )
+            yield from listings
+            if len(listings) < min(page_size, limit - skip):
+                return
+
+    @timed("reso")
     def get_listing(self, listing_key: str) -> Optional[Dict[str, Any]]:
         """
         Fetch historical data for a specific listing
@@ -60,12 +91,13 @@ class RESOClient:
         endpoint = (f"{self.base_url}{self.dataset_id}/Property('{listing_key}')"
                    f"?access_token={self.access_token}")
         try:
-            logger.info(f"Fetching listing details for {listing_key}")
-            response = requests.get(endpoint, headers=self.headers)
-            response.raise_for_status()
+            logger.info("Fetching listing details for %s", listing_key)
+            response = upstream.request("reso", "GET", endpoint, headers=self.headers)
             return response.json()
         except requests.exceptions.RequestException as e:
-            logger.error(f"Error fetching listing for {listing_key}: {e}")
+            logger.error(
+                f"Error fetching listing for {listing_key}: {upstream.redact(str(e))}"
+            )
             return None
 
 
@@ -80,11 +112,12 @@ def get_address_from_listing(listing: Dict[str, Any]) -> str:
         Complete address as a string
     """
     # Extract address components
-    street = listing.get('StreetNumber', '') + ' ' + listing.get('StreetName', '')
-    city = listing.get('City', '')
-    state = listing.get('StateOrProvince', '')
-    postal_code = listing.get('PostalCode', '')
-    country = listing.get('Country', 'United States')
+    # RESO sends absent fields as null as well as leaving them out
+    street = f"{listing.get('StreetNumber') or ''} {listing.get('StreetName') or ''}"
+    city = listing.get('City') or ''
+    state = listing.get('StateOrProvince') or ''
+    postal_code = listing.get('PostalCode') or ''
+    country = listing.get('Country') or 'United States'
     
     # Combine components into a complete address
     address_parts = [part for part in [street.strip(), city, state, postal_code, country] if part]
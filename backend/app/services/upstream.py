@@ -0,0 +1,191 @@
+"""
+Shared HTTP access to the external providers (RESO
+and its media host, Geoapify, Google Places)
+
+Every provider call goes through `request`, which reuses pooled connections
+and records latency and outcome metrics. UPSTREAM_MODE selects where calls go:
+
+- "live": to the provider
+- "record": to the provider, appending each exchange to UPSTREAM_FIXTURES_DIR
+- "replay": to a stand-in server serving the recorded exchanges, either the one
+  at REPLAY_SERVER_URL or one started inside the API process
+
+Calls are rate limited per provider (app/services/quota.py), and failed calls
+are retried and guarded by circuit breakers (app/services/resilience.py).
+"""
+
+import logging
+import re
+import time
+from typing import Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from app.core.config import settings
+from app.core.metrics import UPSTREAM_REQUESTS, UPSTREAM_RETRIES, upstream_call
+from app.services import quota
+from app.services.quota import QuotaExceededError
+from app.services.replay import (
+    SECRET_PARAMS,
+    FixtureRecorder,
+    UpstreamStandInServer,
+    load_fixtures,
+)
+from app.services.resilience import (
+    CircuitOpenError,
+    backoff_delay,
+    get_breaker,
+    is_retryable,
+    retry_after,
+)
+
+logger = logging.getLogger("real-estate-api")
+
+_session = requests.Session()
+_session.mount("https://", HTTPAdapter(pool_maxsize=settings.UPSTREAM_POOL_SIZE))
+_session.mount("http://", HTTPAdapter(pool_maxsize=settings.UPSTREAM_POOL_SIZE))
+
+_recorder = FixtureRecorder(settings.UPSTREAM_FIXTURES_DIR)
+_stand_in: Optional[UpstreamStandInServer] = None
+
+_SECRET_PATTERN = re.compile(r"\b(" + "|".join(sorted(SECRET_PARAMS)) + r")=[^&\s'\"]+")
+
+# Providers whose circuit breakers are reported before their first call
+PROVIDERS = ("reso", "reso_media", "geoapify", "google_places")
+for _provider in PROVIDERS:
+    get_breaker(_provider)
+
+
+def replay_url(provider: str, url: str) -> str:
+    """Address of `url` on the replay stand-in server"""
+    base = settings.REPLAY_SERVER_URL or (_stand_in.url if _stand_in else "")
+    if not base:
+        raise RuntimeError(
+            "UPSTREAM_MODE is 'replay' but no stand-in server is running"
+        )
+    parts = urlsplit(url)
+    query = f"?{parts.query}" if parts.query else ""
+    return f"{base.rstrip('/')}/{provider}{parts.path}{query}"
+
+
+def request(provider: str, method: str, url: str, **kwargs) -> requests.Response:
+    """
+    Call a provider and raise for error statuses
+    
+    Every attempt waits for the provider's rate limit (see app/services/quota.py).
+    Timeouts, connection errors, 429 and 5xx responses are retried and counted
+    by the provider's circuit breaker (see app/services/resilience.py).
+
+    Args:
+        provider: Provider name used for metrics, fixtures and the circuit breaker
+        method: HTTP method
+        url: Provider URL
+        **kwargs: Passed on to requests (params, json, headers, ...); timeout
+            defaults to UPSTREAM_CONNECT_TIMEOUT and UPSTREAM_READ_TIMEOUT
+
+    Returns:
+        The successful response
+
+    Raises:
+        CircuitOpenError: The provider's circuit is open
+        QuotaExceededError: The provider's quota leaves no room for the call
+        requests.exceptions.RequestException: The call failed after all retries
+    """
+    kwargs.setdefault(
+        "timeout", (settings.UPSTREAM_CONNECT_TIMEOUT, settings.UPSTREAM_READ_TIMEOUT)
+    )
+    if settings.UPSTREAM_MODE == "replay":
+        url = replay_url(provider, url)
+    breaker = get_breaker(provider)
+    attempt = 0
+    while True:
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            UPSTREAM_REQUESTS.inc(provider=provider, outcome="circuit_open")
+            raise
+        try:
+            quota.acquire(provider)
+        except QuotaExceededError:
+            breaker.abandon()
+            UPSTREAM_REQUESTS.inc(provider=provider, outcome="quota_exceeded")
+            raise
+        try:
+            with upstream_call(provider):
+                response = _session.request(method, url, **kwargs)
+                if settings.UPSTREAM_MODE == "record":
+                    _recorder.record(provider, response)
+                response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            if not is_retryable(e):
+                breaker.record_success()
+                raise
+            wait = retry_after(e.response)
+            if wait is not None and wait > settings.UPSTREAM_BACKOFF_MAX:
+                # Not worth holding the request for; fail
+                # fast until the provider is ready again
+                breaker.record_failure(open_for=wait)
+                raise
+            breaker.record_failure()
+            if attempt >= settings.UPSTREAM_RETRIES:
+                raise
+            if wait is None:
+                wait = backoff_delay(attempt)
+            attempt += 1
+            UPSTREAM_RETRIES.inc(provider=provider)
+            logger.info(
+                "Retrying %s call in %.2fs (attempt %s/%s): %s",
+                provider,
+                wait,
+                attempt,
+                settings.UPSTREAM_RETRIES,
+                redact(str(e)),
+            )
+            time.sleep(wait)
+            continue
+        except BaseException:
+            breaker.abandon()
+            raise
+        breaker.record_success()
+        return response
+
+
+def redact(text: str) -> str:
+    """Mask credentials in query strings quoted in error messages"""
+    return _SECRET_PATTERN.sub(r"\1=REDACTED", text)
+
+
+def start_replay() -> None:
+    """Start the in-process stand-in server when replaying without REPLAY_SERVER_URL"""
+    global _stand_in
+    if (
+        settings.UPSTREAM_MODE != "replay"
+        or settings.REPLAY_SERVER_URL
+        or _stand_in is not None
+    ):
+        return
+    fixtures = load_fixtures(settings.UPSTREAM_FIXTURES_DIR)
+    _stand_in = UpstreamStandInServer(
+        fixtures,
+        latency_ms=settings.REPLAY_LATENCY_MS,
+        jitter_ms=settings.REPLAY_JITTER_MS,
+        error_rate=settings.REPLAY_ERROR_RATE,
+        error_status=settings.REPLAY_ERROR_STATUS,
+        batch_job_ms=settings.REPLAY_BATCH_JOB_MS
+    ).start()
+    logger.info(
+        "Replaying %s recorded exchanges from %s at %s",
+        sum(len(exchanges) for exchanges in fixtures.values()),
+        settings.UPSTREAM_FIXTURES_DIR,
+        _stand_in.url,
+    )
+
+
+def stop_replay() -> None:
+    """Stop the in-process stand-in server"""
+    global _stand_in
+    if _stand_in is not None:
+        _stand_in.stop()
+        _stand_in = None
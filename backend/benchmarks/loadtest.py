@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+End-to-end load test of the API against replayed upstreams
+
+Starts the upstream stand-in server (synthetic fixtures unless --fixtures is
+given) and the API as separate processes, then replays the frontend's traffic:
+a burst of `/api/listings/active?limit=N` requests followed by the five
+`/api/places/*` category requests NearbyPlaces.js makes per listing. The same
+traffic runs three times:
+
+- cold: empty caches
+- warm: every geocoding and places result cached
+- stale: places entries aged past CACHE_EXPIRATION
+
+Throughput and p50/p95/p99 latency per route are printed and saved as JSON,
+named after the current commit, so runs can be compared.
+
+Run from backend/:
+    python -m benchmarks.loadtest --listings 100 --concurrency 16
+    python -m benchmarks.loadtest --compare benchmarks/results/<earlier run>.json
+"""
+
+import argparse
+import datetime
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+from app.core.config import settings
+from benchmarks.synthetic import make_listings, write_fixtures
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(BACKEND_DIR, "benchmarks", "results")
+
+# Category endpoints and radii requested per listing by NearbyPlaces.js
+PLACE_ROUTES = [
+    ("nearby", 1000),
+    ("schools", 1500),
+    ("hospitals", 2000),
+    ("grocery", 1500),
+    ("transportation", 1000),
+]
+
+Sample = Tuple[str, int, float]
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Percentile by linear interpolation between closest ranks"""
+    if not sorted_values:
+        return 0.0
+    rank = (len(sorted_values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (
+        rank - low
+    )
+
+
+def summarize(samples: List[Sample], duration: float) -> Dict[str, Any]:
+    """Throughput, error count and latency percentiles (ms), overall and per route"""
+    def stats(route_samples: List[Sample]) -> Dict[str, Any]:
+        latencies = sorted(seconds * 1000 for _, _, seconds in route_samples)
+        return {
+            "requests": len(route_samples),
+            "errors": sum(
+                1 for _, status, _ in route_samples if status >= 400 or status == 0
+            ),
+            "throughput_rps": round(len(route_samples) / duration, 2)
+            if duration
+            else 0.0,
+            "mean_ms": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "max_ms": round(latencies[-1], 2) if latencies else 0.0,
+        }
+
+    routes: Dict[str, List[Sample]] = {}
+    for sample in samples:
+        routes.setdefault(sample[0], []).append(sample)
+    return {
+        "duration_s": round(duration, 3),
+        **stats(samples),
+        "routes": {
+            route: stats(route_samples)
+            for route, route_samples in sorted(routes.items())
+        },
+    }
+
+
+class LoadClient:
+    """Issues requests from a thread pool, one pooled session per thread"""
+
+    def __init__(self, base_url: str, timeout: float):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.samples: List[Sample] = []
+        self._local = threading.local()
+        self._lock = threading.Lock()
+
+    def get(self, route: str, path: str, params: Dict[str, Any]) -> Optional[Any]:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        start = time.perf_counter()
+        status, body = 0, None
+        try:
+            response = session.get(
+                self.base_url + path, params=params, timeout=self.timeout
+            )
+            status = response.status_code
+            if status < 400:
+                body = response.json()
+        except requests.RequestException:
+            pass
+        with self._lock:
+            self.samples.append((route, status, time.perf_counter() - start))
+        return body
+
+
+def run_traffic(base_url: str, args: argparse.Namespace) -> Dict[str, Any]:
+    """
+    One round of frontend traffic: listings burst, then the per-listing places fan-out
+    """
+    client = LoadClient(base_url, args.timeout)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        burst = [
+            pool.submit(
+                client.get,
+                "/api/listings/active",
+                "/api/listings/active",
+                {"limit": args.listings},
+            )
+            for _ in range(args.burst)
+        ]
+        listings = (
+            next((future.result() for future in burst if future.result()), None) or []
+        )
+
+        fan_out = []
+        for listing in listings:
+            coordinates = listing.get("coordinates")
+            if not coordinates:
+                continue
+            location = f"{coordinates['lat']},{coordinates['lng']}"
+            for endpoint, radius in PLACE_ROUTES:
+                path = f"/api/places/{endpoint}"
+                fan_out.append(
+                    pool.submit(
+                        client.get, path, path, {"location": location, "radius": radius}
+                    )
+                )
+        for future in fan_out:
+            future.result()
+    return summarize(client.samples, time.perf_counter() - start)
+
+
+def age_places_cache(db_path: str) -> int:
+    """Make every places cache entry older than CACHE_EXPIRATION"""
+    conn = sqlite3.connect(db_path, timeout=30)
+    try:
+        cursor = conn.execute(
+            "UPDATE nearby_places SET timestamp = datetime('now', ?)",
+            (f"-{settings.CACHE_EXPIRATION + 86400} seconds",)
+        )
+        conn.commit()
+        return cursor.rowcount
+    finally:
+        conn.close()
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_ready(url: str, process: subprocess.Popen, timeout: float = 30) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(
+                f"Process exited with code {process.returncode} before becoming ready"
+            )
+        try:
+            requests.get(url, timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError(f"Timed out waiting for {url}")
+
+
+def git_commit() -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=BACKEND_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+        dirty = bool(
+            subprocess.run(
+                ["git", "status", "--porcelain", "--untracked-files=no"],
+                cwd=BACKEND_DIR,
+                capture_output=True,
+                text=True,
+            ).stdout.strip()
+        )
+        return {"commit": commit, "dirty": dirty}
+    except (OSError, subprocess.CalledProcessError):
+        return {"commit": "unknown", "dirty": False}
+
+
+def print_summary(name: str, result: Dict[str, Any]) -> None:
+    print(f"\n[{name}] {result['requests']} requests in {result['duration_s']}s "
+          f"({result['throughput_rps']} req/s, {result['errors']} errors)")
+    print(
+        f"  {'route':<28}{'req':>6}{'req/s':>9}"
+        f"{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'err':>6}"
+    )
+    for route, stats in result["routes"].items():
+        print(
+            f"  {route:<28}{stats['requests']:>6}{stats['throughput_rps']:>9}"
+            f"{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}{stats['errors']:>6}"
+        )
+
+
+def print_comparison(baseline: Dict[str, Any], current: Dict[str, Any]) -> None:
+    print(f"\nChange against {baseline['meta']['commit']} (p50 / p95 / p99):")
+    for scenario, result in current["scenarios"].items():
+        base_routes = baseline["scenarios"].get(scenario, {}).get("routes", {})
+        for route, stats in result["routes"].items():
+            base = base_routes.get(route)
+            if not base:
+                continue
+            changes = []
+            for key in ("p50_ms", "p95_ms", "p99_ms"):
+                change = (
+                    (stats[key] - base[key]) / base[key] * 100 if base[key] else 0.0
+                )
+                changes.append(f"{change:+.1f}%")
+            print(f"  {scenario:<6} {route:<28} {' / '.join(changes)}")
+
+
+def main():
+    """Main entry point for the load test"""
+    parser = argparse.ArgumentParser(
+        description="Load-test the API against replayed upstreams"
+    )
+    parser.add_argument(
+        "--listings",
+        type=int,
+        default=100,
+        help="Listings requested per /listings/active call",
+    )
+    parser.add_argument(
+        "--burst",
+        type=int,
+        default=5,
+        help="Concurrent /listings/active requests per round",
+    )
+    parser.add_argument(
+        "--concurrency", type=int, default=16, help="Concurrent client requests"
+    )
+    parser.add_argument(
+        "--timeout",
+        type=float,
+        default=60,
+        help="Client timeout per request in seconds",
+    )
+    parser.add_argument(
+        "--fixtures", help="Recorded fixtures directory (default: synthetic fixtures)"
+    )
+    parser.add_argument(
+        "--upstream-latency-ms",
+        type=float,
+        help="Fixed upstream latency (default: the latency stored in the fixtures)",
+    )
+    parser.add_argument("--upstream-jitter-ms", type=float, default=0)
+    parser.add_argument("--upstream-error-rate", type=float, default=0)
+    parser.add_argument(
+        "--workers", type=int, default=1, help="uvicorn worker processes"
+    )
+    parser.add_argument(
+        "--scenarios",
+        default="cold,warm,stale",
+        help="Comma-separated scenarios to run",
+    )
+    parser.add_argument(
+        "--output",
+        help="Results file (default: benchmarks/results/loadtest-<time>-<commit>.json)",
+    )
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="loadtest-")
+    processes: List[subprocess.Popen] = []
+    try:
+        fixtures_dir = args.fixtures
+        if not fixtures_dir:
+            fixtures_dir = os.path.join(work_dir, "fixtures")
+            write_fixtures(fixtures_dir, make_listings(args.listings))
+
+        upstream_port = free_port()
+        serve_cmd = [
+            sys.executable,
+            "upstream_fixtures.py",
+            "serve",
+            "--fixtures",
+            fixtures_dir,
+            "--port",
+            str(upstream_port),
+            "--jitter-ms",
+            str(args.upstream_jitter_ms),
+            "--error-rate",
+            str(args.upstream_error_rate),
+        ]
+        if args.upstream_latency_ms is not None:
+            serve_cmd += ["--latency-ms", str(args.upstream_latency_ms)]
+        env = dict(
+            os.environ, LOGS_DIR=os.path.join(work_dir, "logs"), LOG_LEVEL="WARNING"
+        )
+        processes.append(
+            subprocess.Popen(
+                serve_cmd, cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL
+            )
+        )
+        upstream_url = f"http://127.0.0.1:{upstream_port}"
+        wait_until_ready(upstream_url, processes[-1])
+
+        api_port = free_port()
+        db_path = os.path.join(work_dir, "database.db")
+        api_env = dict(
+            env,
+            UPSTREAM_MODE="replay",
+            REPLAY_SERVER_URL=upstream_url,
+            DB_PATH=db_path,
+            MAINTENANCE_ENABLED="false",
+        )
+        processes.append(
+            subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "uvicorn",
+                    "app.main:app",
+                    "--port",
+                    str(api_port),
+                    "--workers",
+                    str(args.workers),
+                    "--log-level",
+                    "warning",
+                    "--no-access-log",
+                ],
+                cwd=BACKEND_DIR,
+                env=api_env,
+            )
+        )
+        api_url = f"http://127.0.0.1:{api_port}"
+        wait_until_ready(f"{api_url}/api/health", processes[-1])
+
+        results = {
+            "meta": {
+                **git_commit(),
+                "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+                "listings": args.listings,
+                "burst": args.burst,
+                "concurrency": args.concurrency,
+                "workers": args.workers,
+                "fixtures": args.fixtures or "synthetic",
+                "upstream_latency_ms": args.upstream_latency_ms,
+                "upstream_jitter_ms": args.upstream_jitter_ms,
+                "upstream_error_rate": args.upstream_error_rate
+            },
+            "scenarios": {}
+        }
+        scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+        primed = False
+        for name in ("cold", "warm", "stale"):
+            if name not in scenarios:
+                continue
+            if name != "cold" and not primed:
+                run_traffic(api_url, args)  # fill the caches first
+            if name == "stale":
+                age_places_cache(db_path)
+            results["scenarios"][name] = run_traffic(api_url, args)
+            primed = True
+            print_summary(name, results["scenarios"][name])
+
+        output = args.output or os.path.join(
+            RESULTS_DIR,
+            f"loadtest-{datetime.datetime.now():%Y%m%d-%H%M%S}-{results['meta']['commit']}.json",
+        )
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults saved to {output}")
+
+        if args.compare:
+            with open(args.compare) as f:
+                print_comparison(json.load(f), results)
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks of the code that runs on every request
+
+Covers the places response transform, cache key and address generation, and
+the SQLite places and geocoding caches (hits, misses and writes) at growing
+row counts. Cache tables are filled with synthetic rows in bulk; the byte
+budgets are disabled so eviction doesn't interfere with the measurements.
+
+Each benchmark is timed in a calibrated loop, repeated several times, and
+reported as time per operation. Results are saved as JSON named after the
+current commit. With --baseline, the run is compared against an earlier
+results file and exits with status 1 if any benchmark got slower than the
+threshold allows, so it can gate a deploy.
+
+Run from backend/:
+    python -m benchmarks.microbench --rows 10000,100000,1000000
+    python -m benchmarks.microbench --baseline
+    benchmarks/results/<earlier run>.json --threshold 0.25
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.core.config import settings
+from app.models.database import (
+    GeocodingDatabase,
+    PlacesDatabase,
+    payload_size,
+    split_search_results,
+    store_place,
+)
+from app.services.address import canonical_address
+from app.services.places import PlacesClient
+from app.services.reso import get_address_from_listing
+from benchmarks.loadtest import RESULTS_DIR, git_commit
+from benchmarks.synthetic import (
+    CITIES,
+    PLACE_TYPES,
+    STREETS,
+    make_listings,
+    make_places_response,
+)
+
+# Radii used by the frontend for each place type
+RADII = {
+    "restaurant": 1000,
+    "school": 1500,
+    "hospital": 2000,
+    "supermarket": 1500,
+    "transit_station": 1000,
+}
+
+# Number of existing keys kept in memory to look up as cache hits
+HIT_SAMPLE_SIZE = 10000
+
+INSERT_BATCH = 10000
+
+# Places per cached search; the Places API returns at most 20 per page
+PLACES_PER_SEARCH = 20
+
+
+def measure(func: Callable[[int], Any], repeat: int, min_time: float) -> Dict[str, Any]:
+    """
+    Time `func(i)` per call
+
+    The loop count is doubled until one loop takes at least `min_time` seconds,
+    then the loop is timed `repeat` times.
+
+    Returns:
+        Median and minimum microseconds per call, and calls per second
+    """
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for i in range(loops):
+            func(i)
+        if time.perf_counter() - start >= min_time:
+            break
+        loops *= 2
+
+    timings = []
+    offset = loops
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for i in range(offset, offset + loops):
+            func(i)
+        timings.append((time.perf_counter() - start) / loops)
+        offset += loops
+    timings.sort()
+    median = timings[len(timings) // 2]
+    return {
+        "median_us": round(median * 1e6, 3),
+        "min_us": round(timings[0] * 1e6, 3),
+        "ops_per_s": round(1 / median, 1) if median else 0.0,
+        "loops": loops,
+        "repeat": repeat
+    }
+
+
+def location_for(index: int) -> str:
+    """Distinct coordinates spread over the synthetic cities"""
+    _, _, _, lat, lng = CITIES[index % len(CITIES)]
+    return f"{lat + (index % 1000) * 0.0002:.6f},{lng + (index // 1000) * 0.0002:.6f}"
+
+
+def address_for(index: int) -> str:
+    city, state, zip_prefix, _, _ = CITIES[index % len(CITIES)]
+    street = STREETS[index % len(STREETS)]
+    return f"{100 + index} {street}, {city}, {state}, {zip_prefix}{index % 100:02d}, US"
+
+
+class SyntheticCache:
+    """
+    Places and geocoding caches in a scratch database, grown in bulk to a row count
+    """
+
+    def __init__(self, db_path: str, places_per_search: int, seed: int = 0):
+        settings.DB_PATH = db_path
+        settings.PLACES_CACHE_MAX_BYTES = 0
+        settings.GEOCODING_CACHE_MAX_BYTES = 0
+        self.places_db = PlacesDatabase()
+        self.geocoding_db = GeocodingDatabase()
+        self.client = PlacesClient()
+        self.rows = 0
+        self.hit_keys: List[str] = []
+        self.hit_addresses: List[str] = []
+
+        rng = random.Random(seed)
+        # A small pool of real payloads; rows share them to keep filling fast
+        self.payloads = [
+            self.client._transform_places_response(
+                make_places_response(30.27, -97.74, place_type, places_per_search, rng))
+            for place_type in PLACE_TYPES
+        ]
+        # Rows reference the places of these payloads, stored once
+        cursor = self.places_db.conn.cursor()
+        self.stored = []
+        for payload in self.payloads:
+            envelope, places = split_search_results(payload)
+            place_ids = json.dumps(
+                [store_place(cursor, place) for place in places], separators=(",", ":")
+            )
+            self.stored.append((envelope, place_ids))
+        self.places_db.conn.commit()
+
+    def place_key(self, index: int) -> str:
+        place_type = PLACE_TYPES[index % len(PLACE_TYPES)]
+        return self.client.generate_location_key(
+            location_for(index), RADII[place_type], place_type
+        )
+
+    def grow(self, rows: int) -> float:
+        """
+        Insert rows until both caches hold `rows` entries; returns the seconds taken
+        """
+        start = time.perf_counter()
+        step = max(1, rows // HIT_SAMPLE_SIZE)
+        now = time.time()
+        for batch_start in range(self.rows, rows, INSERT_BATCH):
+            places, addresses = [], []
+            for index in range(batch_start, min(batch_start + INSERT_BATCH, rows)):
+                place_type = PLACE_TYPES[index % len(PLACE_TYPES)]
+                values = (
+                    self.place_key(index),
+                    location_for(index),
+                    RADII[place_type],
+                    place_type,
+                    None,
+                    *self.stored[index % len(self.stored)],
+                )
+                places.append(values + (payload_size(*values), now))
+                lat, lng = map(float, location_for(index).split(","))
+                address = address_for(index)
+                addresses.append(
+                    (
+                        canonical_address(address),
+                        1,
+                        lat,
+                        lng,
+                        address,
+                        str(100 + index),
+                        STREETS[index % len(STREETS)],
+                        address,
+                        payload_size(address) * 3,
+                        now,
+                    )
+                )
+            self.places_db.conn.executemany(
+                """
+                INSERT OR REPLACE INTO nearby_places
+                (location_key, location, radius, type, keyword, results, place_ids,
+                 timestamp, size, last_accessed, hit_count)
+                VALUES (?, ?, ?, ?, ?, ?, ?, datetime('now'), ?, ?, 0)
+                """,
+                places,
+            )
+            self.places_db.conn.commit()
+            self.geocoding_db.conn.executemany(
+                """
+                INSERT OR REPLACE INTO geocoding_results
+                (address, success, lat, lon, formatted_address, house_number, street,
+                 display_address, size, last_accessed, hit_count)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0)
+                """,
+                addresses,
+            )
+            self.geocoding_db.conn.commit()
+        self.rows = rows
+
+        # Hit keys are spread evenly over all rows, not just the newest ones
+        indexes = range(0, rows, step)
+        self.hit_keys = [self.place_key(index) for index in indexes]
+        self.hit_addresses = [address_for(index) for index in indexes]
+        return time.perf_counter() - start
+
+    def close(self) -> None:
+        self.places_db.close()
+        self.geocoding_db.close()
+
+
+def transform_benchmarks(
+    places_per_search: List[int],
+) -> Dict[str, Callable[[int], Any]]:
+    """CPU-only benchmarks of code run for every request"""
+    client = PlacesClient()
+    rng = random.Random(0)
+    listings = make_listings(100)
+    benchmarks: Dict[str, Callable[[int], Any]] = {}
+    for count in places_per_search:
+        response = make_places_response(30.27, -97.74, "restaurant", count, rng)
+        benchmarks[f"transform_places_response[{count}]"] = (
+            lambda i, response=response: client._transform_places_response(response))
+    benchmarks["generate_location_key"] = (
+        lambda i: client.generate_location_key(location_for(i), 1500, "school"))
+    benchmarks["get_address_from_listing"] = (
+        lambda i: get_address_from_listing(listings[i % len(listings)]))
+    addresses = [get_address_from_listing(listing) for listing in listings]
+    benchmarks["canonical_address"] = lambda i: canonical_address(
+        addresses[i % len(addresses)]
+    )
+    return benchmarks
+
+
+def cache_benchmarks(cache: SyntheticCache) -> Dict[str, Callable[[int], Any]]:
+    """Cache reads and writes against the current row count"""
+    rows = cache.rows
+    places_db, geocoding_db = cache.places_db, cache.geocoding_db
+    hit_keys, hit_addresses = cache.hit_keys, cache.hit_addresses
+    payload = cache.payloads[0]
+    # Writes and misses use keys past the filled range; the offset keeps rounds at
+    # different row counts apart
+    fresh = 10 ** 9 + rows
+
+    def places_set(i: int) -> None:
+        index = fresh + i
+        place_type = PLACE_TYPES[index % len(PLACE_TYPES)]
+        places_db.cache_places(
+            cache.place_key(index),
+            location_for(index),
+            RADII[place_type],
+            place_type,
+            None,
+            payload,
+        )
+
+    def geocoding_save(i: int) -> None:
+        address = address_for(fresh + i)
+        geocoding_db.save_geocoding_result(
+            {
+                "address": address,
+                "success": True,
+                "coordinates": {"lat": 30.27, "lon": -97.74},
+                "formatted_address": address,
+                "address_components": {
+                    "house_number": str(fresh + i),
+                    "city": "Austin",
+                    "state": "Texas",
+                },
+                "place_id": "",
+            }
+        )
+
+    return {
+        f"places_get_hit@{rows}": lambda i: places_db.get_cached_places(
+            hit_keys[i % len(hit_keys)]
+        ),
+        f"places_get_miss@{rows}": lambda i: places_db.get_cached_places(
+            f"missing-{fresh + i}"
+        ),
+        f"places_set@{rows}": places_set,
+        f"geocoding_get_hit@{rows}": lambda i: geocoding_db.get_coordinates(
+            hit_addresses[i % len(hit_addresses)]
+        ),
+        f"geocoding_get_miss@{rows}": lambda i: geocoding_db.get_coordinates(
+            f"missing {fresh + i}"
+        ),
+        f"geocoding_save@{rows}": geocoding_save,
+    }
+
+
+def compare(
+    baseline: Dict[str, Any], current: Dict[str, Any], threshold: float
+) -> List[str]:
+    """
+    Print the change per benchmark and return the ones slower than the threshold allows
+
+    Minimum times are compared: they are the least affected by other load on the
+        machine.
+    """
+    print(
+        f"\nChange against {baseline['meta']['commit']} (threshold +{threshold:.0%}):"
+    )
+    regressions = []
+    for name, result in current["benchmarks"].items():
+        base = baseline["benchmarks"].get(name)
+        if not base or not base["min_us"]:
+            print(f"  {name:<44}{'new':>10}")
+            continue
+        change = result["min_us"] / base["min_us"] - 1
+        flag = ""
+        if change > threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"  {name:<44}{change:>+10.1%}{flag}")
+    return regressions
+
+
+def main():
+    """Main entry point for the micro-benchmarks"""
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmark the per-request hot paths"
+    )
+    parser.add_argument("--rows", default="10000,100000,1000000",
+                        help="Comma-separated cache row counts to benchmark at")
+    parser.add_argument(
+        "--places",
+        default="20,60",
+        help="Comma-separated places per response for the transform benchmarks",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=5, help="Timed loops per benchmark"
+    )
+    parser.add_argument(
+        "--min-time", type=float, default=0.1, help="Minimum seconds per timed loop"
+    )
+    parser.add_argument(
+        "--filter", help="Only run benchmarks whose name contains this text"
+    )
+    parser.add_argument(
+        "--db-dir", help="Directory for the scratch database (default: a temp dir)"
+    )
+    parser.add_argument(
+        "--output",
+        help="Results file "
+        "(default: benchmarks/results/microbench-<time>-<commit>.json)",
+    )
+    parser.add_argument(
+        "--baseline", help="Earlier results file to check for regressions against"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Allowed slowdown against the baseline as a fraction (default: 0.25)",
+    )
+    args = parser.parse_args()
+
+    row_counts = sorted(int(rows) for rows in args.rows.split(",") if rows.strip())
+    places_counts = [int(count) for count in args.places.split(",") if count.strip()]
+
+    results: Dict[str, Any] = {
+        "meta": {
+            **git_commit(),
+            "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "rows": row_counts,
+            "repeat": args.repeat,
+            "min_time": args.min_time
+        },
+        "benchmarks": {}
+    }
+
+    def run(benchmarks: Dict[str, Callable[[int], Any]]) -> None:
+        for name, func in benchmarks.items():
+            if args.filter and args.filter not in name:
+                continue
+            result = measure(func, args.repeat, args.min_time)
+            results["benchmarks"][name] = result
+            print(
+                f"  {name:<44}{result['median_us']:>12.2f} us"
+                f"{result['ops_per_s']:>14.1f} ops/s"
+            )
+
+    print("Transforms and keys:")
+    run(transform_benchmarks(places_counts))
+
+    work_dir = tempfile.mkdtemp(prefix="microbench-", dir=args.db_dir)
+    cache: Optional[SyntheticCache] = None
+    try:
+        cache = SyntheticCache(os.path.join(work_dir, "database.db"), PLACES_PER_SEARCH)
+        for rows in row_counts:
+            seconds = cache.grow(rows)
+            print(f"\nCaches at {rows} rows (filled in {seconds:.1f}s):")
+            run(cache_benchmarks(cache))
+    finally:
+        if cache is not None:
+            cache.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR,
+        f"microbench-{datetime.datetime.now():%Y%m%d-%H%M%S}-{results['meta']['commit']}.json",
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(json.load(f), results, args.threshold)
+        if regressions:
+            print(
+                f"\n{len(regressions)} benchmark(s) regressed: {', '.join(regressions)}"
+            )
+            sys.exit(1)
+        print("\nNo regressions")
+
+
+if __name__ == "__main__":
+    main()
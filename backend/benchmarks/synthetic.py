@@ -0,0 +1,282 @@
+"""
+Synthetic data for benchmarks
+
+Listings, geocoding results and places payloads shaped like the RESO,
+Geoapify and Google Places (New) responses, and upstream fixtures built from
+them for the replay stand-in server (see app/services/replay.py). Everything is
+derived from a seed, so runs are reproducible.
+"""
+
+import datetime
+import json
+import os
+import random
+from typing import Any, Dict, List, Tuple
+from urllib.parse import urlsplit
+
+from app.core.config import settings
+
+STREETS = [
+    "Main St",
+    "Oak Ave",
+    "Congress Ave",
+    "Lamar Blvd",
+    "Guadalupe St",
+    "Riverside Dr",
+    "Burnet Rd",
+    "Cesar Chavez St",
+    "Manor Rd",
+    "South 1st St",
+    "Airport Blvd",
+    "Red River St",
+]
+CITIES = [
+    ("Austin", "TX", "787", 30.27, -97.74),
+    ("Round Rock", "TX", "786", 30.51, -97.68),
+    ("Georgetown", "TX", "786", 30.63, -97.68),
+    ("Pflugerville", "TX", "786", 30.44, -97.62),
+]
+PLACE_TYPES = ["restaurant", "school", "hospital", "supermarket", "transit_station"]
+PRICE_LEVELS = [
+    "PRICE_LEVEL_INEXPENSIVE",
+    "PRICE_LEVEL_MODERATE",
+    "PRICE_LEVEL_EXPENSIVE",
+]
+WEEKDAYS = [
+    "Monday",
+    "Tuesday",
+    "Wednesday",
+    "Thursday",
+    "Friday",
+    "Saturday",
+    "Sunday",
+]
+
+
+# Fraction of listings sent without Latitude/Longitude, which the API has to geocode
+MISSING_COORDINATES_RATE = 0.3
+
+
+def make_listing(index: int, rng: random.Random) -> Dict[str, Any]:
+    """A RESO Property record with the fields the API reads plus typical payload bulk"""
+    city, state, zip_prefix, lat, lng = rng.choice(CITIES)
+    listing = {
+        "ListingKey": f"SYN{index:07d}",
+        "ListingId": f"{1000000 + index}",
+        "StandardStatus": "Active",
+        "PropertyType": "Residential",
+        "StreetNumber": str(rng.randint(100, 9999)),
+        "StreetName": rng.choice(STREETS),
+        "UnitNumber": str(rng.randint(1, 400)) if rng.random() < 0.2 else None,
+        "City": city,
+        "StateOrProvince": state,
+        "PostalCode": f"{zip_prefix}{rng.randint(0, 99):02d}",
+        "Country": "US",
+        "Latitude": round(lat + rng.uniform(-0.1, 0.1), 6),
+        "Longitude": round(lng + rng.uniform(-0.1, 0.1), 6),
+        "ListPrice": rng.randrange(150000, 2500000, 1000),
+        "BedroomsTotal": rng.randint(1, 6),
+        "BathroomsTotalInteger": rng.randint(1, 5),
+        "LivingArea": rng.randint(600, 6000),
+        "LotSizeAcres": round(rng.uniform(0.05, 2.0), 2),
+        "YearBuilt": rng.randint(1920, 2024),
+        "PublicRemarks": " ".join(
+            rng.choice(
+                [
+                    "Spacious",
+                    "updated",
+                    "kitchen",
+                    "with",
+                    "light",
+                    "open",
+                    "floor",
+                    "plan",
+                    "near",
+                    "park",
+                    "and",
+                    "schools",
+                ]
+            )
+            for _ in range(90)
+        ),
+        "Media": [
+            {"MediaURL": f"https://example.com/media/{index}/{n}.jpg", "Order": n}
+            for n in range(12)
+        ],
+        # Spread over 90 days without drawing from
+        # rng, so the other fields stay as they were
+        "OnMarketDate": (
+            datetime.date(2025, 1, 1) + datetime.timedelta(days=index * 37 % 90)
+        ).isoformat(),
+    }
+    if rng.random() < MISSING_COORDINATES_RATE:
+        listing["Latitude"] = listing["Longitude"] = None
+    return listing
+
+
+def listing_location(listing: Dict[str, Any]) -> Tuple[float, float]:
+    """Where a listing is, also for listings sent without coordinates"""
+    if listing.get("Latitude") is not None and listing.get("Longitude") is not None:
+        return listing["Latitude"], listing["Longitude"]
+    _, _, _, lat, lng = next(city for city in CITIES if city[0] == listing["City"])
+    rng = random.Random(listing["ListingKey"])
+    return round(lat + rng.uniform(-0.1, 0.1), 6), round(
+        lng + rng.uniform(-0.1, 0.1), 6
+    )
+
+
+def make_listings(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    return [make_listing(index, rng) for index in range(count)]
+
+
+def make_geocode_response(listing: Dict[str, Any]) -> Dict[str, Any]:
+    """A Geoapify search response locating the listing"""
+    lat, lng = listing_location(listing)
+    return {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "properties": {
+                    "lat": lat,
+                    "lon": lng,
+                    "formatted": (
+                        f"{listing['StreetNumber']} {listing['StreetName']}, "
+                        f"{listing['City']}, {listing['StateOrProvince']} "
+                        f"{listing['PostalCode']}, United States of America"
+                    ),
+                    "housenumber": listing["StreetNumber"],
+                    "street": listing["StreetName"],
+                    "city": listing["City"],
+                    "county": "Travis County",
+                    "state": "Texas",
+                    "country": "United States",
+                    "postcode": listing["PostalCode"],
+                    "place_id": f"geo-{listing['ListingKey']}",
+                    "result_type": "building",
+                    "rank": {"confidence": 1, "match_type": "full_match"},
+                },
+                "geometry": {"type": "Point", "coordinates": [lng, lat]},
+            }
+        ],
+        "query": {"text": listing["StreetName"]},
+    }
+
+
+def make_place(
+    lat: float, lng: float, place_type: str, rng: random.Random
+) -> Dict[str, Any]:
+    """A Google Places (New) place near a location"""
+    place = {
+        "id": "ChIJ"
+        + "".join(
+            rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789")
+            for _ in range(23)
+        ),
+        "displayName": {
+            "text": f"{place_type.replace('_', ' ').title()} {rng.randint(1, 999)}",
+            "languageCode": "en",
+        },
+        "formattedAddress": (
+            f"{rng.randint(100, 9999)} {rng.choice(STREETS)}, "
+            f"Austin, TX 787{rng.randint(0, 99):02d}, USA"
+        ),
+        "location": {
+            "latitude": round(lat + rng.uniform(-0.02, 0.02), 7),
+            "longitude": round(lng + rng.uniform(-0.02, 0.02), 7),
+        },
+        "rating": round(rng.uniform(2.5, 5.0), 1),
+        "userRatingCount": rng.randint(1, 4000),
+        "types": [place_type, "point_of_interest", "establishment"],
+    }
+    if rng.random() < 0.8:
+        place["regularOpeningHours"] = {
+            "openNow": rng.random() < 0.6,
+            "weekdayDescriptions": [f"{day}: 8:00 AM – 9:00 PM" for day in WEEKDAYS]
+        }
+    if place_type == "restaurant":
+        place["priceLevel"] = rng.choice(PRICE_LEVELS)
+    return place
+
+
+def make_places_response(lat: float, lng: float, place_type: str, count: int,
+                         rng: random.Random) -> Dict[str, Any]:
+    return {"places": [make_place(lat, lng, place_type, rng) for _ in range(count)]}
+
+
+def _exchange(method: str, url: str, query: List[List[str]], response: Dict[str, Any],
+              elapsed_ms: float, body: str = None) -> Dict[str, Any]:
+    return {
+        "method": method,
+        "path": urlsplit(url).path,
+        "query": query,
+        "body": body,
+        "status": 200,
+        "content_type": "application/json",
+        "elapsed_ms": elapsed_ms,
+        "response": json.dumps(response)
+    }
+
+
+def write_fixtures(
+    directory: str,
+    listings: List[Dict[str, Any]],
+    places_per_search: int = 20,
+    places_responses: int = 50,
+    seed: int = 0,
+) -> Dict[str, int]:
+    """
+    Write upstream fixtures for the given listings
+
+    RESO serves all listings for any active-listings query, Geoapify locates each
+    listing's address exactly (including listings sent with coordinates), and places
+    searches are answered in turn from a pool of `places_responses` responses of
+    `places_per_search` places each.
+
+    Returns:
+        Number of exchanges written per provider
+    """
+    from app.services.reso import get_address_from_listing
+
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    reso_url = f"{settings.RESO_BASE_URL}actris_ref/Property"
+    exchanges = {
+        "reso": [_exchange("GET", reso_url, [], {"value": listings}, 400.0)],
+        "geoapify": [
+            _exchange(
+                "GET",
+                settings.GEOAPIFY_BASE_URL,
+                [["text", get_address_from_listing(listing)]],
+                make_geocode_response(listing),
+                round(rng.uniform(80, 200), 1),
+            )
+            for listing in listings
+        ],
+        "google_places": [
+            _exchange(
+                "POST",
+                settings.PLACES_API_BASE_URL,
+                [],
+                make_places_response(
+                    *listing_location(listing),
+                    PLACE_TYPES[n % len(PLACE_TYPES)],
+                    places_per_search,
+                    rng
+                ),
+                round(rng.uniform(150, 350), 1),
+            )
+            for n, listing in enumerate(
+                rng.choice(listings) for _ in range(places_responses)
+            )
+        ],
+    }
+    for provider, provider_exchanges in exchanges.items():
+        with open(os.path.join(directory, f"{provider}.jsonl"), "w") as f:
+            for exchange in provider_exchanges:
+                f.write(json.dumps(exchange) + "\n")
+    return {
+        provider: len(provider_exchanges)
+        for provider, provider_exchanges in exchanges.items()
+    }
@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Command-line script to export and import cache snapshots
+Use it to warm-start a new API node from the cache of a running one
+"""
+
+import argparse
+import json
+import sys
+
+from app.core.snapshot import SnapshotError, export_snapshot, import_snapshot
+from clear_cache import configure_logging
+
+
+def main():
+    """Main entry point for the cache snapshot script"""
+    parser = argparse.ArgumentParser(
+        description="Export or import a snapshot of the geocoding and places caches"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser(
+        "export", help="Write the live cache entries to a snapshot file"
+    )
+    export_parser.add_argument("path", help="Snapshot file to write")
+    import_parser = subparsers.add_parser(
+        "import", help="Load a snapshot file into the local cache"
+    )
+    import_parser.add_argument("path", help="Snapshot file to read")
+    parser.add_argument("--json", action="store_true", help="Output results as JSON")
+    args = parser.parse_args()
+
+    configure_logging()
+
+    try:
+        if args.command == "export":
+            result = export_snapshot(args.path)
+        else:
+            result = import_snapshot(args.path)
+    except SnapshotError as e:
+        print(f"Invalid snapshot: {e}")
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        verb = "Exported" if args.command == "export" else "Imported"
+        print(
+            f"{verb} {result['entries']['places']} places searches "
+            f"({result['entries'].get('stored_places', 0)} distinct places) and "
+            f"{result['entries']['geocoding']} geocoding entries "
+            f"in {result['processing_time']}"
+        )
+        if "checksum" in result:
+            print(
+                f"- Snapshot size: {result['size']} bytes, sha256 {result['checksum']}"
+            )
+
+if __name__ == "__main__":
+    main()
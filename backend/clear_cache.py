@@ -1,39 +1,105 @@
 #!/usr/bin/env python3
 """
 Command-line script to clear expired cache entries
+This can be run as a scheduled task (e.g., with cron); the API server also runs
+the same maintenance in-process, see MAINTENANCE_* settings
 """
 
 import argparse
 import json
-from app.core.maintenance import clear_expired_cache
+import logging
+import os
+
+from app.core.config import settings
+from app.core.maintenance import (
+    clear_expired_cache,
+    enable_incremental_vacuum,
+    reconcile_cache_statistics,
+)
+
+
+def configure_logging():
+    """Log to the cache maintenance log file and to the console"""
+    os.makedirs(settings.LOGS_DIR, exist_ok=True)
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(
+                os.path.join(settings.LOGS_DIR, "cache_maintenance.log")
+            ),
+            logging.StreamHandler(),
+        ],
+    )
+
+def entry_counts(counts):
+    """Entry counts per cache type, e.g. '3 places, 0 photos, 1 media'"""
+    return ", ".join(
+        f"{counts[cache_type]} {cache_type}"
+        for cache_type in ("places", "photos", "media")
+    )
 
 def main():
     """Main entry point for the cache maintenance script"""
     parser = argparse.ArgumentParser(description="Clear expired cache entries from the database")
     parser.add_argument("--dry-run", action="store_true", help="Don't actually delete entries, just report")
     parser.add_argument("--json", action="store_true", help="Output results as JSON")
+    parser.add_argument(
+        "--enable-incremental-vacuum",
+        action="store_true",
+        help="Convert the database to auto_vacuum=INCREMENTAL (one-off full VACUUM)",
+    )
+    parser.add_argument(
+        "--reconcile-stats",
+        action="store_true",
+        help="Recompute cache statistics with a full scan of the cache tables",
+    )
     args = parser.parse_args()
-    
+
+    configure_logging()
+
+    if args.enable_incremental_vacuum:
+        converted = enable_incremental_vacuum()
+        print("Database converted to incremental vacuum" if converted
+              else "Database already uses incremental vacuum")
+        return
+
+    if args.reconcile_stats:
+        result = reconcile_cache_statistics()
+        if args.json:
+            print(json.dumps(result, indent=2))
+        else:
+            for name, categories in result.items():
+                entries = sum(stats["entries"] for stats in categories.values())
+                size = sum(stats["bytes"] for stats in categories.values())
+                print(f"- {name}: {entries} entries ({size} bytes)")
+        return
+
     # Run the cache maintenance
     result = clear_expired_cache(dry_run=args.dry_run)
-    
+
     # Output as JSON if requested
     if args.json:
         print(json.dumps(result, indent=2))
+    elif 'error' in result:
+        print(f"Cache maintenance failed: {result['error']}")
     else:
         # Print a human-readable summary
         print(f"Cache maintenance summary:")
-        print(f"- Total entries: {result['total']['places']} places ({result['total']['size']})")
-        
+        total = result['total']
+        print(f"- Total entries: {entry_counts(total)} ({total['size']})")
+
         if 'deleted' in result and result['deleted']:
-            print(f"- Deleted: {result['deleted']['places']} places ({result['deleted']['size']})")
+            deleted = result['deleted']
+            print(f"- Deleted: {entry_counts(deleted)} ({deleted['size']})")
         elif args.dry_run:
-            print(f"- Would delete: {result['expired']['places']} places ({result['expired']['size']})")
-        
-        print(f"- Remaining: {result['remaining']['places']} places")
-        
+            expired = result['expired']
+            print(f"- Would delete: {entry_counts(expired)} ({expired['size']})")
+
+        print(f"- Remaining: {entry_counts(result['remaining'])}")
+
         if 'processing_time' in result:
             print(f"- Processing time: {result['processing_time']}")
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
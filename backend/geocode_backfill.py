@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Command-line script to warm the geocoding cache through the Geoapify batch API
+Addresses come from a file (one per line) or from the active RESO listings;
+an interrupted run picks up its submitted jobs when started again
+"""
+
+import argparse
+import json
+import sys
+from typing import List
+
+from app.core.config import settings
+from app.services.batch_geocoding import DEFAULT_STATE_PATH, run_backfill
+from app.services.reso import RESOClient, get_address_from_listing
+from clear_cache import configure_logging
+
+
+def reso_addresses(dataset_id: str, limit: int) -> List[str]:
+    """Addresses of up to `limit` active listings"""
+    listings = RESOClient(dataset_id=dataset_id).iter_active_residential_listings(limit)
+    return list(filter(None, map(get_address_from_listing, listings)))
+
+def main():
+    """Main entry point for the geocoding backfill script"""
+    parser = argparse.ArgumentParser(
+        description="Geocode addresses in bulk into the geocoding cache"
+    )
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--file", help="File with one address per line")
+    source.add_argument(
+        "--reso",
+        type=int,
+        metavar="LIMIT",
+        help="Geocode up to LIMIT active RESO listings",
+    )
+    parser.add_argument(
+        "--dataset", default="actris_ref", help="RESO dataset for --reso"
+    )
+    parser.add_argument(
+        "--state",
+        default=DEFAULT_STATE_PATH,
+        help="File recording submitted jobs, for resuming an interrupted run",
+    )
+    parser.add_argument("--chunk-size", type=int, default=settings.GEOCODING_BATCH_SIZE,
+                        help="Addresses per batch job")
+    parser.add_argument("--json", action="store_true", help="Output results as JSON")
+    args = parser.parse_args()
+
+    configure_logging()
+
+    if args.file:
+        with open(args.file) as f:
+            addresses = [line for line in f if line.strip()]
+    elif args.reso:
+        addresses = reso_addresses(args.dataset, args.reso)
+    else:
+        # Only finish the jobs of an interrupted run
+        addresses = []
+
+    result = run_backfill(addresses, state_path=args.state, chunk_size=args.chunk_size)
+
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print("Geocoding backfill summary:")
+        print(
+            f"- Addresses: {result.get('addresses', 0)} "
+            f"({result.get('to_geocode', 0)} not cached)"
+        )
+        print(
+            f"- Jobs: {result['submitted_jobs']} submitted, "
+            f"{result['resumed_jobs']} resumed"
+        )
+        print(f"- Geocoded: {result['geocoded']} ({result['failed']} without a match)")
+        print(f"- Processing time: {result['processing_time']}")
+        if "error" in result:
+            print(f"Stopped early: {result['error']}")
+            print(
+                f"- {result['pending_jobs']} jobs left; "
+                f"run again with --state {args.state} to resume"
+            )
+    if "error" in result:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import os
+import sys
+
+import pytest
+
+# Tests import the application as `app`, like the scripts in backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.config import settings  # noqa: E402
+from app.models.database import access_log  # noqa: E402
+from app.services.amenities import seen_listings  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def isolated_settings(tmp_path, monkeypatch):
+    """
+    Point the SQLite cache and file stores at a fresh directory, with maintenance off
+    """
+    monkeypatch.setattr(settings, "DB_PATH", str(tmp_path / "database.db"))
+    monkeypatch.setattr(settings, "MAINTENANCE_ENABLED", False)
+    monkeypatch.setattr(settings, "UPSTREAM_FIXTURES_DIR", str(tmp_path / "fixtures"))
+    # Hits and listings noted against the previous test's database
+    access_log.discard()
+    seen_listings.take()
+    yield
@@ -0,0 +1,62 @@
+import pytest
+
+from app.models.database import GeocodingDatabase
+from app.services.address import canonical_address
+from app.services.coordinates import SOURCE_CACHE, SOURCE_SAME_STREET, resolve_locally
+
+
+@pytest.mark.parametrize("address", [
+    "123 Main Street Apt 4, Austin, TX 78701-1234, USA",
+    "123  MAIN ST, Austin, Texas, 78701",
+    "123 MAIN ST, Austin TX 78701",
+    "123 Main St., Austin Texas, 78701",
+])
+def test_spellings_share_a_canonical_address(address):
+    assert canonical_address(address) == "123 MAIN ST, AUSTIN, TX 78701"
+
+
+@pytest.mark.parametrize("address, expected", [
+    ("1 Park Ave, New York New York 10001", "1 PARK AVE, NEW YORK, NY 10001"),
+    ("1 Main St, Kansas City, MO", "1 MAIN ST, KANSAS CITY, MO"),
+    ("1 Main St, Washington, DC 20001", "1 MAIN ST, WASHINGTON, DC 20001"),
+    ("1 Main St, Charleston, West Virginia", "1 MAIN ST, CHARLESTON, WV"),
+    ("9 Oak Dr, Portland OR", "9 OAK DR, PORTLAND, OR"),
+])
+def test_state_is_split_from_the_city(address, expected):
+    assert canonical_address(address) == expected
+
+
+@pytest.mark.parametrize("address", [None, "", " , "])
+def test_missing_address_has_empty_key(address):
+    assert canonical_address(address) == ""
+
+
+def test_units_of_a_street_address_share_a_key():
+    assert canonical_address("100 Congress Ave Unit 4, Austin, TX") == \
+        canonical_address("100 Congress Avenue #12, Austin, TX") == \
+        canonical_address("100 Congress Ave, Austin, TX")
+
+
+def test_other_units_resolve_from_one_cache_entry():
+    # Units are not part of the key, so one entry serves every unit
+    geocoding_db = GeocodingDatabase()
+    try:
+        geocoding_db.save_geocoding_result(
+            {
+                "address": "100 Congress Ave Unit 4, Austin, TX",
+                "success": True,
+                "coordinates": {"lat": 30.26, "lon": -97.74},
+                "formatted_address": "100 Congress Ave",
+                "address_components": {},
+                "place_id": "x",
+            }
+        )
+        same_unit = resolve_locally({}, "100 Congress Ave #4, Austin, TX", geocoding_db)
+        other_unit = resolve_locally(
+            {}, "100 Congress Avenue Apt 12, Austin, TX", geocoding_db
+        )
+    finally:
+        geocoding_db.close()
+
+    assert same_unit == ({"lat": 30.26, "lng": -97.74}, SOURCE_CACHE)
+    assert other_unit == ({"lat": 30.26, "lng": -97.74}, SOURCE_SAME_STREET)
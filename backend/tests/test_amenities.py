@@ -0,0 +1,73 @@
+import sqlite3
+
+from app.core.config import settings
+from app.core.maintenance import CacheMaintenance
+from app.models.database import AmenityScoreDatabase, PlacesDatabase
+from app.services.amenities import score_listings
+
+# A listing next to a cached school, and one far from any cached place
+NEAR = ("near", 30.2672, -97.7431)
+FAR = ("far", 30.5000, -97.5000)
+
+
+def cache_school():
+    places_db = PlacesDatabase()
+    try:
+        places_db.cache_places("schools", "30.2672,-97.7431", 1500, "school", None, {
+            "status": "OK",
+            "results": [{"place_id": "school", "name": "School", "types": ["school"],
+                         "geometry": {"location": {"lat": 30.2680, "lng": -97.7431}}}]
+        })
+    finally:
+        places_db.close()
+
+
+def score_rows():
+    conn = sqlite3.connect(settings.DB_PATH)
+    try:
+        return {key: school for key, school in
+                conn.execute("SELECT listing_key, school FROM amenity_scores")}
+    finally:
+        conn.close()
+
+
+def score(listings):
+    # The score table is opened first, like the request path does
+    AmenityScoreDatabase().close()
+    places_db = PlacesDatabase()
+    try:
+        return score_listings(places_db, listings)
+    finally:
+        places_db.close()
+
+
+def test_scoring_a_request_writes_nothing_until_maintenance():
+    cache_school()
+
+    scores = score([NEAR, FAR])
+
+    assert scores["near"]["school"] > 0
+    assert score_rows() == {}
+
+    CacheMaintenance().run_tick()
+
+    rows = score_rows()
+    assert rows["near"] == scores["near"]["school"]
+    assert "far" in rows
+
+
+def test_listings_without_place_data_score_null_and_sort_last():
+    cache_school()
+
+    scores = score([NEAR, FAR])
+    CacheMaintenance().run_tick()
+
+    assert scores["far"] == dict.fromkeys(scores["near"])
+    assert score_rows()["far"] is None
+    score_db = AmenityScoreDatabase()
+    try:
+        assert [
+            row["listing_key"] for row in score_db.top_listings("walkability", 10)
+        ] == ["near"]
+    finally:
+        score_db.close()
@@ -0,0 +1,113 @@
+import json
+import os
+
+import pytest
+
+from app.core.config import settings
+from app.models.database import GeocodingDatabase
+from app.services.batch_geocoding import load_state, run_backfill, save_state
+from app.services.replay import GEOCODE_PATH, UpstreamStandInServer
+
+ADDRESSES = {
+    "100 Congress Ave, Austin, TX 78701": (30.2634, -97.7447),
+    "1100 Congress Ave, Austin, TX 78701": (30.2747, -97.7404),
+}
+UNKNOWN_ADDRESS = "1 Nowhere Rd, Austin, TX 78701"
+
+
+def geocode_exchange(address, features):
+    """Recorded single geocode, which the batch stand-in answers each address from"""
+    return {
+        "method": "GET",
+        "path": GEOCODE_PATH,
+        "query": [["text", address]],
+        "body": None,
+        "status": 200,
+        "content_type": "application/json",
+        "response": json.dumps({"features": features}),
+    }
+
+
+def match(address, lat, lon):
+    return [
+        {
+            "properties": {
+                "lat": lat,
+                "lon": lon,
+                "formatted": address,
+                "place_id": address,
+            }
+        }
+    ]
+
+
+@pytest.fixture
+def stand_in(monkeypatch):
+    exchanges = [geocode_exchange(address, match(address, *coordinates))
+                 for address, coordinates in ADDRESSES.items()]
+    exchanges.append(geocode_exchange(UNKNOWN_ADDRESS, []))
+    fixtures = {"geoapify": exchanges}
+    server = UpstreamStandInServer(fixtures, latency_ms=0, batch_job_ms=100).start()
+    monkeypatch.setattr(settings, "UPSTREAM_MODE", "replay")
+    monkeypatch.setattr(settings, "REPLAY_SERVER_URL", server.url)
+    monkeypatch.setattr(settings, "GEOCODING_BATCH_POLL_INTERVAL", 0.02)
+    yield server
+    server.stop()
+
+
+def cached(address):
+    geocoding_db = GeocodingDatabase()
+    try:
+        return geocoding_db.get_coordinates(address)
+    finally:
+        geocoding_db.close()
+
+
+def test_backfill_geocodes_uncached_addresses(stand_in, tmp_path):
+    state_path = str(tmp_path / "backfill.json")
+
+    result = run_backfill(
+        list(ADDRESSES) + [UNKNOWN_ADDRESS], state_path=state_path, chunk_size=2
+    )
+
+    assert result["submitted_jobs"] == 2
+    assert (result["geocoded"], result["failed"], result["pending_jobs"]) == (2, 1, 0)
+    assert "error" not in result
+    assert not os.path.exists(state_path)
+    assert cached("100 Congress Avenue, Austin, TX 78701")["lat"] == pytest.approx(
+        30.2634
+    )
+    assert cached(UNKNOWN_ADDRESS) is None
+
+    # The matched addresses are cached now, so backfilling them again submits nothing
+    assert run_backfill(ADDRESSES, state_path=state_path)["submitted_jobs"] == 0
+
+
+def test_interrupted_backfill_resumes_its_jobs(stand_in, tmp_path, monkeypatch):
+    state_path = str(tmp_path / "backfill.json")
+    monkeypatch.setattr(settings, "GEOCODING_BATCH_TIMEOUT", 0.01)
+
+    interrupted = run_backfill(ADDRESSES, state_path=state_path)
+
+    assert "error" in interrupted
+    assert interrupted["pending_jobs"] == 1
+    assert len(load_state(state_path)["jobs"]) == 1
+
+    monkeypatch.setattr(settings, "GEOCODING_BATCH_TIMEOUT", 30.0)
+    resumed = run_backfill([], state_path=state_path)
+
+    assert (resumed["resumed_jobs"], resumed["submitted_jobs"]) == (1, 0)
+    assert resumed["geocoded"] == 2
+    assert not os.path.exists(state_path)
+
+
+def test_jobs_unknown_to_the_provider_are_dropped(stand_in, tmp_path):
+    state_path = str(tmp_path / "backfill.json")
+    save_state(state_path, {"jobs": [{"id": "expired", "addresses": list(ADDRESSES),
+                                      "submitted_at": 0}]})
+
+    result = run_backfill([], state_path=state_path)
+
+    assert result["geocoded"] == 0
+    assert result["pending_jobs"] == 0
+    assert not os.path.exists(state_path)
@@ -0,0 +1,112 @@
+import asyncio
+import io
+import threading
+
+import pytest
+import requests
+from PIL import Image
+
+from app.core.config import settings
+from app.models.database import MediaDatabase
+from app.services import media
+from app.services.reso import RESOClient
+
+LISTING = {"ListingKey": "L1", "Media": [{"MediaURL": "https://example.com/1.jpg"},
+                                          {"MediaURL": "https://example.com/2.jpg"}]}
+
+
+@pytest.fixture
+def listing_calls(monkeypatch):
+    """RESO answers fail once, then return LISTING"""
+    calls = []
+
+    def get_listing(self, listing_key):
+        calls.append(listing_key)
+        if len(calls) == 1:
+            raise requests.exceptions.ConnectionError("RESO is unreachable")
+        return LISTING
+
+    monkeypatch.setattr(RESOClient, "get_listing", get_listing)
+    monkeypatch.setattr(media, "_listing_media", {})
+    return calls
+
+
+def test_failed_listing_fetch_is_not_cached(listing_calls):
+    with pytest.raises(requests.exceptions.ConnectionError):
+        media.listing_media_urls("L1")
+
+    assert media.listing_media_urls("L1") == ["https://example.com/1.jpg", "https://example.com/2.jpg"]
+    assert len(listing_calls) == 2
+
+
+def test_listing_urls_are_shared_within_the_ttl(listing_calls):
+    listing_calls.append("failed already")
+
+    first = media.listing_media_urls("L1")
+    second = media.listing_media_urls("L1")
+
+    assert first == second
+    assert len(listing_calls) == 2
+
+
+@pytest.fixture
+def downloads(tmp_path, monkeypatch):
+    """Serve LISTING and a generated JPEG for its images, counting the downloads"""
+    buffer = io.BytesIO()
+    Image.new("RGB", (800, 600), "navy").save(buffer, format="JPEG")
+    calls = []
+
+    class Response:
+        content = buffer.getvalue()
+
+    def request(provider, method, url, **kwargs):
+        calls.append(url)
+        return Response()
+
+    monkeypatch.setattr(RESOClient, "get_listing", lambda self, key: LISTING)
+    monkeypatch.setattr(media, "_listing_media", {})
+    monkeypatch.setattr(media.upstream, "request", request)
+    monkeypatch.setattr(media.blob_store, "directory", str(tmp_path / "media"))
+    return calls
+
+
+def test_source_is_downloaded_once_for_every_width_and_format(downloads):
+    async def fetch_formats():
+        webp = await media.get_media("L1", 0, 320, "webp")
+        jpeg = await media.get_media("L1", 0, 1280, "jpeg")
+        return webp, jpeg
+
+    webp, jpeg = asyncio.run(fetch_formats())
+
+    assert downloads == ["https://example.com/1.jpg"]
+    assert (webp["content_type"], jpeg["content_type"]) == ("image/webp", "image/jpeg")
+    with Image.open(media.blob_store.path(jpeg["digest"])) as image:
+        # Never enlarged beyond the 800 pixel source
+        assert image.width == 800
+    media_db = MediaDatabase()
+    try:
+        rows = media_db.conn.execute("SELECT COUNT(*) FROM listing_media").fetchone()[0]
+    finally:
+        media_db.close()
+    assert rows == len(settings.MEDIA_WIDTHS) * len(media.FORMATS)
+
+
+def test_media_index_is_opened_off_the_event_loop(downloads, monkeypatch):
+    threads = []
+    init = MediaDatabase.__init__
+
+    def recording_init(self, *args, **kwargs):
+        threads.append(threading.current_thread())
+        init(self, *args, **kwargs)
+
+    monkeypatch.setattr(MediaDatabase, "__init__", recording_init)
+
+    async def fetch_twice():
+        await media.get_media("L1", 1, 160, "webp")
+        await media.get_media("L1", 1, 160, "webp")
+        return threading.current_thread()
+
+    loop_thread = asyncio.run(fetch_twice())
+
+    assert len(threads) == 3
+    assert loop_thread not in threads
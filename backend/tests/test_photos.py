@@ -0,0 +1,148 @@
+import asyncio
+import base64
+import os
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api.v1.endpoints import places as places_endpoint
+from app.core.config import settings
+from app.main import app
+from app.models.database import PhotoDatabase
+from app.services import photos
+from app.services.places import PlacesClient
+from app.services.replay import UpstreamStandInServer
+
+PHOTO = b"\xff\xd8\xff\xe0 not really a jpeg"
+PHOTO_URL = f"{settings.API_PREFIX}/places/photo?photo_reference=ref1&max_width=400"
+
+
+def photo_exchange(photo_reference, max_width):
+    return {
+        "method": "GET",
+        "path": "/maps/api/place/photo",
+        "body": None,
+        "status": 200,
+        "query": [["maxwidth", str(max_width)], ["photoreference", photo_reference]],
+        "content_type": "image/jpeg",
+        "response_base64": base64.b64encode(PHOTO).decode(),
+    }
+
+
+@pytest.fixture
+def downloads(tmp_path, monkeypatch):
+    """Serve a recorded photo with some latency, counting the downloads"""
+    server = UpstreamStandInServer({"google_places": [photo_exchange("ref1", 400)]},
+                                   latency_ms=200).start()
+    monkeypatch.setattr(settings, "UPSTREAM_MODE", "replay")
+    monkeypatch.setattr(settings, "REPLAY_SERVER_URL", server.url)
+    monkeypatch.setattr(photos.blob_store, "directory", str(tmp_path / "photos"))
+
+    count = []
+    get_photo = PlacesClient.get_photo
+
+    def counting_get_photo(self, *args, **kwargs):
+        count.append(args)
+        return get_photo(self, *args, **kwargs)
+
+    monkeypatch.setattr(PlacesClient, "get_photo", counting_get_photo)
+    yield count
+    server.stop()
+
+
+def test_concurrent_misses_share_one_download(downloads):
+    async def fetch_all():
+        return await asyncio.gather(
+            *(photos.get_photo("ref1", 400, None) for _ in range(5))
+        )
+
+    results = asyncio.run(fetch_all())
+
+    assert len(downloads) == 1
+    assert len({result["digest"] for result in results}) == 1
+    assert photos.blob_store.exists(results[0]["digest"])
+
+
+def test_photo_index_is_opened_off_the_event_loop(downloads, monkeypatch):
+    threads = []
+    init = PhotoDatabase.__init__
+
+    def recording_init(self, *args, **kwargs):
+        threads.append(threading.current_thread())
+        init(self, *args, **kwargs)
+
+    monkeypatch.setattr(PhotoDatabase, "__init__", recording_init)
+
+    async def fetch_twice():
+        loop_thread = threading.current_thread()
+        await photos.get_photo("ref1", 400, None)
+        await photos.get_photo("ref1", 400, None)
+        return loop_thread
+
+    loop_thread = asyncio.run(fetch_twice())
+
+    assert len(threads) == 3
+    assert loop_thread not in threads
+
+
+def test_photo_is_served_with_etag_and_revalidated(downloads):
+    client = TestClient(app)
+
+    response = client.get(PHOTO_URL)
+    assert response.status_code == 200
+    assert response.content == PHOTO
+    etag = response.headers["ETag"]
+
+    revalidated = client.get(PHOTO_URL, headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == etag
+    assert len(downloads) == 1
+
+
+def test_removed_file_is_downloaded_again(downloads):
+    client = TestClient(app)
+    digest = client.get(PHOTO_URL).headers["ETag"].strip('"')
+    photos.blob_store.remove(digest)
+
+    response = client.get(PHOTO_URL)
+
+    assert response.status_code == 200
+    assert response.content == PHOTO
+    assert len(downloads) == 2
+
+
+def test_file_removed_before_sending_is_downloaded_again(downloads, monkeypatch):
+    get_photo = places_endpoint.get_photo
+    lookups = []
+
+    async def evicting_get_photo(*args):
+        photo = await get_photo(*args)
+        if not lookups:
+            # Evicted by a concurrent download between the lookup and the response
+            photos.blob_store.remove(photo["digest"])
+        lookups.append(photo)
+        return photo
+
+    monkeypatch.setattr(places_endpoint, "get_photo", evicting_get_photo)
+    response = TestClient(app).get(PHOTO_URL)
+
+    assert response.status_code == 200
+    assert response.content == PHOTO
+    assert (len(lookups), len(downloads)) == (2, 2)
+
+
+def test_files_being_sent_survive_garbage_collection(downloads):
+    digest = asyncio.run(photos.get_photo("ref1", 400, None))["digest"]
+    assert photos.blob_store.pin(digest)
+
+    photos.clear_photos()
+    assert photos.blob_store.exists(digest)
+
+    photos.blob_store.unpin(digest)
+    photo_db = PhotoDatabase()
+    try:
+        assert photo_db.collect_garbage(photos.blob_store.remove) == 1
+    finally:
+        photo_db.close()
+    assert not os.path.exists(photos.blob_store.path(digest))
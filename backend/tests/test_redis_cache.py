@@ -0,0 +1,143 @@
+import time
+
+import pytest
+
+from app.core.config import settings
+from app.db.redis_cache import RedisGeocodingCache, RedisPlacesCache
+from app.db.resp import RespClient, RespStandInServer
+
+
+@pytest.fixture
+def client():
+    server = RespStandInServer().start()
+    client = RespClient(server.url)
+    yield client
+    client.close()
+    server.stop()
+
+
+def place(place_id, lat, lng, types):
+    return {"place_id": place_id, "name": place_id.title(), "types": types,
+            "geometry": {"location": {"lat": lat, "lng": lng}}}
+
+
+def search_results(*places):
+    return {"status": "OK", "results": list(places)}
+
+
+def geocoding_result(address, lat=30.27, lon=-97.74):
+    return {
+        "address": address,
+        "success": True,
+        "coordinates": {"lat": lat, "lon": lon},
+        "formatted_address": address,
+        "address_components": {},
+        "place_id": "x",
+    }
+
+
+def test_places_set_and_get(client):
+    cache = RedisPlacesCache(client)
+    results = search_results(place("school", 30.27, -97.74, ["school"]))
+    cache.cache_places("key", "30.27,-97.74", 1500, "school", None, results)
+
+    assert cache.get_places_entry("key") == (results, False)
+    assert cache.get_cached_places("key") == results
+    assert cache.get_places_entry("missing") == (None, False)
+    assert set(cache.get_places_ages(["key", "missing"])) == {"key"}
+
+
+def test_places_expire_on_the_server(client, monkeypatch):
+    monkeypatch.setattr(settings, "CACHE_EXPIRATION", 1)
+    monkeypatch.setattr(settings, "CACHE_STALE_TTL", 1)
+    cache = RedisPlacesCache(client)
+    results = search_results(place("school", 30.27, -97.74, ["school"]))
+    cache.cache_places("key", "30.27,-97.74", 1500, "school", None, results)
+
+    # Past CACHE_EXPIRATION the entry is served as
+    # stale, past CACHE_STALE_TTL too it is gone
+    time.sleep(1.1)
+    assert cache.get_places_entry("key") == (results, True)
+    assert cache.get_cached_places("key") is None
+    time.sleep(1)
+    assert cache.get_places_entry("key") == (None, False)
+    assert cache.find_place_points(30, 31, -98, -97, "school") == []
+    assert cache.get_places(["school"]) == {}
+
+
+def test_places_found_by_location(client):
+    cache = RedisPlacesCache(client)
+    near = place("near", 30.2700, -97.7400, ["school"])
+    far = place("far", 30.2900, -97.7400, ["school", "library"])
+    store = place("store", 30.2705, -97.7405, ["supermarket"])
+    cache.cache_places(
+        "key", "30.27,-97.74", 5000, "school", None, search_results(near, far, store)
+    )
+
+    within = cache.find_places_within("30.27,-97.74", 1000)
+    assert sorted(p["place_id"] for p in within) == ["near", "store"]
+    assert [
+        p["place_id"] for p in cache.find_places_within("30.27,-97.74", 5000, "library")
+    ] == ["far"]
+
+    points = cache.find_place_points(30.26, 30.28, -97.75, -97.73, "school")
+    assert [
+        (place_id, round(lat, 4), round(lng, 4)) for place_id, lat, lng in points
+    ] == [("near", 30.27, -97.74)]
+    assert cache.get_places(["near", "missing"]) == {"near": near}
+
+
+def test_geocoding_set_and_get(client):
+    cache = RedisGeocodingCache(client)
+    cache.save_geocoding_results(
+        [geocoding_result("123 Main Street, Austin, TX 78701")]
+    )
+
+    # Any spelling of the address finds the entry
+    assert cache.address_exists_in_db("123 MAIN ST, Austin, TX 78701")
+    assert cache.get_coordinates("123 Main St Apt 4, Austin, Texas 78701") == {
+        "lat": 30.27, "lon": -97.74, "address": "123 Main Street, Austin, TX 78701"
+    }
+    assert cache.get_coordinates("1 Other Rd, Austin, TX 78701") is None
+
+
+def test_stats(client):
+    places = RedisPlacesCache(client)
+    geocoding = RedisGeocodingCache(client)
+    places.cache_places("a", "30.27,-97.74", 1500, "school", None,
+                        search_results(place("school", 30.27, -97.74, ["school"])))
+    places.cache_places("b", "30.27,-97.74", 2000, "hospital", None,
+                        search_results(place("hospital", 30.27, -97.74, ["hospital"])))
+    places.get_places_entry("a")
+    places.get_places_entry("a")
+    geocoding.save_geocoding_result(geocoding_result("1 Main St, Austin, TX 78701"))
+    geocoding.get_coordinates("1 Main St, Austin, TX 78701")
+
+    stats = places.get_cache_stats()
+    assert stats["places"]["count"] == 2
+    assert stats["places"]["stored_places"] == 2
+    assert (stats["places"]["hits"], stats["places"]["misses"]) == (2, 2)
+    assert stats["places"]["by_type"]["school"]["entries"] == 1
+    assert stats["places"]["by_type"]["school"]["hits"] == 2
+    assert stats["geocoding"]["count"] == 1
+    assert (stats["geocoding"]["hits"], stats["geocoding"]["misses"]) == (1, 1)
+    assert (
+        stats["total_cache_size"]
+        == stats["places"]["size"] + stats["geocoding"]["size"]
+        > 0
+    )
+
+
+def test_clear(client):
+    places = RedisPlacesCache(client)
+    geocoding = RedisGeocodingCache(client)
+    places.cache_places("a", "30.27,-97.74", 1500, "school", None,
+                        search_results(place("school", 30.27, -97.74, ["school"])))
+    geocoding.save_geocoding_result(geocoding_result("1 Main St, Austin, TX 78701"))
+
+    assert places.clear_cache("places") == {"deleted": {"places": 1}}
+    assert places.get_places_entry("a") == (None, False)
+    assert places.find_places_within("30.27,-97.74", 1000) == []
+    assert places.get_cache_stats()["places"]["count"] == 0
+    # Clearing places leaves the geocoding cache alone
+    assert geocoding.get_coordinates("1 Main St, Austin, TX 78701") is not None
@@ -0,0 +1,109 @@
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.core.maintenance import CacheMaintenance
+from app.core.snapshot import SnapshotTooLargeError, export_snapshot, import_snapshot
+from app.main import app
+from app.models.database import PlacesDatabase
+
+SNAPSHOT_URL = f"{settings.API_PREFIX}/cache/snapshot"
+ADMIN_HEADERS = {"X-Admin-Token": "secret"}
+
+
+def search_results(place_id):
+    return {"status": "OK", "results": [
+        {"place_id": place_id, "name": place_id.title(), "types": ["school"],
+         "geometry": {"location": {"lat": 30.27, "lng": -97.74}}}
+    ]}
+
+
+def cache_search(location_key, place_id, age_seconds=0):
+    places_db = PlacesDatabase()
+    try:
+        places_db.cache_places(location_key, "30.27,-97.74", 1500, "school", None,
+                               search_results(place_id))
+    finally:
+        places_db.close()
+    conn = sqlite3.connect(settings.DB_PATH)
+    conn.execute(
+        "UPDATE nearby_places SET timestamp = datetime('now', ?) "
+        "WHERE location_key = ?",
+        (f"-{age_seconds} seconds", location_key),
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_snapshot_leaves_out_stale_entries(tmp_path):
+    cache_search("fresh", "fresh-school")
+    cache_search("stale", "stale-school", settings.CACHE_EXPIRATION + 3600)
+
+    result = export_snapshot(str(tmp_path / "cache.snapshot"))
+
+    assert result["entries"]["places"] == 1
+    assert result["entries"]["stored_places"] == 1
+
+
+def test_maintenance_keeps_stale_entries_until_stale_ttl():
+    cache_search("stale", "stale-school", settings.CACHE_EXPIRATION + 3600)
+    cache_search(
+        "gone",
+        "gone-school",
+        settings.CACHE_EXPIRATION + settings.CACHE_STALE_TTL + 3600,
+    )
+
+    CacheMaintenance().run_tick()
+
+    conn = sqlite3.connect(settings.DB_PATH)
+    keys = [row[0] for row in conn.execute("SELECT location_key FROM nearby_places")]
+    conn.close()
+    assert keys == ["stale"]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "ADMIN_TOKEN", "secret")
+    return TestClient(app)
+
+
+def test_snapshot_and_maintenance_routes_require_the_admin_token(client):
+    assert client.get(SNAPSHOT_URL).status_code == 401
+    assert client.post(SNAPSHOT_URL, content=b"snapshot").status_code == 401
+    maintenance_url = f"{settings.API_PREFIX}/cache/maintenance/run"
+    assert client.post(maintenance_url).status_code == 401
+
+    response = client.get(SNAPSHOT_URL, headers=ADMIN_HEADERS)
+    assert response.status_code == 200
+    assert response.content.startswith(b"RECACHE")
+
+
+def test_snapshot_upload_over_the_limit_is_rejected(client, monkeypatch):
+    monkeypatch.setattr(settings, "SNAPSHOT_MAX_UPLOAD_BYTES", 1024)
+
+    response = client.post(SNAPSHOT_URL, content=b"x" * 2048, headers=ADMIN_HEADERS)
+    assert response.status_code == 413
+
+    # Without a Content-Length the body is counted while it streams in
+    chunks = iter([b"x" * 512] * 4)
+    response = client.post(SNAPSHOT_URL, content=chunks, headers=ADMIN_HEADERS)
+    assert response.status_code == 413
+
+
+def test_snapshot_decompressing_past_the_limit_is_rejected(
+    client, monkeypatch, tmp_path
+):
+    cache_search("fresh", "fresh-school")
+    path = tmp_path / "cache.snapshot"
+    export_snapshot(str(path))
+
+    with pytest.raises(SnapshotTooLargeError):
+        import_snapshot(str(path), max_size=4096)
+
+    monkeypatch.setattr(settings, "SNAPSHOT_MAX_BYTES", 4096)
+    body = path.read_bytes()
+    response = client.post(SNAPSHOT_URL, content=body, headers=ADMIN_HEADERS)
+    assert response.status_code == 413
+    assert import_snapshot(str(path), max_size=1024 * 1024)["entries"]["places"] == 1
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Command-line script to record upstream fixtures and serve them for offline runs
+
+`record` calls the live providers the way the frontend drives the API (active
+listings, geocoding of each address, then the five nearby-place categories
+per listing) and saves every exchange to UPSTREAM_FIXTURES_DIR.
+
+`serve` runs the stand-in server on its own; point the API at it with
+UPSTREAM_MODE=replay and REPLAY_SERVER_URL=http://host:port.
+"""
+
+import argparse
+import time
+
+from app.core.config import settings
+from app.services.geocoding import GeocodingClient
+from app.services.places import PANEL_CATEGORIES, PlacesClient
+from app.services.replay import UpstreamStandInServer, load_fixtures
+from app.services.reso import RESOClient, get_address_from_listing
+from clear_cache import configure_logging
+
+
+def record(limit: int) -> None:
+    """Record the upstream exchanges behind `limit` listings and their nearby places"""
+    settings.UPSTREAM_MODE = "record"
+    listings = RESOClient(dataset_id="actris_ref").get_active_residential_listings(
+        limit=limit
+    )
+    geocoding_client = GeocodingClient()
+    places_client = PlacesClient()
+    for listing in listings:
+        address = get_address_from_listing(listing)
+        if not address:
+            continue
+        result = geocoding_client.geocode_address(address)
+        if not result['success']:
+            continue
+        location = f"{result['coordinates']['lat']},{result['coordinates']['lon']}"
+        for place_type, radius in PANEL_CATEGORIES:
+            places_client.search_nearby(location, radius=radius, place_type=place_type)
+    print(
+        f"Recorded exchanges for {len(listings)} listings "
+        f"to {settings.UPSTREAM_FIXTURES_DIR}"
+    )
+
+def serve(args: argparse.Namespace) -> None:
+    """Serve recorded exchanges until interrupted"""
+    fixtures = load_fixtures(args.fixtures)
+    server = UpstreamStandInServer(
+        fixtures,
+        host=args.host,
+        port=args.port,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        batch_job_ms=args.batch_job_ms
+    ).start()
+    counts = ", ".join(
+        f"{len(exchanges)} {provider}" for provider, exchanges in fixtures.items()
+    )
+    print(f"Serving {counts or 'no'} exchanges at {server.url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+def main():
+    """Main entry point for the upstream fixtures script"""
+    parser = argparse.ArgumentParser(
+        description="Record upstream provider fixtures or serve them for replay"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = subparsers.add_parser(
+        "record", help="Record live exchanges with the providers"
+    )
+    record_parser.add_argument(
+        "--limit", type=int, default=20, help="Number of active listings to record"
+    )
+
+    serve_parser = subparsers.add_parser(
+        "serve", help="Serve recorded exchanges from a stand-in server"
+    )
+    serve_parser.add_argument(
+        "--fixtures", default=settings.UPSTREAM_FIXTURES_DIR, help="Fixtures directory"
+    )
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8099)
+    serve_parser.add_argument(
+        "--latency-ms",
+        type=float,
+        default=settings.REPLAY_LATENCY_MS,
+        help="Delay per response (default: the recorded latency)",
+    )
+    serve_parser.add_argument(
+        "--jitter-ms", type=float, default=settings.REPLAY_JITTER_MS
+    )
+    serve_parser.add_argument(
+        "--error-rate", type=float, default=settings.REPLAY_ERROR_RATE
+    )
+    serve_parser.add_argument(
+        "--error-status", type=int, default=settings.REPLAY_ERROR_STATUS
+    )
+    serve_parser.add_argument(
+        "--batch-job-ms",
+        type=float,
+        default=settings.REPLAY_BATCH_JOB_MS,
+        help="Time a batch geocoding job takes to finish",
+    )
+    args = parser.parse_args()
+
+    configure_logging()
+
+    if args.command == "record":
+        record(args.limit)
+    else:
+        serve(args)
+
+if __name__ == "__main__":
+    main()
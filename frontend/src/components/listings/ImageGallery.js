@@ -1,17 +1,19 @@
 import React from 'react';
 import ThumbnailGallery from './ThumbnailGallery';
+import { listingMediaUrl } from '../../utils/media';
 import './listings.css';
 
-function ImageGallery({ media, selectedImageIndex, onThumbnailClick }) {
+function ImageGallery({ listingKey, media, selectedImageIndex, onThumbnailClick }) {
   const THUMBNAIL_HEIGHT = 80;
   const THUMBNAIL_WIDTH = 110;
+  const MAIN_IMAGE_WIDTH = 400;
 
   return (
     <div className="listing-images">
       {media && media.length > 0 ? (
         <div className="image-container">
           <img 
-            src={media[selectedImageIndex].MediaURL} 
+            src={listingMediaUrl(listingKey, selectedImageIndex, MAIN_IMAGE_WIDTH)} 
             alt="Property" 
             className="main-image"
           />
@@ -19,6 +21,7 @@ function ImageGallery({ media, selectedImageIndex, onThumbnailClick }) {
           {/* Thumbnail row with navigation */}
           {media.length > 1 && (
             <ThumbnailGallery
+              listingKey={listingKey}
               media={media}
               selectedImageIndex={selectedImageIndex}
               onThumbnailClick={onThumbnailClick}
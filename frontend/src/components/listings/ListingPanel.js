@@ -180,6 +180,7 @@ function ListingPanel({
       
       <div className="panel-content">
         <ImageGallery 
+          listingKey={listing.ListingKey}
           media={listing.Media} 
           selectedImageIndex={selectedImageIndex}
           onThumbnailClick={(index) => onThumbnailClick(index, panelId)}
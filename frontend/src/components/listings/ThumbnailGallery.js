@@ -1,7 +1,9 @@
 import React, { useRef, useEffect, useState } from 'react';
+import { listingMediaUrl } from '../../utils/media';
 import './listings.css';
 
 function ThumbnailGallery({ 
+  listingKey,
   media, 
   selectedImageIndex, 
   onThumbnailClick,
@@ -193,7 +195,7 @@ function ThumbnailGallery({
           <img 
             key={index}
             ref={thumbnailRefs.current[index]}
-            src={image.MediaURL} 
+            src={listingMediaUrl(listingKey, index, thumbnailWidth)} 
             alt={`Property ${index + 1}`}
             className={`thumbnail ${selectedImageIndex === index ? 'selected' : ''}`}
             style={{
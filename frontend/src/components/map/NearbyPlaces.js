@@ -140,25 +140,6 @@ function NearbyPlaces({ coordinates, onViewOnMap, placeType = 'restaurant' }) {
     };
   }, [coordinates, placeType]);
 
-  // Calculate distance between two coordinates in kilometers
-  const calculateDistance = (lat1, lon1, lat2, lon2) => {
-    const R = 6371; // Radius of the earth in km
-    const dLat = deg2rad(lat2 - lat1);
-    const dLon = deg2rad(lon2 - lon1);
-    const a = 
-      Math.sin(dLat/2) * Math.sin(dLat/2) +
-      Math.cos(deg2rad(lat1)) * Math.cos(deg2rad(lat2)) * 
-      Math.sin(dLon/2) * Math.sin(dLon/2);
-    const c = 2 * Math.atan2(Math.sqrt(a), Math.sqrt(1-a)); 
-    const distance = R * c; // Distance in km
-    return distance;
-  };
-  
-  // Convert degrees to radians
-  const deg2rad = (deg) => {
-    return deg * (Math.PI/180);
-  };
-  
   // Format distance to show in miles or km
   const formatDistance = (distance) => {
     // Convert km to miles and round to 1 decimal place
@@ -182,29 +163,11 @@ function NearbyPlaces({ coordinates, onViewOnMap, placeType = 'restaurant' }) {
       
       const data = await response.json();
       
-      // Add distance calculation to each place
-      const placesWithDistance = data.results.map(place => {
-        let distance = 0;
-        
-        // Check if the place has geometry with location
-        if (place.geometry && place.geometry.location) {
-          const { lat, lng } = place.geometry.location;
-          distance = calculateDistance(
-            coordinates.lat, 
-            coordinates.lng, 
-            lat, 
-            lng
-          );
-        }
-        
-        return {
-          ...place,
-          distance
-        };
-      });
-      
-      // Sort places by distance
-      placesWithDistance.sort((a, b) => a.distance - b.distance);
+      // The backend sorts places by distance and sends it in meters
+      const placesWithDistance = data.results.map(place => ({
+        ...place,
+        distance: (place.distance_meters || 0) / 1000
+      }));
       
       let resultPlaces;
       if (pageToken) {
@@ -21,18 +21,26 @@ function useListings() {
   
   const MAX_PANELS = 10; // Maximum number of panels allowed
 
+  const LISTINGS_DEADLINE_MS = 1500; // Paint the listings resolved by then, fetch the rest later
+  const LISTINGS_REFETCH_DELAY_MS = 2000; // Wait before fetching the rest of a partial result
+  const MAX_LISTINGS_REFETCHES = 5;
+
   // Function to fetch active listings from the Flask API
   const fetchActiveListings = async () => {
     try {
       // Call our Flask API endpoint
-      const response = await fetch(`${config.BACKEND_URL}/api/listings/active?limit=100`);
+      const response = await fetch(
+        `${config.BACKEND_URL}/api/listings/active?limit=100&deadline_ms=${LISTINGS_DEADLINE_MS}`
+      );
       
       if (!response.ok) {
         throw new Error(`API error: ${response.status}`);
       }
       
       const data = await response.json();
-      return data;
+      // Listings still being geocoded at the deadline are left out and arrive in a later fetch
+      const isPartial = response.headers.get('X-Partial-Result') === 'true';
+      return { listings: data, isPartial };
     } catch (err) {
       console.error("Error fetching listings:", err);
       throw err;
@@ -42,25 +50,35 @@ function useListings() {
   // Load listings when the button is clicked
   useEffect(() => {
     let isMounted = true;
+    let refetchTimer = null;
     
-    if (showActiveListings) {
-      setIsLoading(true);
-      setError(null);
-      
+    const loadListings = (attempt) => {
       fetchActiveListings()
-        .then(listings => {
+        .then(({ listings, isPartial }) => {
           if (isMounted) {
             setActiveListings(listings);
             setIsLoading(false);
+            if (isPartial && attempt < MAX_LISTINGS_REFETCHES) {
+              refetchTimer = setTimeout(() => loadListings(attempt + 1), LISTINGS_REFETCH_DELAY_MS);
+            }
           }
         })
         .catch(err => {
           if (isMounted) {
             console.error("Error fetching listings:", err);
-            setError("Failed to fetch listings. Please try again.");
+            // Keep the listings already shown if a follow-up fetch fails
+            if (attempt === 0) {
+              setError("Failed to fetch listings. Please try again.");
+            }
             setIsLoading(false);
           }
         });
+    };
+    
+    if (showActiveListings) {
+      setIsLoading(true);
+      setError(null);
+      loadListings(0);
     } else {
       setActiveListings([]);
       setSelectedListing(null);
@@ -69,6 +87,7 @@ function useListings() {
     
     return () => {
       isMounted = false;
+      clearTimeout(refetchTimer);
     };
   }, [showActiveListings]);
   
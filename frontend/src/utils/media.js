@@ -0,0 +1,10 @@
+/**
+ * Utility functions for listing media
+ */
+import config from '../config';
+
+/**
+ * URL of a listing image resized by the backend, at twice the display width for high-DPI screens
+ */
+export const listingMediaUrl = (listingKey, index, width) =>
+  `${config.BACKEND_URL}/api/listings/${encodeURIComponent(listingKey)}/media/${index}?w=${width * 2}`;